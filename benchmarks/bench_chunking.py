@@ -0,0 +1,168 @@
+"""
+Chunking throughput and peak memory: the original chunk_text vs. the
+cached splitter vs. streaming iter_chunks.
+
+Generates synthetic documents page by page (paragraphs of random words,
+~3,000 characters per page, like extracted PDF text) and chunks them
+
+  * "legacy":    new RecursiveCharacterTextSplitter per call, whole text
+                 joined first, all chunks returned as a list (as before),
+  * "cached":    chunk_text() with the lru-cached splitter, same input,
+  * "streaming": iter_chunks() fed by a page iterator, chunks consumed
+                 one at a time,
+  * "offsets":   iter_document_chunks(), the same plus character offsets
+                 and pages (as IngestService.ingest_pages does),
+  * "tokens":    iter_token_chunks(), CHUNK_MODE=tokens (model tokenizer
+                 if transformers is installed, else the approximation),
+
+measuring pages/s and MB/s, then tracemalloc peak in a second pass
+(page text included; pages are fresh strings from a pre-generated pool,
+so generation costs next to nothing):
+
+    python -m benchmarks.bench_chunking --pages 500 --docs 5
+    python -m benchmarks.bench_chunking --pages 500 --small-docs 2000 --json chunking.json
+
+--small-docs also times many one-page documents, where splitter
+construction is a larger share of the work. Finally it reports how many
+character-based chunks exceed CHUNK_TOKENS tokens, i.e. get truncated by
+the encoder.
+
+Streamed chunks are compared with a one-shot split of the same text:
+they can differ around the points where streaming restarts the splitter
+(every CHUNK_STREAM_WINDOW_CHUNKS chunk sizes).
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.config import settings
+from src.db.embeddings import get_tokenizer
+from src.utils.chunking import chunk_text, iter_chunks, iter_document_chunks, iter_token_chunks
+
+
+_POOL: Dict[int, List[str]] = {}
+
+
+def _page_pool(seed: int, size: int = 64, page_chars: int = 3000) -> List[str]:
+    if seed not in _POOL:
+        rng = np.random.default_rng(seed)
+        vocab = [f"w{i}" for i in range(5000)]
+        pool = []
+        for _ in range(size):
+            paragraphs, chars = [], 0
+            while chars < page_chars:
+                para = " ".join(rng.choice(vocab, int(rng.integers(40, 160)))) + "."
+                paragraphs.append(para)
+                chars += len(para) + 2
+            pool.append("\n\n".join(paragraphs))
+        _POOL[seed] = pool
+    return _POOL[seed]
+
+
+def synthetic_pages(n: int, seed: int, doc: int = 0) -> Iterator[str]:
+    """n newline-terminated pages, each a new string (like iter_pdf_pages)."""
+    pool = _page_pool(seed)
+    for i in range(n):
+        yield f"{pool[(doc * 7 + i) % len(pool)]}\n{i + 1}\n"
+
+
+def legacy(pages: Iterator[str]) -> int:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+    return len(splitter.split_text("".join(list(pages))))
+
+
+def cached(pages: Iterator[str]) -> int:
+    return len(chunk_text("".join(list(pages))))
+
+
+def streaming(pages: Iterator[str]) -> int:
+    return sum(1 for _ in iter_chunks(pages))
+
+
+def offsets(pages: Iterator[str]) -> int:
+    return sum(1 for _ in iter_document_chunks(pages))
+
+
+def tokens(pages: Iterator[str]) -> int:
+    return sum(1 for _ in iter_token_chunks(pages))
+
+
+def run(fn: Callable[[Iterator[str]], int], docs: int, pages: int, seed: int) -> Dict:
+    chars = sum(len(p) for d in range(docs) for p in synthetic_pages(pages, seed, d))
+    gc.collect()
+    t0 = time.perf_counter()
+    chunks = sum(fn(synthetic_pages(pages, seed, d)) for d in range(docs))
+    seconds = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    fn(synthetic_pages(pages, seed))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "pages_per_s": round(docs * pages / seconds, 1),
+        "mb_per_s": round(chars / 2**20 / seconds, 2),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def agreement(pages: int, seed: int) -> Dict:
+    """Streaming vs. a one-shot split of the same text: chunk counts, streamed chunks not in the one-shot split."""
+    reference = chunk_text("".join(synthetic_pages(pages, seed)))
+    streamed: List[str] = list(iter_chunks(synthetic_pages(pages, seed)))
+    differing = sum((Counter(streamed) - Counter(reference)).values())
+    return {"pages": pages, "one_shot_chunks": len(reference), "streamed_chunks": len(streamed),
+            "differing_chunks": differing}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=500, help="pages per document")
+    ap.add_argument("--docs", type=int, default=5)
+    ap.add_argument("--small-docs", type=int, default=0, help="also chunk this many one-page documents")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    result = {"pages": args.pages, "docs": args.docs, "chunk_size": settings.CHUNK_SIZE,
+              "chunk_overlap": settings.CHUNK_OVERLAP, "large": {}, "small": {}}
+    for name, fn in (("legacy", legacy), ("cached", cached), ("streaming", streaming), ("offsets", offsets),
+                     ("tokens", tokens)):
+        row = result["large"][name] = run(fn, args.docs, args.pages, args.seed)
+        print(f"{args.pages}-page docs  {name:<10} {row['pages_per_s']:>9} pages/s  {row['mb_per_s']:>6} MB/s  "
+              f"peak {row['peak_mb']} MB  ({row['chunks']} chunks)")
+    if args.small_docs:
+        for name, fn in (("legacy", legacy), ("cached", cached), ("streaming", streaming)):
+            row = result["small"][name] = run(fn, args.small_docs, 1, args.seed)
+            print(f"1-page docs    {name:<10} {row['pages_per_s']:>9} pages/s  {row['mb_per_s']:>6} MB/s")
+    result["streaming_vs_one_shot"] = []
+    for pages in sorted({10, 50, args.pages}):
+        agree = agreement(pages, args.seed)
+        result["streaming_vs_one_shot"].append(agree)
+        print(f"{pages}-page doc streamed: {agree['streamed_chunks']} chunks vs. {agree['one_shot_chunks']} "
+              f"one-shot, {agree['differing_chunks']} differ")
+
+    tokenizer = get_tokenizer()
+    lengths = [len(tokenizer.spans(c)) for c in chunk_text("".join(synthetic_pages(min(args.pages, 100), args.seed)))]
+    over = result["char_chunks_over_token_limit"] = round(
+        sum(n > settings.CHUNK_TOKENS for n in lengths) / max(len(lengths), 1), 4)
+    print(f"{settings.CHUNK_SIZE}-char chunks: median {int(np.median(lengths))} tokens, "
+          f"{over:.1%} over CHUNK_TOKENS={settings.CHUNK_TOKENS} ({type(tokenizer).__name__})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
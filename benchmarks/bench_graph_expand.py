@@ -0,0 +1,98 @@
+"""
+Latency of bounded multi-hop citation expansion (GraphStore.expand).
+
+Builds a synthetic corpus (co-authorship from bench_graph_memory plus
+CITES edges with preferential attachment: papers mostly cite a few
+highly cited earlier papers, a share of references point outside the
+corpus) and times expand() from random seeds for 1..3 hops:
+
+    python -m benchmarks.bench_graph_expand --papers 200000
+    python -m benchmarks.bench_graph_expand --papers 1000000 --refs-per-paper 30 --json expand.json
+
+Reports p50 / p95 / p99 per hop count, the neighbourhood size found and
+how often the node cap or time budget cut the walk short, plus the
+one-off citation index build time.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator
+
+import numpy as np
+
+from benchmarks.bench_graph_memory import synthetic_papers
+from src.config import settings
+from src.db.graph_store import GraphStore
+
+
+def with_references(papers: Iterator[Dict], refs_per_paper: float, external: float, seed: int) -> Iterator[Dict]:
+    rng = np.random.default_rng(seed + 1)
+    for i, p in enumerate(papers):
+        k = int(rng.poisson(refs_per_paper)) if i else 0
+        # earlier paper j with P(j < x) = (x / i) ** (1/2): old, highly cited papers dominate
+        targets = (i * rng.random(k) ** 2).astype(np.int64)
+        refs = [f"{2000 + j % 25}.{j:07d}" for j in targets]
+        refs += [f"10.0000/external.{int(x)}" for x in rng.integers(0, 10**6, int(k * external))]
+        yield {**p, "references": refs}
+
+
+def percentiles(values) -> Dict[str, float]:
+    return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--papers", type=int, default=200_000)
+    ap.add_argument("--refs-per-paper", type=float, default=20.0)
+    ap.add_argument("--external", type=float, default=0.3, help="extra out-of-corpus references per in-corpus one")
+    ap.add_argument("--authors-per-paper", type=float, default=4.0)
+    ap.add_argument("--fanout", type=int, default=settings.GRAPH_CITATION_FANOUT)
+    ap.add_argument("--max-nodes", type=int, default=50)
+    ap.add_argument("--budget-ms", type=float, default=settings.GRAPH_EXPAND_BUDGET_MS)
+    ap.add_argument("--lookups", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    gs = GraphStore(path=Path(tempfile.mkdtemp()) / "graph.json")
+    t0 = time.perf_counter()
+    gs.add_papers(with_references(synthetic_papers(args.papers, args.authors_per_paper, args.seed),
+                                  args.refs_per_paper, args.external, args.seed), save=False)
+    build_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    gs._citation_index()
+    index_s = time.perf_counter() - t0
+
+    rng = np.random.default_rng(args.seed + 2)
+    seeds = [gs.paper_keys[i] for i in rng.integers(0, gs.paper_count, args.lookups)]
+    result = {"papers": gs.paper_count, **gs.stats(), "build_s": round(build_s, 2),
+              "citation_index_s": round(index_s, 3), "fanout": args.fanout,
+              "max_nodes": args.max_nodes, "budget_ms": args.budget_ms, "hops": {}}
+
+    for hops in (1, 2, 3):
+        times, sizes, capped = [], [], 0
+        for pid in seeds:
+            t = time.perf_counter()
+            found = gs.expand([pid], hops=hops, max_fanout=args.fanout, max_nodes=args.max_nodes,
+                              budget_ms=args.budget_ms)
+            times.append((time.perf_counter() - t) * 1000)
+            sizes.append(len(found))
+            capped += len(found) >= args.max_nodes
+        row = {"ms": percentiles(times), "mean_found": round(float(np.mean(sizes)), 1),
+               "capped_share": round(capped / len(seeds), 3)}
+        result["hops"][hops] = row
+        print(f"hops={hops}  expand {row['ms']} ms  found {row['mean_found']} papers on average  "
+              f"capped {row['capped_share']:.0%}")
+    print(f"{gs.paper_count} papers, {result['citations']} references; "
+          f"build {result['build_s']}s, citation index {result['citation_index_s']}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
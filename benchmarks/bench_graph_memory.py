@@ -0,0 +1,164 @@
+"""
+Memory footprint and lookup latency of the author graph.
+
+Generates a synthetic co-authorship corpus (power-law author frequencies,
+so prolific authors appear on hundreds of papers) and loads it into
+
+  * the original list-of-dicts representation (one node dict per paper
+    and per author *occurrence*, one edge dict per AUTHORED_BY edge), and
+  * the current GraphStore (interned ids, deduplicated node tables, CSR
+    adjacency),
+
+measuring Python heap growth with tracemalloc and related_by_authors
+latency:
+
+    python -m benchmarks.bench_graph_memory --papers 1000000
+    python -m benchmarks.bench_graph_memory --papers 1000000 --legacy-papers 100000 --json graph_mem.json
+
+The legacy structure needs several GB at 1M papers, so it is built for at
+most --legacy-papers papers and extrapolated linearly (its size is linear
+in papers x authors-per-paper). Build times are taken under tracemalloc
+and only comparable with each other.
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from src.db.graph_store import GraphStore
+
+
+def synthetic_papers(n: int, authors_per_paper: float, seed: int) -> Iterator[Dict]:
+    rng = np.random.default_rng(seed)
+    pool = max(n // 2, 10)
+    counts = np.clip(rng.poisson(authors_per_paper - 1, n) + 1, 1, 20)
+    # P(author < k) = (k / pool) ** (2/3): a long tail plus a few prolific authors
+    draws = (pool * rng.random(int(counts.sum())) ** 1.5).astype(np.int64)
+    offset = 0
+    for i in range(n):
+        k = int(counts[i])
+        yield {
+            "paper_id": f"{2000 + i % 25}.{i:07d}",
+            "title": f"Synthetic paper number {i} on topic {i % 997}",
+            "authors": [f"Author {a:07d}" for a in draws[offset:offset + k]],
+        }
+        offset += k
+
+
+def legacy_graph(papers: Iterator[Dict]) -> Dict[str, List[Dict]]:
+    """GraphStore.add_paper as it was: appends a node per author occurrence."""
+    graph = {"nodes": [], "edges": []}
+    for p in papers:
+        graph["nodes"].append({"id": p["paper_id"], "type": "paper",
+                               "title": p["title"], "authors": p["authors"]})
+        for a in p["authors"]:
+            graph["nodes"].append({"id": f"author:{a}", "type": "author", "name": a})
+            graph["edges"].append({"source": p["paper_id"], "target": f"author:{a}",
+                                   "type": "AUTHORED_BY"})
+    return graph
+
+
+def legacy_related(graph, paper_ids, limit=5):
+    related = []
+    for edge in graph["edges"]:
+        if edge["source"] in paper_ids:
+            for e2 in graph["edges"]:
+                if e2["target"] == edge["target"] and e2["source"] not in paper_ids:
+                    related.append(e2["source"])
+    return list(dict.fromkeys(related))[:limit]
+
+
+def measure(build) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    obj = build()
+    seconds = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"obj": obj, "mb": round((current - base) / 2**20, 1),
+            "peak_mb": round((peak - base) / 2**20, 1), "build_s": round(seconds, 2)}
+
+
+def lookup_ms(fn, paper_ids: List[str], repeat: int) -> Dict:
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn([paper_ids[i % len(paper_ids)]])
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"p50": round(float(np.percentile(times, 50)), 3), "p95": round(float(np.percentile(times, 95)), 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--papers", type=int, default=1_000_000)
+    ap.add_argument("--legacy-papers", type=int, default=100_000,
+                    help="build the legacy structure for at most this many papers, extrapolate beyond")
+    ap.add_argument("--authors-per-paper", type=float, default=4.0)
+    ap.add_argument("--lookups", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    path = Path(tempfile.mkdtemp()) / "graph.json"
+    new = measure(lambda: _build_store(path, synthetic_papers(args.papers, args.authors_per_paper, args.seed)))
+    gs = new.pop("obj")
+    t0 = time.perf_counter()
+    gs._author_index()  # include the reverse index + centrality in the footprint comparison below
+    index_s = time.perf_counter() - t0
+    sample = gs.paper_keys[:: max(1, gs.paper_count // args.lookups)]
+    new_row = {"papers": gs.paper_count, **gs.stats(), **new, "index_s": round(index_s, 2),
+               "related_by_authors_ms": lookup_ms(lambda ids: gs.related_by_authors(ids, limit=5),
+                                                  sample, args.lookups)}
+    ap_bytes = gs._ap_indptr.nbytes + gs._ap_indices.nbytes + gs._paper_score.nbytes + len(gs.author_degree) * 4
+    new_row["reverse_index_mb"] = round(ap_bytes / 2**20, 1)
+    del gs
+    gc.collect()
+
+    n_legacy = min(args.papers, args.legacy_papers)
+    old = measure(lambda: legacy_graph(synthetic_papers(n_legacy, args.authors_per_paper, args.seed)))
+    graph = old.pop("obj")
+    legacy_sample = [n["id"] for n in graph["nodes"] if n["type"] == "paper"][:: max(1, n_legacy // 20)]
+    scale = args.papers / n_legacy
+    old_row = {
+        "papers_built": n_legacy,
+        "nodes": len(graph["nodes"]),
+        "edges": len(graph["edges"]),
+        **old,
+        "extrapolated_mb": round(old["mb"] * scale, 1),
+        # O(E^2) scan: a handful of lookups is plenty
+        "related_by_authors_ms": lookup_ms(lambda ids: legacy_related(graph, ids), legacy_sample, 5),
+    }
+    del graph
+
+    result = {"papers": args.papers, "graph_store": new_row, "legacy": old_row,
+              "memory_ratio": round(old_row["extrapolated_mb"] / max(new_row["mb"] + new_row["reverse_index_mb"], 0.1), 1)}
+    print(f"GraphStore  {new_row['papers']} papers, {new_row['authors']} authors, {new_row['edges']} edges: "
+          f"{new_row['mb']} MB (+{new_row['reverse_index_mb']} MB reverse index / centrality), build {new_row['build_s']}s, "
+          f"index {new_row['index_s']}s, "
+          f"related_by_authors {new_row['related_by_authors_ms']} ms")
+    print(f"list-of-dicts  {n_legacy} papers: {old_row['mb']} MB -> ~{old_row['extrapolated_mb']} MB "
+          f"at {args.papers}, related_by_authors {old_row['related_by_authors_ms']} ms (at {n_legacy} papers)")
+    print(f"memory ratio ~{result['memory_ratio']}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+def _build_store(path: Path, papers) -> GraphStore:
+    gs = GraphStore(path=path)
+    gs.add_papers(papers, save=False)
+    return gs
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Recall@k vs. memory vs. latency for the Qdrant storage modes.
+
+Creates one throwaway collection per mode on the configured Qdrant
+(settings.QDRANT_URL), fills it with the same clustered random vectors,
+and compares approximate search against exact numpy ground truth.
+
+    python -m benchmarks.bench_quantization --points 50000 --queries 200
+    python -m benchmarks.bench_quantization --modes none,scalar --json out.json
+
+Needs a Qdrant server (--url / QDRANT_URL): the local ":memory:" mode
+ignores quantization and HNSW, so recall and latency would be the same
+for every mode. RAM and disk use are measured: the sums of the
+collection's segment sizes from the server's telemetry, read once the
+collection is optimized (n/a on servers that don't report them).
+est_ram_mb is only a layout estimate (vectors + quantized vectors + HNSW
+links) for comparison.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from src.config import settings
+from src.db.vector_store import collection_kwargs, search_params
+
+MODES: Dict[str, Dict[str, Any]] = {
+    "none": {"QDRANT_QUANTIZATION": "none"},
+    "none_on_disk": {"QDRANT_QUANTIZATION": "none", "QDRANT_ON_DISK_VECTORS": True},
+    "scalar": {"QDRANT_QUANTIZATION": "scalar"},
+    "scalar_on_disk": {"QDRANT_QUANTIZATION": "scalar", "QDRANT_ON_DISK_VECTORS": True},
+    "scalar_no_rescore": {"QDRANT_QUANTIZATION": "scalar", "QDRANT_QUANTIZATION_RESCORE": False},
+    "binary": {"QDRANT_QUANTIZATION": "binary"},
+    "binary_on_disk": {"QDRANT_QUANTIZATION": "binary", "QDRANT_ON_DISK_VECTORS": True},
+}
+
+
+def make_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vecs = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs
+
+
+def estimate_ram_bytes(n: int, dim: int, cfg: Dict[str, Any]) -> int:
+    mode = cfg.get("QDRANT_QUANTIZATION", "none")
+    on_disk = cfg.get("QDRANT_ON_DISK_VECTORS", False)
+    always_ram = cfg.get("QDRANT_QUANTIZATION_ALWAYS_RAM", True)
+    m = cfg.get("HNSW_M", settings.HNSW_M)
+
+    total = 0 if on_disk else n * dim * 4
+    if mode == "scalar" and always_ram:
+        total += n * dim
+    elif mode == "binary" and always_ram:
+        total += n * dim // 8
+    # HNSW level 0 keeps 2*m links per point, upper levels are negligible
+    total += n * 2 * m * 4
+    return total
+
+
+def measured_usage(url: str, collection: str) -> Dict[str, Any]:
+    """RAM / disk bytes of the collection's segments from GET /telemetry (None if not reported)."""
+    headers = {"api-key": settings.QDRANT_API_KEY} if settings.QDRANT_API_KEY else {}
+    resp = httpx.get(f"{url.rstrip('/')}/telemetry", params={"details_level": 3}, headers=headers, timeout=30)
+    resp.raise_for_status()
+    collections = ((resp.json().get("result") or {}).get("collections") or {}).get("collections") or []
+    ram = disk = None
+    for coll in collections:
+        if coll.get("id") != collection:
+            continue
+        for shard in coll.get("shards") or []:
+            for segment in (shard.get("local") or {}).get("segments") or []:
+                info = segment.get("info") or {}
+                if info.get("ram_usage_bytes") is not None:
+                    ram = (ram or 0) + info["ram_usage_bytes"]
+                if info.get("disk_usage_bytes") is not None:
+                    disk = (disk or 0) + info["disk_usage_bytes"]
+    return {"ram_bytes": ram, "disk_bytes": disk}
+
+
+def _mb(n) -> Any:
+    return round(n / 2**20, 2) if n is not None else None
+
+
+def wait_for_green(client: QdrantClient, name: str, timeout: float = 600.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(name)
+        if str(getattr(info.status, "value", info.status)) == "green":
+            return
+        time.sleep(0.5)
+
+
+def run_mode(client: QdrantClient, url: str, name: str, cfg: Dict[str, Any], data: np.ndarray,
+             queries: np.ndarray, truth: np.ndarray, k: int, batch: int) -> Dict[str, Any]:
+    collection = f"bench_quant_{name}"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(collection_name=collection, **collection_kwargs(cfg))
+
+    t0 = time.perf_counter()
+    for start in range(0, len(data), batch):
+        chunk = data[start:start + batch]
+        client.upsert(
+            collection_name=collection,
+            points=[
+                PointStruct(id=start + i, vector=v.tolist(), payload={})
+                for i, v in enumerate(chunk)
+            ],
+        )
+    wait_for_green(client, collection)
+    build_s = time.perf_counter() - t0
+    usage = measured_usage(url, collection)
+
+    params = search_params(cfg)
+    latencies: List[float] = []
+    hits = 0
+    for qi, q in enumerate(queries):
+        t = time.perf_counter()
+        res = client.query_points(
+            collection_name=collection,
+            query=q.tolist(),
+            limit=k,
+            search_params=params,
+        ).points
+        latencies.append((time.perf_counter() - t) * 1000)
+        hits += len({p.id for p in res} & set(truth[qi].tolist()))
+
+    client.delete_collection(collection)
+
+    lat = np.array(latencies)
+    return {
+        "mode": name,
+        "config": cfg,
+        f"recall@{k}": round(hits / (len(queries) * k), 4),
+        "ram_mb": _mb(usage["ram_bytes"]),
+        "disk_mb": _mb(usage["disk_bytes"]),
+        "est_ram_mb": round(estimate_ram_bytes(len(data), data.shape[1], cfg) / 2**20, 2),
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "qps": round(len(lat) / (lat.sum() / 1000), 1),
+        "build_s": round(build_s, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=settings.QDRANT_URL)
+    ap.add_argument("--points", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--dim", type=int, default=settings.VECTOR_SIZE)
+    ap.add_argument("--clusters", type=int, default=64)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--batch", type=int, default=512)
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    if not args.url or args.url == ":memory:":
+        ap.error("needs a Qdrant server (--url or QDRANT_URL); local mode ignores quantization and HNSW")
+    client = QdrantClient(url=args.url, api_key=settings.QDRANT_API_KEY)
+
+    data = make_vectors(args.points, args.dim, args.clusters, args.seed)
+    queries = make_vectors(args.queries, args.dim, args.clusters, args.seed + 1)
+    truth = np.argsort(-(queries @ data.T), axis=1)[:, :args.k]
+
+    results = []
+    for name in args.modes.split(","):
+        name = name.strip()
+        row = run_mode(client, args.url, name, MODES[name], data, queries, truth, args.k, args.batch)
+        results.append(row)
+        print(
+            f"{name:<20} recall@{args.k}={row[f'recall@{args.k}']:<7} "
+            f"ram={row['ram_mb']} MB disk={row['disk_mb']} MB (layout est. {row['est_ram_mb']} MB)  p50={row['p50_ms']:>7} ms  "
+            f"p95={row['p95_ms']:>7} ms  qps={row['qps']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"points": args.points, "dim": args.dim, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Memory of a multi-worker deployment with and without pre-fork model sharing.
+
+Starts `gunicorn -c gunicorn.conf.py main:api` with N workers, once with
+PRELOAD_SHARED_MODELS=false and once with true, waits until the workers
+are warmed up, optionally sends some /generate traffic, and reads
+/proc/<pid>/smaps_rollup for the master and every worker:
+
+    python -m benchmarks.bench_worker_memory --workers 4
+    python -m benchmarks.bench_worker_memory --workers 4 --requests 20 --json mem.json
+
+RSS double-counts shared pages, so compare PSS (shared pages split between
+the processes that map them) and USS (private pages only). Linux only.
+Runs with LLM_PROVIDER=mock and in-memory Qdrant unless overridden in the
+environment, so no external services are needed.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    kids = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        text = (task / "children").read_text().split()
+        kids.extend(int(k) for k in text)
+    return kids
+
+
+def _smaps(pid: int) -> Dict[str, int]:
+    """Rss / Pss / Uss in kB from smaps_rollup."""
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        fields[key] = int(value.split()[0])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _get(url: str, timeout: float = 5.0) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status
+    except Exception:
+        return 0
+
+
+def _generate(url: str, topic: str):
+    req = urllib.request.Request(
+        f"{url}/generate",
+        data=json.dumps({"topic": topic}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        urllib.request.urlopen(req, timeout=180).read()
+    except Exception as e:
+        print(f"  /generate failed: {e}", file=sys.stderr)
+
+
+def measure(preload: bool, workers: int, requests: int, settle: float) -> Dict:
+    port = _free_port()
+    env = {
+        "LLM_PROVIDER": "mock",
+        "QDRANT_URL": ":memory:",
+        "MOCK_LLM_LATENCY_MS": "5",
+        "MOCK_LLM_TOKENS_PER_SEC": "100000",
+        "LLM_RATE_LIMIT": "false",
+        **os.environ,
+        "PRELOAD_SHARED_MODELS": "true" if preload else "false",
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:api"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        t0 = time.perf_counter()
+        # readiness is per worker and requests land on arbitrary workers,
+        # so require a run of consecutive ready answers
+        streak = 0
+        while streak < workers * 3:
+            if proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            streak = streak + 1 if _get(f"{url}/health/ready") == 200 else 0
+            time.sleep(0.1)
+        ready_s = time.perf_counter() - t0
+
+        for i in range(requests):
+            _generate(url, f"memory benchmark topic {i % 5}")
+        time.sleep(settle)
+
+        master = _smaps(proc.pid)
+        worker_pids = _children(proc.pid)
+        per_worker = [_smaps(pid) for pid in worker_pids]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    total = {k: master[k] + sum(w[k] for w in per_worker) for k in master}
+    return {
+        "preload": preload,
+        "workers": len(per_worker),
+        "seconds_to_ready": round(ready_s, 2),
+        "master": master,
+        "per_worker": per_worker,
+        "total_mb": {k.replace("_kb", ""): round(v / 1024, 1) for k, v in total.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=0, help="/generate calls before measuring")
+    ap.add_argument("--settle", type=float, default=2.0, help="seconds to wait before reading memory")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = []
+    for preload in (False, True):
+        row = measure(preload, args.workers, args.requests, args.settle)
+        results.append(row)
+        t = row["total_mb"]
+        print(f"preload={str(preload):<5} workers={row['workers']} ready={row['seconds_to_ready']}s "
+              f"total RSS={t['rss']} MB PSS={t['pss']} MB USS={t['uss']} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
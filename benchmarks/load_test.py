@@ -0,0 +1,181 @@
+"""
+End-to-end load test for POST /generate.
+
+By default the API is started in-process on a free port with the mock LLM
+(LLM_PROVIDER=mock) and in-memory Qdrant seeded with a small synthetic
+corpus, so no Groq quota or Qdrant server is needed:
+
+    python -m benchmarks.load_test --users 16 --requests 4
+    python -m benchmarks.load_test --users 32 --mock-latency-ms 800 --mock-tps 120
+
+The in-process server runs without the LLM rate limiter; add --rate-limit to
+see the Groq free-tier quotas' effect on the mock model.
+
+Point it at a running deployment instead with --url (the server then uses
+whatever LLM_PROVIDER it was started with):
+
+    python -m benchmarks.load_test --url http://localhost:8000 --users 8
+
+Each of the N users sends its requests back to back. Reported per run:
+client latency percentiles, throughput, server-side queueing delay
+(time waiting for a worker thread) and per-node latency from the
+`stats` block of every response.
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.config import settings
+
+TOPICS = [
+    "retrieval augmented generation",
+    "graph neural networks for molecules",
+    "speech recognition with transformers",
+    "offline reinforcement learning",
+    "vision transformers for segmentation",
+    "adaptive optimizers for deep learning",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(seed_papers: int) -> str:
+    """Run main:api in a background thread with the mock LLM and in-memory Qdrant."""
+    settings.LLM_PROVIDER = "mock"
+    settings.QDRANT_URL = ":memory:"
+
+    import uvicorn
+    from benchmarks.bench_retrieval import index_corpus, make_encoder, synthetic_corpus
+    from main import api
+    from src.services import registry
+
+    rag = registry.get_rag_service()
+    rag.vs.encoder = make_encoder("auto")
+    corpus, queries = synthetic_corpus(seed_papers, 3, seed=0)
+    index_corpus(rag.vs, rag.gs, corpus, queries, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def _post(url: str, topic: str, timeout: float) -> Dict[str, Any]:
+    req = urllib.request.Request(
+        f"{url}/generate",
+        data=json.dumps({"topic": topic}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = json.loads(resp.read())
+        ok = True
+    except Exception as e:
+        body, ok = {"error": str(e)}, False
+    return {"ok": ok, "ms": (time.perf_counter() - t0) * 1000, "body": body}
+
+
+def _pcts(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    arr = np.array(values)
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "p99": round(float(np.percentile(arr, 99)), 1),
+        "max": round(float(arr.max()), 1),
+    }
+
+
+def run(url: str, users: int, requests: int, timeout: float) -> Dict[str, Any]:
+    def user(u: int):
+        return [_post(url, TOPICS[(u + i) % len(TOPICS)], timeout) for i in range(requests)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = [r for batch in pool.map(user, range(users)) for r in batch]
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if r["ok"]]
+    per_node: Dict[str, List[float]] = {}
+    queue_ms, server_ms = [], []
+    coalesced = 0
+    for r in ok:
+        stats = r["body"].get("stats", {})
+        coalesced += bool(stats.get("coalesced"))
+        if "queue_ms" in stats:
+            queue_ms.append(stats["queue_ms"])
+        if "server_ms" in stats:
+            server_ms.append(stats["server_ms"])
+        for entry in stats.get("nodes", []):
+            per_node.setdefault(entry["node"], []).append(entry["ms"])
+
+    return {
+        "users": users,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "coalesced": coalesced,
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 3),
+        "latency_ms": _pcts([r["ms"] for r in ok]),
+        "server_ms": _pcts(server_ms),
+        "queue_ms": _pcts(queue_ms),
+        "nodes_ms": {name: _pcts(v) for name, v in per_node.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target an already running API instead of an in-process one")
+    ap.add_argument("--users", type=int, default=8, help="concurrent users")
+    ap.add_argument("--requests", type=int, default=3, help="requests per user")
+    ap.add_argument("--timeout", type=float, default=180.0)
+    ap.add_argument("--mock-latency-ms", type=float, default=settings.MOCK_LLM_LATENCY_MS)
+    ap.add_argument("--mock-tps", type=float, default=settings.MOCK_LLM_TOKENS_PER_SEC)
+    ap.add_argument("--seed-papers", type=int, default=30)
+    ap.add_argument("--rate-limit", action="store_true",
+                    help="enable the per-model RPM/TPM limiter (Groq free-tier quotas) in the in-process server")
+    ap.add_argument("--json", help="write the report to this file")
+    args = ap.parse_args()
+
+    url = args.url
+    if not url:
+        settings.MOCK_LLM_LATENCY_MS = args.mock_latency_ms
+        settings.MOCK_LLM_TOKENS_PER_SEC = args.mock_tps
+        # off by default: with the mock model the Groq quotas would dominate the numbers
+        settings.LLM_RATE_LIMIT = args.rate_limit
+        url = start_local_server(args.seed_papers)
+
+    report = run(url, args.users, args.requests, args.timeout)
+
+    print(f"users={report['users']} requests={report['requests']} errors={report['errors']} "
+          f"coalesced={report['coalesced']} "
+          f"wall={report['wall_s']}s throughput={report['throughput_rps']} req/s")
+    for key in ("latency_ms", "server_ms", "queue_ms"):
+        print(f"  {key:<11} {report[key]}")
+    for name, p in report["nodes_ms"].items():
+        print(f"  node {name:<10} {p}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
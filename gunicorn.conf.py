@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+#
+# Multi-worker deployment:
+#
+#   gunicorn -c gunicorn.conf.py main:api
+#
+# `uvicorn --workers N` spawns fresh interpreters, so every worker loads its
+# own SentenceTransformer and graph. Under gunicorn the workers are forked
+# from the master; with PRELOAD_SHARED_MODELS=true the master loads the
+# encoder weights and GraphStore once and the workers share those pages
+# copy-on-write (see registry.preload_shared).
+
+import os
+
+from src.config import settings
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 300
+preload_app = settings.PRELOAD_SHARED_MODELS
+
+
+def when_ready(server):
+    # runs in the master after the app is loaded, before any worker is forked
+    if settings.PRELOAD_SHARED_MODELS:
+        from src.services import registry
+        registry.preload_shared()
+
+
+def post_fork(server, worker):
+    from src.services import registry
+    registry.configure_worker()
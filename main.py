@@ -1,31 +1,43 @@
-from typing import Any, Dict, List, Union
-import io
+from typing import Any, Dict, List, Optional, Union
+import time
 import uuid
 import sys
 import traceback
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from pypdf import PdfReader
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from starlette.requests import Request as HTTPRequest
+from pydantic import BaseModel, Field
 
-from src.workflow import app as agent_app
+from src.config import settings
+from src.services import registry
 from src.services.ingest_service import IngestService
-from src.services.migration_service import MigrationService
 from src.logger import get_logger
+from src import metrics, telemetry
+from src.agents.budget import DeadlineExceeded
+from src.agents import revision_policy
+from src.agents.rate_limit import LLMUnavailable
+from src.agents.router import estimated_savings_ms
+from src.utils.singleflight import FlightTimeout, SingleFlight
+from src.utils.pdf import iter_pdf_pages
+from src.utils.text import normalize_topic
+
+# The workflow graph itself is cheap to compile; the agents behind it are
+# built lazily through the registry (see src/services/registry.py).
+from src.workflow import app as agent_app
 
 log = get_logger("Main")
 
+HTTP_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Request latency per route", ["method", "route", "status"]
+)
+
 # ----------------------------------------------------------
 # FastAPI app (this is what Render loads as main:api)
 # ----------------------------------------------------------
 api = FastAPI(title="ScholarFlow API")
 
-# We'll initialize these on startup instead of at import time
-ingestor: IngestService | None = None
-migration_service: MigrationService | None = None
-startup_error: str | None = None
-
 # ----------------------------------------------------------
 # CORS
 # ----------------------------------------------------------
@@ -37,88 +49,100 @@ api.add_middleware(
 )
 
 
+@api.middleware("http")
+async def stamp_arrival(request: HTTPRequest, call_next):
+    # sync endpoints run in a thread pool; handlers compare against this
+    # timestamp to report how long the request queued for a worker thread
+    request.state.received_at = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # route template (e.g. "/admin/stats"), not the raw path, to keep cardinality low
+        route = request.scope.get("route")
+        HTTP_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code,
+        ).observe(time.perf_counter() - request.state.received_at)
+
+
 @api.get("/")
 def root():
     return {"status": "ok", "service": "scholarflow-api"}
 
 # ----------------------------------------------------------
-# Health check - now reports startup status
+# Health checks
+#   /health/live  – process is up (never touches services)
+#   /health/ready – warm-up finished, safe to route traffic here
+#   /health       – summary of both, kept for existing monitors
 # ----------------------------------------------------------
+@api.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+
+@api.get("/health/ready")
+def readiness():
+    report = registry.startup_report()
+    if not registry.is_ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting", **report},
+        )
+    return {"status": "ready", **report}
+
+
 @api.get("/health")
 def healthcheck():
-    if startup_error:
-        return {
-            "status": "degraded",
-            "error": startup_error,
-            "ingestor": ingestor is not None,
-            "migration_service": migration_service is not None,
-        }
+    report = registry.startup_report()
     return {
-        "status": "ok",
-        "ingestor": ingestor is not None,
-        "migration_service": migration_service is not None,
+        "status": "degraded" if report["warmup_error"] else "ok",
+        "ready": registry.is_ready(),
+        "error": report["warmup_error"],
+        "ingestor": registry.peek("ingest_service") is not None,
+        "migration_service": registry.peek("migration_service") is not None,
     }
 
 # ----------------------------------------------------------
-# Startup — init services & run migration in background
+# Startup — no blocking work; services warm up in the background
 # ----------------------------------------------------------
 @api.on_event("startup")
 async def startup_event():
-    global ingestor, migration_service, startup_error
-
-    log.info("🚀 FastAPI startup: initializing services")
-    print("🚀 FastAPI startup: initializing services", file=sys.stderr)
+    if settings.WARMUP_ON_STARTUP:
+        log.info("🚀 FastAPI startup: warming up services in the background")
+        print("🚀 FastAPI startup: warming up services in the background", file=sys.stderr)
+        registry.start_background_warm_up()
+    else:
+        log.info("🚀 FastAPI startup: services initialize lazily on first use")
+        print("🚀 FastAPI startup: services initialize lazily on first use", file=sys.stderr)
 
-    # Initialize IngestService
-    try:
-        if ingestor is None:
-            log.info("Initializing IngestService...")
-            print("Initializing IngestService...", file=sys.stderr)
-            ingestor = IngestService()
-            log.info("✅ IngestService initialized")
-            print("✅ IngestService initialized", file=sys.stderr)
-    except Exception as e:
-        error_msg = f"Failed to initialize IngestService: {e}"
-        log.exception(error_msg)
-        print(f"❌ {error_msg}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        startup_error = error_msg
-        # Don't return - continue with partial initialization
 
-    # Initialize MigrationService
+def _get_ingestor() -> IngestService:
+    """Shared IngestService, built on first use; 503 if it cannot be built."""
     try:
-        if migration_service is None:
-            log.info("Initializing MigrationService...")
-            print("Initializing MigrationService...", file=sys.stderr)
-            migration_service = MigrationService()
-            log.info("✅ MigrationService initialized")
-            print("✅ MigrationService initialized", file=sys.stderr)
-            
-            # Start background migration
-            migration_service.start_background_migration()
-            log.info("🚀 Started background migration worker")
-            print("🚀 Started background migration worker", file=sys.stderr)
+        return registry.get_ingest_service()
     except Exception as e:
-        error_msg = f"Failed to initialize MigrationService: {e}"
-        log.exception(error_msg)
-        print(f"❌ {error_msg}", file=sys.stderr)
+        log.exception(f"Failed to initialize IngestService: {e}")
         print(traceback.format_exc(), file=sys.stderr)
-        if startup_error:
-            startup_error += f"; {error_msg}"
-        else:
-            startup_error = error_msg
-
-    # Final startup status
-    if startup_error:
-        print(f"⚠️  Server started with errors: {startup_error}", file=sys.stderr)
-    else:
-        print("✅ All services initialized successfully", file=sys.stderr)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Ingest service not available: {e}. Check /health for details.",
+        )
 
 # ----------------------------------------------------------
 # Models & helpers
 # ----------------------------------------------------------
 class Request(BaseModel):
     topic: str
+    # overrides GENERATE_BUDGET_S for this request
+    budget_s: Optional[float] = Field(default=None, gt=0)
+
+
+# Concurrent requests for the same (normalized) topic share one workflow run
+_generate_flight = SingleFlight("generate")
 
 
 def _compute_token_count(text_or_list: Union[str, List[str], None]) -> int:
@@ -135,18 +159,43 @@ def _compute_token_count(text_or_list: Union[str, List[str], None]) -> int:
 # Main research endpoint
 # ----------------------------------------------------------
 @api.post("/generate")
-def generate_review(req: Request):
+def generate_review(req: Request, http_request: HTTPRequest):
     """
     Call the research workflow and return:
     - review      : final draft text
     - critique    : self-critique
     - queries     : search plan
-    - stats       : simple token stats for LLM vs retrieved text
+    - stats       : LLM token usage vs retrieved text, retrieval hits,
+                    revisions, per-node stats, server and queueing time (ms)
     - citations   : list of {title, url, snippet} for clickable refs
     """
+    started = time.perf_counter()
+    received = getattr(http_request.state, "received_at", started)
     try:
-        init_state: Dict[str, Any] = {"task": req.topic, "revision_count": 0}
-        result: Dict[str, Any] = agent_app.invoke(init_state)
+        budget_s = req.budget_s or settings.GENERATE_BUDGET_S
+        init_state: Dict[str, Any] = {
+            "task": req.topic,
+            "revision_count": 0,
+            "policy_arm": revision_policy.assign_arm(req.topic),
+            # time spent queued for a worker thread counts against the budget
+            "deadline": received + budget_s if budget_s > 0 else None,
+        }
+        shared = False
+        if settings.GENERATE_SINGLE_FLIGHT:
+            # only requests with the same budget share a run: a leader with a
+            # longer budget could outlive the follower's deadline, a shorter
+            # one would hand it a cut-down result; the follower also never
+            # waits past its own deadline
+            deadline = init_state["deadline"]
+            try:
+                result, shared = _generate_flight.do(
+                    (normalize_topic(req.topic), budget_s), lambda: agent_app.invoke(init_state),
+                    timeout=None if deadline is None else max(deadline - time.perf_counter(), 0.0),
+                )
+            except FlightTimeout as e:
+                raise DeadlineExceeded(str(e)) from e
+        else:
+            result = agent_app.invoke(init_state)
 
         draft = result.get("draft", "") or ""
         critique = result.get("critique", "") or ""
@@ -159,7 +208,17 @@ def generate_review(req: Request):
             or result.get("retrieval", "")
         )
 
-        llm_tokens = _compute_token_count(draft)
+        run_stats = telemetry.summarize(
+            result.get("node_stats", []), result.get("revision_count", 0), record=not shared
+        )
+        if not shared:
+            revision_policy.record_run(
+                result.get("policy_arm", ""), run_stats,
+                time.perf_counter() - started, result.get("verdict"),
+            )
+        # real completion tokens from the LLM responses; word count only if
+        # the provider did not report usage
+        llm_tokens = run_stats["completion_tokens"] or _compute_token_count(draft)
         retrieved_tokens = _compute_token_count(retrieved_context)
 
         # citations / references (best-effort normalization)
@@ -199,9 +258,32 @@ def generate_review(req: Request):
             "stats": {
                 "llm_tokens": llm_tokens,
                 "retrieved_tokens": retrieved_tokens,
+                **run_stats,
+                "coalesced": shared,
+                "route": result.get("route"),
+                "route_savings_ms": estimated_savings_ms(result.get("route"), run_stats["nodes"]),
+                "policy_arm": result.get("policy_arm"),
+                "critic_score": (result.get("verdict") or {}).get("score"),
+                "budget_s": budget_s or None,
+                "budget_actions": result.get("budget_actions", []),
+                "queue_ms": round((started - received) * 1000, 2),
+                "server_ms": round((time.perf_counter() - received) * 1000, 2),
             },
             "citations": citations,
         }
+    except DeadlineExceeded as e:
+        log.error(f"Latency budget exhausted before a draft was ready: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Could not produce a review within the latency budget: {str(e)}",
+        )
+    except LLMUnavailable as e:
+        log.error(f"LLM provider unavailable: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"LLM provider is rate limiting or unavailable, retry later: {str(e)}",
+            headers={"Retry-After": str(int(settings.GROQ_BACKOFF_MAX_S))},
+        )
     except Exception as e:
         log.exception(f"Error generating review: {e}")
         raise HTTPException(
@@ -213,28 +295,21 @@ def generate_review(req: Request):
 # Upload PDF — basic ingestion
 # ----------------------------------------------------------
 @api.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
-    if ingestor is None:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Ingest service not initialized. Check /health for details.",
-        )
+def upload_pdf(file: UploadFile = File(...)):
+    # sync handler: FastAPI runs it in the threadpool, so extraction and
+    # embedding don't block the event loop
+    ingestor = _get_ingestor()
 
     try:
-        content = await file.read()
-        reader = PdfReader(io.BytesIO(content))
-        extracted = ""
-
-        for page in reader.pages:
-            extracted += page.extract_text() or ""
-
+        content = file.file.read()
         title = file.filename.replace(".pdf", "")
         paper_id = str(uuid.uuid4())[:8]
 
-        ingestor.ingest_text(
+        # pages are chunked and embedded as they are extracted
+        result = ingestor.ingest_pages(
             paper_id=paper_id,
             title=title,
-            text=extracted,
+            pages=iter_pdf_pages(content),
             source="Upload",
         )
 
@@ -242,6 +317,7 @@ async def upload_pdf(file: UploadFile = File(...)):
             "status": "indexed",
             "title": title,
             "paper_id": paper_id,
+            "references": result["references"],
         }
     except Exception as e:
         log.exception(f"Error uploading PDF: {e}")
@@ -255,11 +331,8 @@ async def upload_pdf(file: UploadFile = File(...)):
 # ----------------------------------------------------------
 @api.post("/admin/clear_vector_db")
 def clear_vector_db():
-    if ingestor is None or getattr(ingestor, "vs", None) is None:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Vector store not initialized",
-        )
+    ingestor = _get_ingestor()
+    migration_service = registry.peek("migration_service")
 
     try:
         ingestor.vs.clear_collection()
@@ -278,11 +351,47 @@ def clear_vector_db():
             detail=f"Failed to clear vector DB: {str(e)}"
         )
 
+# ----------------------------------------------------------
+# Admin — vector index / storage config (quantization, on-disk, HNSW)
+# ----------------------------------------------------------
+class VectorConfigUpdate(BaseModel):
+    QDRANT_QUANTIZATION: Optional[str] = None
+    QDRANT_QUANTIZATION_ALWAYS_RAM: Optional[bool] = None
+    QDRANT_QUANTIZATION_RESCORE: Optional[bool] = None
+    QDRANT_QUANTIZATION_OVERSAMPLING: Optional[float] = None
+    QDRANT_ON_DISK_VECTORS: Optional[bool] = None
+    QDRANT_ON_DISK_PAYLOAD: Optional[bool] = None
+    HNSW_M: Optional[int] = None
+    HNSW_EF_CONSTRUCT: Optional[int] = None
+    HNSW_EF: Optional[int] = None
+
+
+@api.get("/admin/vector_config")
+def get_vector_config():
+    return _get_ingestor().vs.vector_config()
+
+
+@api.post("/admin/vector_config")
+def update_vector_config(update: VectorConfigUpdate):
+    ingestor = _get_ingestor()
+    changes = {k: v for k, v in update.model_dump().items() if v is not None}
+    try:
+        return {"status": "updated", "config": ingestor.vs.update_collection_config(**changes)}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        log.exception(f"Error updating vector config: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to update vector config: {str(e)}"
+        )
+
 # ----------------------------------------------------------
 # Admin — migration status
 # ----------------------------------------------------------
 @api.get("/admin/migration_status")
 def migration_status():
+    migration_service = registry.peek("migration_service")
     if migration_service is None:
         return {
             "running": False,
@@ -298,6 +407,7 @@ def migration_status():
         "finished": migration_service.finished,
         "migrated": migration_service.migrated,
         "errors": migration_service.errors,
+        "papers_indexed": migration_service.papers_indexed,
         "uptime": getattr(migration_service, "uptime", "N/A"),
     }
 
@@ -306,14 +416,8 @@ def migration_status():
 # ----------------------------------------------------------
 @api.post("/admin/restart_migration")
 def restart_migration():
-    if migration_service is None:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Migration service not initialized",
-        )
-
     try:
-        migration_service.start_background_migration()
+        registry.get_migration_service().start_background_migration()
         return {"status": "restarted"}
     except Exception as e:
         log.exception(f"Error restarting migration: {e}")
@@ -322,12 +426,51 @@ def restart_migration():
             detail=f"Failed to restart migration: {str(e)}"
         )
 
+# ----------------------------------------------------------
+# Graph — bounded subgraph view
+# ----------------------------------------------------------
+@api.get("/graph/subgraph")
+def graph_subgraph(
+    paper_id: List[str] = Query(default=[]),
+    author: List[str] = Query(default=[]),
+    depth: int = Query(default=2, ge=1, le=4),
+    max_nodes: Optional[int] = Query(default=None, ge=1),
+    max_edges: Optional[int] = Query(default=None, ge=1),
+    format: str = Query(default="html", pattern="^(html|json)$"),
+):
+    """
+    Ego network around the given papers / authors (repeat the parameter
+    for several), or the most prolific authors without seeds; 404 when
+    seeds are given and none of them is in the graph. Node and edge counts
+    are capped by GRAPH_VIS_MAX_NODES / GRAPH_VIS_MAX_EDGES.
+    """
+    service = registry.get_graph_service()
+    unknown = service.unknown_seeds(paper_id, author)
+    if unknown and len(unknown) == len(paper_id) + len(author):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Not in the graph: {unknown}")
+    try:
+        if format == "json":
+            return service.subgraph(paper_id, author, depth, max_nodes, max_edges)
+        return HTMLResponse(service.visualize_subgraph(paper_id, author, depth, max_nodes, max_edges))
+    except Exception as e:
+        log.exception(f"Error rendering subgraph: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to render subgraph: {str(e)}"
+        )
+
 # ----------------------------------------------------------
 # Admin — corpus stats for Knowledge Base
 # ----------------------------------------------------------
+_stats_cache: Dict[str, Any] = {"at": 0.0, "value": None}
+
+
 @api.get("/admin/stats")
 def corpus_stats():
-    if ingestor is None:
+    try:
+        ingestor = registry.get_ingest_service()
+    except Exception as e:
+        log.exception(f"Failed to initialize IngestService: {e}")
         return {
             "documents": 0,
             "passages": 0,
@@ -335,17 +478,57 @@ def corpus_stats():
             "message": "Ingestor not initialized"
         }
 
-    return {
-        "documents": getattr(ingestor, "documents_count", 0),
-        "passages": getattr(ingestor, "passages_count", 0),
-        "embeddings": getattr(ingestor, "embeddings_count", 0),
-    }
+    # exact Qdrant counts scan the collection; keep them for a few seconds
+    now = time.monotonic()
+    cached = _stats_cache["value"] is not None and now - _stats_cache["at"] < settings.ADMIN_STATS_TTL_S
+    metrics.record_cache("admin_stats", cached)
+    if cached:
+        return _stats_cache["value"]
+
+    try:
+        passages = ingestor.vs.count()
+        value = {
+            "documents": ingestor.vs.count(paper_level=True),
+            "passages": passages,
+            "embeddings": passages,  # one vector per passage
+            "graph": registry.get_graph_store().stats(),
+        }
+    except Exception as e:
+        log.exception(f"Error computing corpus stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute corpus stats: {str(e)}"
+        )
+
+    _stats_cache.update(at=now, value=value)
+    return value
+
+# ----------------------------------------------------------
+# Prometheus scrape endpoint
+# ----------------------------------------------------------
+@api.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
+
+# ----------------------------------------------------------
+# Admin — aggregated workflow histograms (node time, tokens, hits)
+# ----------------------------------------------------------
+@api.get("/admin/workflow_stats")
+def workflow_stats():
+    return metrics.snapshot()
+
+
+@api.get("/admin/revision_policy_stats")
+def revision_policy_stats():
+    """Latency / token cost / final critic score per revision policy arm."""
+    return revision_policy.stats()
 
 # ----------------------------------------------------------
 # Admin — recent logs
 # ----------------------------------------------------------
 @api.get("/admin/logs")
 def admin_logs():
+    migration_service = registry.peek("migration_service")
     if migration_service is None:
         return {"logs": [], "message": "Migration service not initialized"}
 
@@ -368,6 +551,14 @@ def admin_logs():
     return {"logs": normalized}
 
 
+# ----------------------------------------------------------
+# Admin — startup timing report
+# ----------------------------------------------------------
+@api.get("/admin/startup")
+def startup_timing():
+    return registry.startup_report()
+
+
 # ----------------------------------------------------------
 # Debug endpoint to check environment
 # ----------------------------------------------------------
@@ -377,9 +568,9 @@ def debug_info():
     import os
     
     return {
-        "startup_error": startup_error,
-        "ingestor_initialized": ingestor is not None,
-        "migration_service_initialized": migration_service is not None,
+        "startup_error": registry.startup_report()["warmup_error"],
+        "ingestor_initialized": registry.peek("ingest_service") is not None,
+        "migration_service_initialized": registry.peek("migration_service") is not None,
         "environment_vars": {
             "PORT": os.environ.get("PORT", "not set"),
             # Add other non-sensitive env vars you want to check
@@ -0,0 +1,51 @@
+# src/agents/budget.py
+
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from src.telemetry import NODE_SECONDS
+
+# Typical node durations used until the histograms have observations
+_PRIOR_SECONDS = {"Router": 1.0, "Planner": 2.0, "Researcher": 1.0, "Writer": 30.0, "Critic": 3.0}
+
+# Deadline (time.perf_counter() domain) of the request the current node
+# runs for; read by the LLM rate limiter so it never queues past it.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's latency budget ran out before the work could finish."""
+
+
+@contextmanager
+def scope(deadline: Optional[float]):
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(deadline: Optional[float] = None) -> float:
+    """Seconds left until `deadline` (or the current scope's); inf without one."""
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is None:
+        return math.inf
+    return deadline - time.perf_counter()
+
+
+def node_estimate(node: str) -> float:
+    """Median duration of `node` in this process, from workflow_node_seconds."""
+    child = NODE_SECONDS.labels(node=node)
+    if child.count == 0:
+        return _PRIOR_SECONDS.get(node, 0.0)
+    return child.quantile(0.5)
+
+
+def can_afford(deadline: Optional[float], *nodes: str) -> bool:
+    """Whether the typical durations of `nodes` fit in the remaining budget."""
+    return remaining(deadline) >= sum(node_estimate(n) for n in nodes)
@@ -0,0 +1,149 @@
+# src/agents/mock_llm.py
+
+import hashlib
+import json
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.config import settings
+from src.utils.text import approx_tokens
+
+
+class MockChatModel(BaseChatModel):
+    """
+    Deterministic local stand-in for ChatGroq (LLM_PROVIDER=mock).
+
+    Sleeps for `latency_ms` plus completion_tokens / `tokens_per_sec`
+    to mimic time-to-first-token and generation speed, and answers the
+    planner / writer / critic prompts with canned but well-formed output.
+    Responses depend only on the prompt, so load tests are repeatable.
+    Usage metadata is filled in the same shape as Groq responses; streaming
+    emits the text in small pieces at the same pace, usage on the last one.
+    """
+
+    model: str = "mock"
+    latency_ms: float = 300.0
+    tokens_per_sec: float = 250.0
+    revise_rate: float = 0.3
+    draft_tokens: int = 600
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock-chat"
+
+    def _respond(self, prompt: str, digest: int) -> str:
+        if "search queries" in prompt:
+            m = re.search(r"topic: '(.*?)'", prompt, re.S)
+            task = m.group(1) if m else "the topic"
+            m = re.search(r"Generate (\d+)", prompt)
+            n = int(m.group(1)) if m else 3
+            aspects = ("overview", "methods", "evaluation", "benchmarks", "applications", "limitations")
+            return json.dumps({"queries": [f"{task} {aspects[i % len(aspects)]}" for i in range(n)]})
+
+        if "Classify the complexity" in prompt:
+            m = re.search(r"topic: '(.*?)'", prompt, re.S)
+            words = len((m.group(1) if m else "").split())
+            return json.dumps({"complexity": "simple" if words <= 8 else "complex"})
+
+        if "academic reviewer" in prompt:
+            # a noisy critic: REVISE verdicts mix low and borderline scores,
+            # fixable and cosmetic issues
+            if (digest % 1000) / 1000 < self.revise_rate:
+                issue = (
+                    {"type": "missing_citations", "fixable": True,
+                     "detail": "Add more citations to the retrieved sources"},
+                    {"type": "style", "fixable": False, "detail": "Tighten the wording of the conclusion"},
+                    {"type": "structure", "fixable": True, "detail": "Merge overlapping sections"},
+                )[(digest // 1000) % 3]
+                return json.dumps({"verdict": "REVISE", "score": 4 + (digest // 7) % 4, "issues": [issue]})
+            return json.dumps({"verdict": "APPROVE", "score": 7 + digest % 3, "issues": []})
+
+        if "Rewrite the section" in prompt:
+            m = re.search(r"SECTION:\s*(## [^\n]*)", prompt)
+            heading = m.group(1) if m else "## Section"
+            return f"{heading}\n\n{self._words(digest, self.draft_tokens // 4)} [Vector] [Graph]\n\n"
+
+        headings = ("Overview", "Methods", "Findings", "Conclusion")
+        sections = "".join(
+            f"## {h}\n\n{self._words(digest + i, self.draft_tokens // len(headings))} [Vector]\n\n"
+            for i, h in enumerate(headings)
+        )
+        return f"# Literature Review\n\n{sections}"
+
+    @staticmethod
+    def _words(seed: int, tokens: int) -> str:
+        return " ".join(f"finding{(seed + i) % 97}" for i in range(max(1, tokens * 3 // 4)))
+
+    def _prepare(self, messages: List[BaseMessage]):
+        prompt = "\n".join(str(m.content) for m in messages)
+        digest = int(hashlib.sha1(prompt.encode()).hexdigest()[:8], 16)
+        content = self._respond(prompt, digest)
+        prompt_tokens = approx_tokens(prompt)
+        completion_tokens = approx_tokens(content)
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return content, usage
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        content, usage = self._prepare(messages)
+        time.sleep(self.latency_ms / 1000)
+        step = 64  # characters, ~16 tokens per chunk
+        for i in range(0, len(content), step):
+            piece = content[i:i + step]
+            time.sleep(approx_tokens(piece) / max(self.tokens_per_sec, 1e-6))
+            last = i + step >= len(content)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece, usage_metadata=usage if last else None,
+            ))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        content, usage = self._prepare(messages)
+        time.sleep(self.latency_ms / 1000 + usage["output_tokens"] / max(self.tokens_per_sec, 1e-6))
+
+        token_usage = {
+            "prompt_tokens": usage["input_tokens"],
+            "completion_tokens": usage["output_tokens"],
+            "total_tokens": usage["total_tokens"],
+        }
+        message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(
+            generations=[ChatGeneration(message=message, generation_info={"finish_reason": "stop"})],
+            llm_output={"token_usage": token_usage, "model_name": self.model},
+        )
+
+
+def make_chat_model(model: str) -> BaseChatModel:
+    """ChatGroq for `model`, or the local mock when LLM_PROVIDER=mock."""
+    if settings.LLM_PROVIDER == "mock":
+        return MockChatModel(
+            model=model,
+            latency_ms=settings.MOCK_LLM_LATENCY_MS,
+            tokens_per_sec=settings.MOCK_LLM_TOKENS_PER_SEC
+            * (settings.MOCK_LLM_FAST_SPEEDUP if model == settings.LLM_FAST else 1.0),
+            revise_rate=settings.MOCK_LLM_REVISE_RATE,
+            draft_tokens=settings.MOCK_LLM_DRAFT_TOKENS,
+        )
+
+    from langchain_groq import ChatGroq
+    # retries are handled by src.agents.rate_limit, under the shared limiter
+    return ChatGroq(model=model, api_key=settings.GROQ_API_KEY, max_retries=0)
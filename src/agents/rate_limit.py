@@ -0,0 +1,203 @@
+# src/agents/rate_limit.py
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.agents.budget import DeadlineExceeded, remaining
+from src.config import settings
+from src.logger import get_logger
+from src.metrics import counter, gauge, histogram
+from src.telemetry import record_llm_wait
+
+log = get_logger("RateLimit")
+
+LIMITER_WAIT_SECONDS = histogram(
+    "llm_limiter_wait_seconds",
+    "Time an LLM call waited for a concurrency slot and RPM/TPM budget",
+    ["model"],
+)
+LLM_REQUESTS = counter(
+    "llm_requests_total", "LLM calls by model and outcome (ok/retry/error)", ["model", "outcome"]
+)
+LLM_IN_FLIGHT = gauge("llm_in_flight", "LLM calls currently holding a concurrency slot", ["model"])
+
+
+class LLMUnavailable(RuntimeError):
+    """The provider kept answering 429/5xx until the retry budget ran out."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at capacity / 60s.
+    `take` reserves budget up front and may leave the bucket in debt, so
+    concurrent waiters queue behind each other instead of racing.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        """Reserve `amount`; returns how long the caller must wait before using it."""
+        amount = min(amount, self.capacity)  # a single huge call must still fit eventually
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float):
+        """Correct an earlier reservation once the real usage is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ModelLimiter:
+    """Concurrency cap plus requests/min and tokens/min buckets for one model."""
+
+    def __init__(self, model: str, rpm: int, tpm: int, max_concurrency: int):
+        self.model = model
+        self.rpm = TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm) if tpm > 0 else None
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+    def acquire(self, est_tokens: int) -> float:
+        """
+        Block until the call may go out; returns the seconds spent waiting.
+        Raises DeadlineExceeded instead of waiting past the request deadline.
+        """
+        t0 = time.perf_counter()
+        if self.slots is not None:
+            timeout = remaining()
+            if not self.slots.acquire(timeout=None if timeout == float("inf") else max(timeout, 0)):
+                raise DeadlineExceeded(f"no free {self.model} slot before the deadline")
+        wait = max(
+            self.rpm.take(1) if self.rpm else 0.0,
+            self.tpm.take(est_tokens) if self.tpm else 0.0,
+        )
+        if wait > 0 and wait > remaining():
+            # hand the reservation back, the call is not going out
+            if self.rpm:
+                self.rpm.adjust(-1)
+            if self.tpm:
+                self.tpm.adjust(-est_tokens)
+            if self.slots is not None:
+                self.slots.release()
+            raise DeadlineExceeded(f"{self.model} rate limit wait {wait:.1f}s exceeds the deadline")
+        if wait > 0:
+            time.sleep(wait)
+        LLM_IN_FLIGHT.labels(model=self.model).inc()
+        waited = time.perf_counter() - t0
+        LIMITER_WAIT_SECONDS.labels(model=self.model).observe(waited)
+        return waited
+
+    def release(self, est_tokens: int, used_tokens: Optional[int]):
+        LLM_IN_FLIGHT.labels(model=self.model).dec()
+        if self.slots is not None:
+            self.slots.release()
+        if self.tpm is not None and used_tokens is not None:
+            self.tpm.adjust(used_tokens - est_tokens)
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    """Process-wide limiter for `model`, shared by every agent instance."""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = ModelLimiter(
+                model,
+                rpm=settings.GROQ_RPM.get(model, settings.GROQ_DEFAULT_RPM),
+                tpm=settings.GROQ_TPM.get(model, settings.GROQ_DEFAULT_TPM),
+                max_concurrency=settings.GROQ_MAX_CONCURRENCY,
+            )
+        return limiter
+
+
+# ------------------------------------------------------------
+# Retries
+# ------------------------------------------------------------
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = _status_code(exc)
+    if code is not None:
+        return code == 429 or code >= 500
+    # connection resets / timeouts carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    cap = min(settings.GROQ_BACKOFF_MAX_S, settings.GROQ_BACKOFF_BASE_S * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def call_with_limits(model: str, est_tokens: int, fn: Callable[[], Any],
+                     used_tokens: Callable[[Any], Optional[int]] = lambda res: None) -> Any:
+    """
+    Run `fn` (one LLM request) under the model's limiter, retrying 429 and
+    5xx answers with jittered backoff. Raises LLMUnavailable once
+    GROQ_MAX_RETRIES retries are used up and DeadlineExceeded when waiting
+    would overrun the request deadline; other errors propagate as-is.
+    """
+    limiter = get_limiter(model)
+    attempt = 0
+    waited = 0.0
+    while True:
+        waited += limiter.acquire(est_tokens)
+        res, used = None, None
+        try:
+            res = fn()
+            used = used_tokens(res)
+            LLM_REQUESTS.labels(model=model, outcome="ok").inc()
+            record_llm_wait(waited)
+            return res
+        except Exception as e:
+            if not is_retryable(e):
+                LLM_REQUESTS.labels(model=model, outcome="error").inc()
+                raise
+            # nothing was generated: a 429 was rejected outright, other
+            # failures may have read the prompt; the next attempt reserves anew
+            used = 0 if _status_code(e) == 429 else max(est_tokens - settings.GROQ_EST_COMPLETION_TOKENS, 0)
+            if attempt >= settings.GROQ_MAX_RETRIES:
+                LLM_REQUESTS.labels(model=model, outcome="error").inc()
+                raise LLMUnavailable(f"{model} unavailable after {attempt + 1} attempts: {e}") from e
+            delay = max(backoff_delay(attempt), _retry_after(e) or 0.0)
+            if delay >= remaining():
+                LLM_REQUESTS.labels(model=model, outcome="error").inc()
+                raise DeadlineExceeded(f"{model} retry would run past the deadline: {e}") from e
+            LLM_REQUESTS.labels(model=model, outcome="retry").inc()
+            log.warning(f"{model} returned {_status_code(e) or type(e).__name__}; "
+                        f"retry {attempt + 1}/{settings.GROQ_MAX_RETRIES} in {delay:.2f}s")
+        finally:
+            limiter.release(est_tokens, used)
+        time.sleep(delay)
+        waited += delay
+        attempt += 1
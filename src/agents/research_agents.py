@@ -1,52 +1,291 @@
-from langchain_groq import ChatGroq
+import contextvars
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
 from langchain_core.messages import HumanMessage
 from src.config import settings
+from src.agents.budget import DeadlineExceeded
+from src.agents.mock_llm import make_chat_model
+from src.agents.rate_limit import call_with_limits
+from src.agents.revision_policy import VERDICT_SCHEMA
+from src.agents.router import decide
 from src.services.rag_service import RAGService
+from src.telemetry import record_llm_usage, record_retrieval, token_usage
+from src.logger import get_logger
+from src.utils.cache import TTLCache
+from src.utils.text import approx_tokens, iter_sections, normalize_topic, section_heading
+
+log = get_logger("ResearchAgents")
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_queries(text: str, n: int) -> List[str]:
+    """
+    Strictly parse the planner's JSON answer ({"queries": [...]}, or a bare
+    list) into at most `n` distinct non-empty queries. Raises ValueError on
+    anything else.
+    """
+    data = json.loads(_FENCE.sub("", text.strip()))
+    if isinstance(data, dict):
+        data = data.get("queries")
+    if not isinstance(data, list) or not all(isinstance(q, str) for q in data):
+        raise ValueError(f"expected a list of strings, got {type(data).__name__}")
+
+    queries, seen = [], set()
+    for q in (q.strip() for q in data):
+        key = normalize_topic(q)
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(q)
+    if not queries:
+        raise ValueError("no queries in planner output")
+    return queries[:n]
+
+
+def fallback_queries(task: str, n: int, have: List[str] = ()) -> List[str]:
+    """Pad `have` up to `n` queries with fixed reformulations of the topic."""
+    queries = list(have)
+    seen = {normalize_topic(q) for q in queries}
+    for q in (task, f"{task} methods", f"{task} evaluation", f"{task} survey", f"{task} applications"):
+        if len(queries) >= n:
+            break
+        if normalize_topic(q) not in seen:
+            seen.add(normalize_topic(q))
+            queries.append(q)
+    return queries
 
 class ResearchAgents:
-    def __init__(self):
-        self.planner = ChatGroq(model=settings.LLM_FAST, api_key=settings.GROQ_API_KEY)
-        self.writer  = ChatGroq(model=settings.LLM_SMART, api_key=settings.GROQ_API_KEY)
-        self.rag = RAGService()
+    def __init__(self, rag: RAGService = None):
+        self.planner = make_chat_model(settings.LLM_FAST)
+        self.writer  = make_chat_model(settings.LLM_SMART)
+        self._planner_json = self.planner.bind(response_format={"type": "json_object"})
+        self.plan_cache = TTLCache("plan", settings.PLAN_CACHE_SIZE, settings.PLAN_CACHE_TTL_S)
+        self.rag = rag or RAGService()
+        # section critiques / rewrites in CRITIQUE_MODE=sectional
+        self._pool = ThreadPoolExecutor(settings.CRITIQUE_WORKERS, thread_name_prefix="critic")
+
+    def _call(self, model, prompt: str, fn: Callable):
+        """Run fn(messages) -> AIMessage under the rate limiter and record its usage."""
+        messages = [HumanMessage(content=prompt)]
+        if not settings.LLM_RATE_LIMIT:
+            res = fn(messages)
+            record_llm_usage(res)
+            return res
+
+        # ChatGroq names the field model_name, the mock just model
+        name = getattr(model, "model_name", None) or getattr(model, "model", "unknown")
+        res = call_with_limits(
+            name,
+            approx_tokens(prompt) + settings.GROQ_EST_COMPLETION_TOKENS,
+            lambda: fn(messages),
+            used_tokens=lambda r: sum(token_usage(r).values()) or None,
+        )
+        record_llm_usage(res)
+        return res
+
+    def _invoke(self, model, prompt: str):
+        return self._call(model, prompt, model.invoke)
+
+    def _stream(self, model, prompt: str, on_section: Callable[[int, str], None],
+                on_attempt: Optional[Callable[[], None]] = None):
+        """
+        Stream the answer, calling on_section(i, text) as each "## " section
+        completes. on_attempt() runs before every attempt, so a caller can
+        drop what a failed, retried attempt reported.
+        """
+        def run(messages):
+            if on_attempt is not None:
+                on_attempt()
+            full = None
+
+            def pieces():
+                nonlocal full
+                for chunk in model.stream(messages):
+                    full = chunk if full is None else full + chunk
+                    yield chunk.content
+
+            # a retried attempt starts over and re-reports its sections
+            for i, section in enumerate(iter_sections(pieces())):
+                on_section(i, section)
+            return full
+        return self._call(model, prompt, run)
+
+    def _writer(self, fast: bool):
+        # fast route: the 8B planner model drafts simple topics
+        return self.planner if fast else self.writer
+
+    def _submit(self, fn, *args):
+        # carry node stats and the request deadline into the pool thread
+        return self._pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def cached_plan(self, task: str) -> Optional[List[str]]:
+        return self.plan_cache.get((normalize_topic(task), settings.PLANNER_NUM_QUERIES))
+
+    def plan(self, task: str) -> List[str]:
+        """PLANNER_NUM_QUERIES search queries for `task`; repeat topics skip the LLM."""
+        n = settings.PLANNER_NUM_QUERIES
+        cached = self.cached_plan(task)
+        if cached is not None:
+            return list(cached)
 
-    def plan(self, task: str):
         prompt = (
-            "Return a python list of 3 diverse search queries "
-            f"to research this topic: '{task}'. Return ONLY the list."
+            f"Generate {n} diverse search queries to research this topic: '{task}'.\n"
+            'Respond with a JSON object of the form {"queries": ["...", "..."]} and nothing else.'
         )
-        res = self.planner.invoke([HumanMessage(content=prompt)])
+        res = self._call(self.planner, prompt, self._planner_json.invoke)
         try:
-            return eval(res.content)
-        except:
-            return [task]
+            queries = parse_queries(res.content, n)
+        except ValueError as e:  # includes json.JSONDecodeError
+            log.warning(f"Malformed planner output ({e}), using fallback queries")
+            return fallback_queries(task, n)
+
+        queries = fallback_queries(task, n, queries)
+        self.plan_cache.put((normalize_topic(task), n), queries)
+        return list(queries)
+
+    def route(self, task: str, use_llm: bool = True):
+        """Writer route for `task`, see src/agents/router.py."""
+        classify = None
+        if use_llm:
+            classify = lambda prompt: self._call(self.planner, prompt, self._planner_json.invoke).content
+        return decide(task, classify)
 
-    def retrieve(self, queries: list):
+    def retrieve(self, queries: list, reduced: bool = False, max_chars: int = 9000):
+        """reduced=True (short on latency budget): half the vector hits, no graph expansion."""
+        kwargs = {}
+        if reduced:
+            kwargs = {"top_k_vector": max(1, settings.TOP_K_VECTOR // 2), "top_k_graph": 0, "top_k_citations": 0}
         context = ""
         for q in queries:
-            _, ctx = self.rag.hybrid_retrieve(q)
+            docs, ctx = self.rag.hybrid_retrieve(q, **kwargs)
+            record_retrieval(len(docs))
             context += ctx + "\n"
-        return context[:9000]
+        return context[:max_chars]
 
-    def draft(self, task: str, context: str):
-        prompt = f"""
+    def _draft_prompt(self, task: str, context: str, feedback: str = "") -> str:
+        if feedback:
+            feedback = f"\nREVIEWER FEEDBACK ON THE PREVIOUS DRAFT (address it):\n{feedback}\n"
+        return f"""
 Write a comprehensive literature review on: {task}
 
 Use the retrieved context below. Cite sources inline like [Vector] / [Graph].
-
+{feedback}
 CONTEXT:
 {context}
 
 Return Markdown only.
 """
-        return self.writer.invoke([HumanMessage(content=prompt)]).content
+
+    def draft(self, task: str, context: str, feedback: str = "", fast: bool = False):
+        return self._invoke(self._writer(fast), self._draft_prompt(task, context, feedback)).content
 
     def critique(self, draft: str):
+        """Raw JSON verdict, see src/agents/revision_policy.py."""
         prompt = f"""
-Act as a strict academic reviewer.
-If good reply exactly: APPROVE
-Else reply: REVISE: <bulleted fixes>
+Act as a strict academic reviewer. Score the draft from 0 (unusable) to 10 (publishable)
+and list concrete issues, marking whether another draft could fix each one.
+Respond with a JSON object of the form:
+{VERDICT_SCHEMA}
 
 DRAFT:
 {draft[:2500]}
 """
-        return self.planner.invoke([HumanMessage(content=prompt)]).content
+        return self._call(self.planner, prompt, self._planner_json.invoke).content
+
+    # ------------------------------------------------------------
+    # Sectional critique (CRITIQUE_MODE=sectional)
+    # ------------------------------------------------------------
+    def critique_section(self, task: str, section: str) -> str:
+        """Raw JSON verdict for one section; "" = not reviewed."""
+        if not section_heading(section):
+            return ""  # title / preamble before the first section
+        prompt = f"""
+Act as a strict academic reviewer of one section of a literature review on: {task}
+Score the section from 0 (unusable) to 10 (publishable) and list concrete issues,
+marking whether a rewrite could fix each one.
+Respond with a JSON object of the form:
+{VERDICT_SCHEMA}
+
+SECTION:
+{section[:2500]}
+"""
+        return self._call(self.planner, prompt, self._planner_json.invoke).content
+
+    def draft_sections(self, task: str, context: str, fast: bool = False) -> Tuple[List[str], List[str]]:
+        """
+        Stream a draft and critique each section in the background as soon
+        as it is complete, overlapping review with generation.
+        Returns (sections, verdicts); "".join(sections) is the draft.
+        """
+        sections, futures = {}, {}
+
+        def on_section(i: int, text: str):
+            sections[i] = text
+            futures[i] = self._submit(self.critique_section, task, text)
+
+        def on_attempt():
+            # a retry starts over: forget the failed attempt's sections and
+            # stop their reviews that haven't started yet
+            for fut in futures.values():
+                fut.cancel()
+            sections.clear()
+            futures.clear()
+
+        self._stream(self._writer(fast), self._draft_prompt(task, context), on_section, on_attempt)
+        order = sorted(sections)
+        return [sections[i] for i in order], [self._verdict(futures[i]) for i in order]
+
+    @staticmethod
+    def _verdict(future) -> str:
+        try:
+            return future.result()
+        except DeadlineExceeded:
+            return ""  # not reviewed in time; treated as accepted
+        except Exception as e:
+            # the draft exists; a failed review (LLM down, bad output) must not discard it
+            log.warning(f"Section critique failed ({e}), treating the section as unreviewed")
+            return ""
+
+    def revise_section(self, task: str, context: str, section: str, verdict: str,
+                       fast: bool = False) -> str:
+        prompt = f"""
+Rewrite the section below of a literature review on: {task}
+Apply the reviewer's fixes, keep the same "## " heading and cite sources inline like [Vector] / [Graph].
+
+REVIEWER:
+{verdict}
+
+CONTEXT:
+{context}
+
+SECTION:
+{section}
+
+Return only the rewritten section in Markdown.
+"""
+        text = self._invoke(self._writer(fast), prompt).content.strip("\n")
+        return text + "\n\n"
+
+    def revise_sections(self, task: str, context: str, sections: List[str],
+                        verdicts: List[str], flagged: List[int],
+                        fast: bool = False) -> Tuple[List[str], List[str]]:
+        """Rewrite and re-review only the `flagged` sections, in parallel."""
+        def redo(section: str, verdict: str):
+            text = self.revise_section(task, context, section, verdict, fast)
+            return text, self.critique_section(task, text)
+
+        futures = {i: self._submit(redo, sections[i], verdicts[i]) for i in flagged}
+        sections, verdicts = list(sections), list(verdicts)
+        for i, fut in futures.items():
+            try:
+                sections[i], verdicts[i] = fut.result()
+            except DeadlineExceeded:
+                verdicts[i] = ""  # keep the previous text
+            except Exception as e:
+                # the draft exists; a failed rewrite / re-review keeps the previous text
+                log.warning(f"Revising section {i} failed ({e}), keeping the previous text")
+                verdicts[i] = ""
+        return sections, verdicts
@@ -0,0 +1,183 @@
+# src/agents/revision_policy.py
+
+import json
+import re
+import zlib
+from typing import Any, Dict, List, Optional
+
+from src.config import settings
+from src.metrics import COUNT_BUCKETS, DEFAULT_BUCKETS, TOKEN_BUCKETS, counter, histogram
+from src.utils.text import normalize_topic
+
+# ------------------------------------------------------------
+# Critic verdicts
+# ------------------------------------------------------------
+# {"approve": bool, "score": 0-10 or None, "issues": [{"type", "fixable", "detail"}]}
+VERDICT_SCHEMA = (
+    '{"verdict": "APPROVE" | "REVISE", "score": <0-10>, '
+    '"issues": [{"type": "missing_citations" | "factual_error" | "missing_section" | '
+    '"structure" | "style", "fixable": true | false, "detail": "<one line>"}]}'
+)
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_BULLET = re.compile(r"^\s*[-*]\s*(.+)$", re.M)
+
+
+def parse_verdict(text: str) -> Dict[str, Any]:
+    """
+    Critic answer -> verdict dict. JSON answers are read strictly; plain
+    "APPROVE" / "REVISE: ..." text (older prompts, non-JSON providers) maps
+    to score 10 / 0 with one fixable issue per bullet. A JSON object
+    without a known "verdict" is not approved; should_revise then decides
+    by its score (if any) and issues.
+    """
+    text = (text or "").strip()
+    try:
+        data = json.loads(_FENCE.sub("", text))
+        if not isinstance(data, dict):
+            raise ValueError("not a verdict object")
+    except ValueError:
+        approve = "REVISE" not in text.upper()
+        issues = [] if approve else [
+            {"type": "unspecified", "fixable": True, "detail": b.strip()}
+            for b in _BULLET.findall(text)
+        ] or [{"type": "unspecified", "fixable": True, "detail": text[:200]}]
+        return {"approve": approve, "score": 10.0 if approve else 0.0, "issues": issues}
+
+    try:
+        score = min(max(float(data.get("score")), 0.0), 10.0)
+    except (TypeError, ValueError):
+        score = None
+    issues = [
+        {
+            "type": str(i.get("type", "unspecified")),
+            "fixable": bool(i.get("fixable", True)),
+            "detail": str(i.get("detail", "")),
+        }
+        for i in data.get("issues") or [] if isinstance(i, dict)
+    ]
+    verdict = str(data.get("verdict", "")).strip().upper()
+    if verdict not in ("APPROVE", "REVISE"):
+        # malformed critic output must not count as an approval
+        return {"approve": False, "score": score, "issues": issues}
+    return {"approve": verdict == "APPROVE", "score": score, "issues": issues}
+
+
+def merge_verdicts(verdicts: List[Optional[Dict[str, Any]]], labels: List[str]) -> Optional[Dict[str, Any]]:
+    """Combine per-section verdicts: lowest score, all issues tagged with their section."""
+    reviewed = [(v, label) for v, label in zip(verdicts, labels) if v is not None]
+    if not reviewed:
+        return None
+    scores = [v["score"] for v, _ in reviewed if v["score"] is not None]
+    return {
+        "approve": all(v["approve"] for v, _ in reviewed),
+        "score": min(scores) if scores else None,
+        "issues": [
+            {**issue, "detail": f"[{label}] {issue['detail']}" if label else issue["detail"]}
+            for v, label in reviewed for issue in v["issues"]
+        ],
+    }
+
+
+def render_verdict(verdict: Optional[Dict[str, Any]]) -> str:
+    """Human-readable critique for the API response."""
+    if verdict is None:
+        return ""
+    head = "APPROVE" if verdict["approve"] else "REVISE"
+    if verdict["score"] is not None:
+        head += f" (score {verdict['score']:g}/10)"
+    if not verdict["issues"]:
+        return head
+    return head + ":\n" + "\n".join(f"- [{i['type']}] {i['detail']}" for i in verdict["issues"])
+
+
+# ------------------------------------------------------------
+# Policy
+# ------------------------------------------------------------
+def assign_arm(task: str) -> str:
+    """
+    "legacy" (revise on any REVISE) or "adaptive". With
+    REVISION_POLICY=ab the arm is a stable hash of the topic, so repeat
+    topics always land in the same arm.
+    """
+    if settings.REVISION_POLICY != "ab":
+        return settings.REVISION_POLICY
+    bucket = zlib.crc32(normalize_topic(task).encode()) % 1000 / 1000
+    return "adaptive" if bucket < settings.REVISION_AB_ADAPTIVE_SHARE else "legacy"
+
+
+def should_revise(verdict: Optional[Dict[str, Any]], arm: str) -> bool:
+    if verdict is None or verdict["approve"]:
+        return False
+    if arm == "legacy":
+        return True
+    # adaptive: a low score, or an issue another draft can actually fix
+    if verdict["score"] is not None and verdict["score"] < settings.REVISION_SCORE_THRESHOLD:
+        return True
+    return any(
+        i["fixable"] and i["type"] in settings.REVISION_FIXABLE_ISSUES for i in verdict["issues"]
+    )
+
+
+# ------------------------------------------------------------
+# A/B stats
+# ------------------------------------------------------------
+POLICY_RUNS = counter("revision_policy_runs_total", "Workflow runs per revision policy arm", ["arm"])
+POLICY_REVISIONS = histogram(
+    "revision_policy_revisions", "Writer revisions per run", ["arm"], COUNT_BUCKETS
+)
+POLICY_SECONDS = histogram(
+    "revision_policy_run_seconds", "Workflow wall time per run", ["arm"], DEFAULT_BUCKETS
+)
+POLICY_TOKENS = histogram(
+    "revision_policy_llm_tokens", "Prompt + completion tokens per run", ["arm"], (*TOKEN_BUCKETS, 32768, 65536)
+)
+POLICY_SCORE = histogram(
+    "revision_policy_final_score", "Critic score of the last reviewed draft", ["arm"],
+    (1, 2, 3, 4, 5, 6, 7, 8, 9, 10),
+)
+
+
+def record_run(arm: str, run_stats: Dict[str, Any], seconds: float, verdict: Optional[Dict[str, Any]]):
+    POLICY_RUNS.labels(arm=arm).inc()
+    POLICY_REVISIONS.labels(arm=arm).observe(run_stats["revisions"])
+    POLICY_SECONDS.labels(arm=arm).observe(seconds)
+    POLICY_TOKENS.labels(arm=arm).observe(run_stats["prompt_tokens"] + run_stats["completion_tokens"])
+    if verdict is not None and verdict["score"] is not None:
+        POLICY_SCORE.labels(arm=arm).observe(verdict["score"])
+
+
+def stats() -> Dict[str, Any]:
+    """Per-arm cost / latency / quality, and adaptive relative to legacy."""
+    arms: Dict[str, Dict[str, Any]] = {}
+    for labels, child in POLICY_RUNS.children():
+        arm = labels["arm"]
+        seconds = POLICY_SECONDS.labels(arm=arm).snapshot()
+        score = POLICY_SCORE.labels(arm=arm).snapshot()
+        arms[arm] = {
+            "runs": int(child.value),
+            "mean_revisions": POLICY_REVISIONS.labels(arm=arm).snapshot()["mean"],
+            "mean_seconds": seconds["mean"],
+            "p95_seconds": seconds["p95"],
+            "mean_llm_tokens": POLICY_TOKENS.labels(arm=arm).snapshot()["mean"],
+            "mean_final_score": score["mean"] if score["count"] else None,
+        }
+
+    result: Dict[str, Any] = {
+        "policy": settings.REVISION_POLICY,
+        "score_threshold": settings.REVISION_SCORE_THRESHOLD,
+        "arms": arms,
+    }
+    a, b = arms.get("adaptive"), arms.get("legacy")
+    if a and b:
+        def delta(key):
+            if a[key] is None or b[key] is None:
+                return None
+            return round(a[key] - b[key], 4)
+        result["adaptive_vs_legacy"] = {
+            "revisions": delta("mean_revisions"),
+            "seconds": delta("mean_seconds"),
+            "llm_tokens": delta("mean_llm_tokens"),
+            "final_score": delta("mean_final_score"),
+        }
+    return result
@@ -0,0 +1,119 @@
+# src/agents/router.py
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.logger import get_logger
+from src.metrics import counter, histogram
+from src.utils.cache import TTLCache
+from src.utils.text import normalize_topic
+
+log = get_logger("Router")
+
+ROUTER_DECISIONS = counter(
+    "router_decisions_total", "Writer routing decisions by route (fast/smart) and source", ["route", "source"]
+)
+WRITER_ROUTE_SECONDS = histogram(
+    "router_writer_seconds", "Writer node wall time by route", ["route"]
+)
+
+# Phrases that call for synthesis across works rather than a short overview
+_COMPLEX_MARKERS = re.compile(
+    r"\b(compar\w*|versus|vs\.?|trade-?offs?|contrast\w*|relationship|interplay|"
+    r"impact of|effects? of|evolution|history of|across|limitations|open problems|"
+    r"systematic|meta-analysis)\b",
+    re.I,
+)
+
+_cache = TTLCache("route", settings.ROUTE_CACHE_SIZE, settings.ROUTE_CACHE_TTL_S)
+
+
+def heuristic_complexity(task: str) -> Tuple[Optional[str], str]:
+    """("simple" | "complex" | None if unsure, reason)."""
+    words = len(task.split())
+    marker = _COMPLEX_MARKERS.search(task)
+    if marker:
+        return "complex", f"marker '{marker.group(0).lower()}'"
+    if words > settings.ROUTER_COMPLEX_MIN_WORDS:
+        return "complex", f"{words} words"
+    if words <= settings.ROUTER_SIMPLE_MAX_WORDS:
+        return "simple", f"{words} words"
+    return None, f"{words} words, no markers"
+
+
+def classify_prompt(task: str) -> str:
+    return (
+        f"Classify the complexity of writing a literature review on this topic: '{task}'.\n"
+        "simple = a single well-defined concept or method that a short overview covers;\n"
+        "complex = comparisons, several interacting sub-fields, or open research questions.\n"
+        'Respond with a JSON object of the form {"complexity": "simple" | "complex"} and nothing else.'
+    )
+
+
+def parse_complexity(text: str) -> str:
+    value = json.loads(text).get("complexity")
+    if value not in ("simple", "complex"):
+        raise ValueError(f"unexpected complexity {value!r}")
+    return value
+
+
+def decide(task: str, classify=None) -> Dict[str, Any]:
+    """
+    Route a topic: heuristics first, then `classify(prompt) -> text` (the
+    8B model) when they are unsure and ROUTER_MODE=llm. Anything that
+    cannot be classified goes to the smart writer.
+    """
+    if settings.ROUTER_MODE == "off":
+        return _route("complex", "off", "router disabled")
+
+    key = normalize_topic(task)
+    cached = _cache.get(key)
+    if cached is not None:
+        ROUTER_DECISIONS.labels(route=cached["route"], source="cache").inc()
+        return {**cached, "source": "cache"}
+
+    complexity, reason = heuristic_complexity(task)
+    source = "heuristic"
+    if complexity is None and settings.ROUTER_MODE == "llm" and classify is not None:
+        try:
+            complexity, source = parse_complexity(classify(classify_prompt(task))), "llm"
+        except Exception as e:  # malformed output, rate limited, out of budget
+            log.warning(f"Complexity classification failed ({e}), using the smart writer")
+    if complexity is None:
+        # not cached: a transient classification failure must not pin the
+        # topic to the smart writer for the whole TTL
+        return _route("complex", source, reason + ", unclassified")
+
+    route = _route(complexity, source, reason)
+    _cache.put(key, route)
+    return route
+
+
+def _route(complexity: str, source: str, reason: str) -> Dict[str, Any]:
+    fast = complexity == "simple"
+    route = {
+        "route": "fast" if fast else "smart",
+        "complexity": complexity,
+        "source": source,
+        "reason": reason,
+        "model": settings.LLM_FAST if fast else settings.LLM_SMART,
+        "context_chars": settings.ROUTER_FAST_CONTEXT_CHARS if fast else 9000,
+    }
+    ROUTER_DECISIONS.labels(route=route["route"], source=source).inc()
+    return route
+
+
+def estimated_savings_ms(route: Optional[Dict[str, Any]], node_stats: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Writer time saved by the fast route, against the median smart-route
+    Writer run in this process; None for smart runs or without a baseline.
+    """
+    if not route or route["route"] != "fast":
+        return None
+    baseline = WRITER_ROUTE_SECONDS.labels(route="smart")
+    if baseline.count == 0:
+        return None
+    writer = [s["ms"] for s in node_stats if s["node"] == "Writer"]
+    return round(baseline.quantile(0.5) * 1000 * len(writer) - sum(writer), 2)
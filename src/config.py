@@ -1,6 +1,6 @@
 # src/config.py
 
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -21,16 +21,167 @@ class Settings(BaseSettings):
     LLM_FAST: str = "llama-3.1-8b-instant"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
 
+    # LLM_PROVIDER: "groq" or "mock" (local deterministic stand-in for load tests)
+    LLM_PROVIDER: str = "groq"
+    MOCK_LLM_LATENCY_MS: float = 300.0     # time to first token
+    MOCK_LLM_TOKENS_PER_SEC: float = 250.0
+    MOCK_LLM_REVISE_RATE: float = 0.3      # fraction of critiques that ask for a revision
+    MOCK_LLM_DRAFT_TOKENS: int = 600
+    MOCK_LLM_FAST_SPEEDUP: float = 3.0     # LLM_FAST generates this much faster than LLM_SMART
+
+    # --- LLM rate limiting (per model, shared by the whole process) ---
+    # Defaults match the Groq free tier; 0 disables a limit. Dicts are read
+    # from JSON env vars, e.g. GROQ_RPM='{"llama-3.3-70b-versatile": 60}'
+    LLM_RATE_LIMIT: bool = True
+    GROQ_RPM: Dict[str, int] = {"llama-3.3-70b-versatile": 30, "llama-3.1-8b-instant": 30}
+    GROQ_TPM: Dict[str, int] = {"llama-3.3-70b-versatile": 12000, "llama-3.1-8b-instant": 6000}
+    GROQ_DEFAULT_RPM: int = 30
+    GROQ_DEFAULT_TPM: int = 6000
+    GROQ_MAX_CONCURRENCY: int = 4          # in-flight calls per model
+    GROQ_EST_COMPLETION_TOKENS: int = 800  # reserved up front, corrected from the real usage
+    GROQ_MAX_RETRIES: int = 4
+    GROQ_BACKOFF_BASE_S: float = 0.5
+    GROQ_BACKOFF_MAX_S: float = 20.0
+
+    # --- Graph visualization ---
+    GRAPH_VIS_MAX_NODES: int = 300         # hard caps, requests may ask for less
+    GRAPH_VIS_MAX_EDGES: int = 600
+    GRAPH_VIS_MAX_FANOUT: int = 25         # edges followed per node (prolific authors)
+    GRAPH_HTML_CACHE_SIZE: int = 64
+    GRAPH_HTML_CACHE_TTL_S: float = 3600.0
+
+    # --- Graph ranking ---
+    GRAPH_CENTRALITY: str = "degree"       # "degree" (authors' paper counts) or "pagerank"
+    GRAPH_PAGERANK_DAMPING: float = 0.85
+    GRAPH_PAGERANK_MAX_ITER: int = 100
+    GRAPH_PAGERANK_TOL: float = 1e-4     # L1 change of the rank vector
+    GRAPH_RELATED_PER_AUTHOR: int = 50     # most central papers considered per shared author
+    # after inserts, centrality and the author / citation indexes are rebuilt
+    # in a background thread this long after the insert (bulk inserts coalesce)
+    GRAPH_INDEX_REBUILD_DELAY_S: float = 1.0
+    # add_paper / add_papers(save=True) write data/graph.json this long after
+    # the first unsaved insert, once for the whole burst (0 = on every insert)
+    GRAPH_FLUSH_DELAY_S: float = 2.0
+
+    # --- Citation expansion ---
+    TOP_K_CITATIONS: int = 3               # cited / citing papers added to retrieval (0 = off)
+    GRAPH_CITATION_HOPS: int = 2
+    GRAPH_CITATION_FANOUT: int = 10        # neighbours followed per paper and direction
+    GRAPH_EXPAND_BUDGET_MS: float = 5.0
+
     # --- Vector store ---
     COLLECTION_NAME: str = "scholarflow_chunks"
+    PAPER_COLLECTION_NAME: str = "scholarflow_papers"  # one summary vector per paper
     VECTOR_SIZE: int = 384        # all-MiniLM-L6-v2 is 384-dim
     TOP_K_VECTOR: int = 6
     TOP_K_GRAPH: int = 4
     TOP_K_FINAL: int = 5
+    # two-stage retrieval: find this many papers by summary vector first,
+    # then search only their chunks (0 = one flat search over all chunks)
+    TWO_STAGE_PAPERS: int = 0
+    # MMR diversification: fetch this many chunk candidates and pick
+    # TOP_K_VECTOR of them by maximal marginal relevance (0 = off)
+    MMR_FETCH_K: int = 0
+    MMR_LAMBDA: float = 0.7       # 1.0 = relevance only, lower = more diverse
+    MMR_MAX_PER_PAPER: int = 2    # chunks per paper after MMR (0 = no cap)
+
+    # --- Retrieval cache ---
+    # hybrid_retrieve results per normalized query, invalidated by any corpus
+    # change in this process (other workers' caches only expire by TTL)
+    RETRIEVAL_CACHE_SIZE: int = 2048       # entries per process, 0 disables
+    RETRIEVAL_CACHE_TTL_S: float = 600.0
+    # > 0: on a text miss, also serve the entry of a cached query whose
+    # embedding has at least this cosine similarity (costs one encode)
+    RETRIEVAL_CACHE_SIMILARITY: float = 0.0
+
+    # --- Vector index / storage ---
+    # QDRANT_QUANTIZATION: "none", "scalar" (int8) or "binary"
+    QDRANT_QUANTIZATION: str = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_ON_DISK_PAYLOAD: bool = False
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCT: int = 100
+    HNSW_EF: int = 128            # search-time beam width
+
+    # --- Embedding service ---
+    # "inline": encode on the calling thread
+    # "thread": micro-batching dispatcher thread, queries ahead of ingestion
+    # "process": same, with the model in a dedicated worker process
+    EMBEDDING_SERVICE_MODE: str = "thread"
+    EMBEDDING_MAX_BATCH: int = 64
+    # Requests arriving during a forward pass always join the next one; a
+    # non-zero wait additionally holds each batch open for stragglers
+    EMBEDDING_MAX_WAIT_MS: float = 0.0
+    # per batch-sized slice of a request; a timed-out request's remaining
+    # slices are dropped
+    EMBEDDING_TIMEOUT_S: float = 60.0
 
     # --- Chunking ---
+    # "chars": CHUNK_SIZE characters; "tokens": CHUNK_TOKENS tokens of the
+    # embedding model's tokenizer, split at section headings
+    CHUNK_MODE: str = "chars"
     CHUNK_SIZE: int = 1200
     CHUNK_OVERLAP: int = 200
+    # streamed documents (uploads) are split this many CHUNK_SIZEs at a time;
+    # larger windows re-split less carried-over text and differ from a
+    # one-shot split at fewer boundaries, at the cost of buffer memory
+    CHUNK_STREAM_WINDOW_CHUNKS: int = 64
+    CHUNK_TOKENS: int = 254                # MiniLM reads 256 tokens including [CLS] / [SEP]
+    CHUNK_TOKEN_OVERLAP: int = 32
+    INGEST_UPSERT_BATCH: int = 128         # chunks embedded + upserted per call while streaming a document
+
+    # --- Writer routing ---
+    # "off": always LLM_SMART; "heuristic": word count / phrasing only;
+    # "llm": heuristics, then LLM_FAST classifies the topics they are unsure about
+    ROUTER_MODE: str = "llm"
+    ROUTER_SIMPLE_MAX_WORDS: int = 4
+    ROUTER_COMPLEX_MIN_WORDS: int = 16
+    ROUTER_FAST_CONTEXT_CHARS: int = 4000  # context given to the fast writer (smart: 9000)
+    ROUTE_CACHE_SIZE: int = 1024           # routing decisions kept per process, 0 disables
+    ROUTE_CACHE_TTL_S: float = 3600.0
+
+    # --- Planner ---
+    PLANNER_NUM_QUERIES: int = 3
+    PLAN_CACHE_SIZE: int = 1024            # plans kept per process, 0 disables
+    PLAN_CACHE_TTL_S: float = 3600.0
+
+    # --- Critique ---
+    # "full": the Critic reviews the finished draft, revisions rewrite it all
+    # "sectional": sections are reviewed while the draft streams, revisions
+    #              rewrite only the flagged sections
+    CRITIQUE_MODE: str = "full"
+    CRITIQUE_WORKERS: int = 4
+
+    # --- Revision policy ---
+    # "legacy": revise whenever the critic says REVISE
+    # "adaptive": only below REVISION_SCORE_THRESHOLD or for fixable issues
+    #             of a type listed in REVISION_FIXABLE_ISSUES
+    # "ab": split topics between the two (stable per topic), compare at
+    #       /admin/revision_policy_stats
+    REVISION_POLICY: str = "adaptive"
+    REVISION_SCORE_THRESHOLD: float = 6.0
+    REVISION_FIXABLE_ISSUES: List[str] = ["missing_citations", "factual_error", "missing_section"]
+    REVISION_AB_ADAPTIVE_SHARE: float = 0.5
+
+    # --- /generate ---
+    GENERATE_SINGLE_FLIGHT: bool = True    # share one run between concurrent identical topics
+    # Latency budget per request, counted from arrival (the UI gives up at
+    # 180s); nodes trim or skip work to finish inside it. 0 disables.
+    GENERATE_BUDGET_S: float = 170.0
+
+    # --- Startup ---
+    WARMUP_ON_STARTUP: bool = True         # build services + dummy encode in a background thread
+    RUN_MIGRATION_ON_STARTUP: bool = True
+
+    # --- Multi-worker (gunicorn, see gunicorn.conf.py) ---
+    PRELOAD_SHARED_MODELS: bool = False    # load encoder + graph once in the master, share copy-on-write
+    TORCH_THREADS_PER_WORKER: int = 0      # 0 = torch default (all cores per worker)
+
+    # --- Admin ---
+    ADMIN_STATS_TTL_S: float = 10.0   # cache for exact Qdrant counts in /admin/stats
 
     # --- Payload schema versioning ---
     PAYLOAD_SCHEMA_VERSION: int = 2
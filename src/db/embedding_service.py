@@ -0,0 +1,245 @@
+# src/db/embedding_service.py
+
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from typing import Any, Callable, Deque, List, Optional, Sequence, Union
+
+from src.config import settings
+from src.logger import get_logger
+from src.metrics import counter, histogram
+
+log = get_logger("EmbeddingService")
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+QUEUE_WAIT_SECONDS = histogram(
+    "embedding_queue_wait_seconds", "Time a request waits before its batch is encoded", ["priority"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+BATCH_TEXTS = histogram(
+    "embedding_batch_texts", "Texts per coalesced forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+BATCH_REQUESTS = histogram(
+    "embedding_batch_requests", "Requests coalesced into one forward pass",
+    buckets=(1, 2, 3, 4, 8, 16, 32, 64),
+)
+ENCODED_TEXTS = counter("embedding_texts_total", "Texts encoded", ["priority"])
+
+
+def _fail(future: Future, error: BaseException):
+    # the caller may cancel (timeout) at any moment
+    try:
+        future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+class _Item:
+    """A slice of one caller's texts; large bulk requests are split into several."""
+
+    __slots__ = ("texts", "priority", "enqueued", "future", "offset")
+
+    def __init__(self, texts, priority, future, offset):
+        self.texts = texts
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+        self.future = future
+        self.offset = offset
+
+
+def _process_main(conn):
+    """Embedding worker process: owns the model, encodes whatever it is sent."""
+    import numpy as np
+    from src.db.embeddings import get_encoder
+
+    encoder = get_encoder()
+    while True:
+        texts = conn.recv()
+        if texts is None:
+            break
+        try:
+            conn.send(("ok", np.asarray(encoder.encode(texts), dtype=np.float32)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class EmbeddingService:
+    """
+    Encoder front-end that keeps CPU-heavy encoding off request threads.
+
+    Callers enqueue texts with a priority and block on a future. A single
+    dispatcher thread drains the interactive queue before the bulk queue,
+    coalesces whatever queued up during the previous forward pass (up to
+    EMBEDDING_MAX_BATCH texts, optionally waiting EMBEDDING_MAX_WAIT_MS for
+    more) into one forward pass, and
+    splits the vectors back to the callers. Bulk requests are cut into
+    batch-sized slices, so a query waits behind at most one bulk batch.
+
+    mode="thread" runs the forward pass in the dispatcher thread with
+    `encode_fn`; mode="process" sends it to a dedicated worker process that
+    loads its own copy of EMBEDDING_MODEL, so encoding does not hold the
+    API process's GIL.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Any], mode: str = None,
+                 max_batch: int = None, max_wait_ms: float = None):
+        self.encode_fn = encode_fn
+        self.mode = mode or settings.EMBEDDING_SERVICE_MODE
+        self.max_batch = max_batch or settings.EMBEDDING_MAX_BATCH
+        self.max_wait = (settings.EMBEDDING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+
+        self._queues = {INTERACTIVE: deque(), BULK: deque()}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._conn = None
+        self._proc = None
+        if self.mode == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self._conn, child = ctx.Pipe()
+            self._proc = ctx.Process(target=_process_main, args=(child,), name="embedding-worker", daemon=True)
+            self._proc.start()
+            log.info(f"Started embedding worker process pid={self._proc.pid}")
+        elif self.mode != "thread":
+            raise ValueError(f"Unknown EMBEDDING_SERVICE_MODE '{self.mode}'")
+
+        self._thread = threading.Thread(target=self._loop, name="embedding-dispatcher", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def encode(self, texts: Union[str, Sequence[str]], priority: str = INTERACTIVE):
+        """Same contract as encoder.encode: one vector for a str, a list for a list."""
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return []
+
+        future: Future = Future()
+        step = self.max_batch
+        parts = [batch[i:i + step] for i in range(0, len(batch), step)]
+        # shared result slots, filled by each slice's batch
+        future.slots = [None] * len(batch)
+        future.pending = len(parts)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingService is closed")
+            for i, part in enumerate(parts):
+                self._queues[priority].append(_Item(part, priority, future, i * step))
+            self._cond.notify()
+
+        # the timeout applies per slice: a large bulk request may take as long
+        # as it keeps making progress; on timeout its remaining slices are dropped
+        while True:
+            pending = future.pending
+            try:
+                vectors = future.result(timeout=settings.EMBEDDING_TIMEOUT_S)
+                break
+            except FutureTimeout:
+                if future.pending == pending and future.cancel():
+                    raise
+        return vectors[0] if single else vectors
+
+    def close(self):
+        """Stop the dispatcher; requests still queued fail right away instead of timing out."""
+        with self._cond:
+            self._closed = True
+            queued = [item for queue in self._queues.values() for item in queue]
+            for queue in self._queues.values():
+                queue.clear()
+            self._cond.notify()
+        error = RuntimeError("EmbeddingService is closed")
+        for item in queued:
+            _fail(item.future, error)
+        if self._conn is not None:
+            try:
+                self._conn.send(None)
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------
+    # Dispatcher
+    # ------------------------------------------------------------
+    def _take_batch(self) -> Optional[List[_Item]]:
+        with self._cond:
+            while not self._closed and not (self._queues[INTERACTIVE] or self._queues[BULK]):
+                self._cond.wait()
+            if self._closed:
+                return None
+
+            # give concurrent callers a short window to join this forward pass
+            deadline = time.perf_counter() + self.max_wait
+            while self._queued_texts() < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            items: List[_Item] = []
+            size = 0
+            for priority in (INTERACTIVE, BULK):
+                queue: Deque[_Item] = self._queues[priority]
+                while queue and (not items or size + len(queue[0].texts) <= self.max_batch):
+                    item = queue.popleft()
+                    if item.future.done():  # timed out / cancelled, or an earlier slice failed
+                        continue
+                    items.append(item)
+                    size += len(item.texts)
+            return items
+
+    def _queued_texts(self) -> int:
+        return sum(len(i.texts) for q in self._queues.values() for i in q)
+
+    def _forward(self, texts: List[str]):
+        if self._conn is not None:
+            self._conn.send(texts)
+            status, payload = self._conn.recv()
+            if status != "ok":
+                raise RuntimeError(f"Embedding worker failed: {payload}")
+            return payload
+        return self.encode_fn(texts)
+
+    def _loop(self):
+        while True:
+            items = self._take_batch()
+            if items is None:
+                return
+
+            now = time.perf_counter()
+            texts: List[str] = []
+            for item in items:
+                QUEUE_WAIT_SECONDS.labels(priority=item.priority).observe(now - item.enqueued)
+                ENCODED_TEXTS.labels(priority=item.priority).inc(len(item.texts))
+                texts.extend(item.texts)
+            BATCH_TEXTS.observe(len(texts))
+            BATCH_REQUESTS.observe(len({id(i.future) for i in items}))
+
+            try:
+                vectors = self._forward(texts)
+            except Exception as e:
+                log.exception(f"Embedding batch of {len(texts)} failed: {e}")
+                for item in items:
+                    _fail(item.future, e)
+                continue
+
+            pos = 0
+            for item in items:
+                fut = item.future
+                n = len(item.texts)
+                pos += n
+                if fut.done():  # an earlier slice of this request failed
+                    continue
+                fut.slots[item.offset:item.offset + n] = list(vectors[pos - n:pos])
+                fut.pending -= 1
+                if fut.pending == 0:
+                    try:
+                        fut.set_result(fut.slots)
+                    except InvalidStateError:  # cancelled by a timed-out caller meanwhile
+                        pass
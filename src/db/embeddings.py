@@ -1,7 +1,8 @@
 # src/db/embeddings.py
 
+import re
 from functools import lru_cache
-from typing import Any, List, Union
+from typing import Any, List, Tuple, Union
 
 from src.config import settings
 from src.logger import get_logger
@@ -57,3 +58,48 @@ def get_encoder() -> Any:
 
     log.warning("sentence-transformers not available, using DummyEncoder")
     return DummyEncoder()
+
+
+# ------------------------------------------------------------
+# Tokenizer (for token-based chunking)
+# ------------------------------------------------------------
+_APPROX_TOKEN = re.compile(r"\w{1,6}|[^\w\s]")
+
+
+class ApproxTokenizer:
+    """
+    Stand-in for the model tokenizer when transformers is not available:
+    words and punctuation, long words split every 6 characters, which
+    lands close to WordPiece counts on English text.
+    """
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in _APPROX_TOKEN.finditer(text)]
+
+
+class HFTokenizer:
+    """(start, end) character offsets of each token of the embedding model."""
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        enc = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [tuple(s) for s in enc["offset_mapping"]]
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Any:
+    """
+    Tokenizer of EMBEDDING_MODEL (fast tokenizer only, the model itself is
+    not loaded), or ApproxTokenizer without transformers.
+    """
+    try:
+        from transformers import AutoTokenizer  # type: ignore
+        name = settings.EMBEDDING_MODEL
+        # sentence-transformers resolves bare names under its own namespace
+        repo = name if "/" in name else f"sentence-transformers/{name}"
+        return HFTokenizer(AutoTokenizer.from_pretrained(repo, use_fast=True))
+    except Exception as e:
+        log.warning(f"Model tokenizer not available ({e}), approximating token counts")
+        return ApproxTokenizer()
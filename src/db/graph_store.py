@@ -1,108 +1,779 @@
+import atexit
+import heapq
 import json
 import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import settings
 from src.logger import get_logger
+from src.utils.references import canonical_id
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; flushes are then not serialized across processes
+    fcntl = None
 
 log = get_logger("GraphStore")
 
 GRAPH_FILE = Path("data/graph.json")
+GRAPH_FORMAT = 2
 
 
 class GraphStore:
-    def __init__(self):
-        self.graph = {"nodes": [], "edges": []}
+    """
+    Paper / author graph with interned integer ids.
+
+    Papers and authors each live once in a node table (string key -> dense
+    int id, plus parallel lists of titles / names). AUTHORED_BY edges are
+    stored CSR-style in flat int arrays: paper p's authors are
+    `pa_indices[pa_indptr[p]:pa_indptr[p + 1]]`. Papers are append-only, so
+    that index grows in place; the reverse author -> papers index is built
+    from it (counting sort) on first use, with each author's papers ordered
+    by paper centrality.
+
+    Centrality (GRAPH_CENTRALITY): "degree" scores a paper by the summed
+    log paper counts of its authors (author degrees are kept up to date on
+    every insert); "pagerank" runs PageRank over the bipartite
+    paper-author graph, warm-started from the previous vector after changes.
+
+    Derived indexes (centrality, author -> papers, citations) are never
+    rebuilt on the request path once built: after inserts a background
+    thread rebuilds them from a snapshot (GRAPH_INDEX_REBUILD_DELAY_S after
+    the insert, so bulk inserts coalesce) and swaps them in, while lookups
+    keep using the previous ones. Papers added in between are missing from
+    author / citation lookups until the swap.
+
+    CITES edges are kept as (citing paper, cited key) pairs. Cited keys are
+    interned separately from papers, since most cited works are not in the
+    graph (yet); each key remembers the paper it resolves to, updated when
+    that paper is added. expand() walks them through a lazily built
+    paper -> paper CSR in both directions.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else GRAPH_FILE
+        self._lock = threading.RLock()
+
+        # node tables
+        self.paper_keys: List[str] = []
+        self.paper_titles: List[str] = []
+        self._paper_idx: Dict[str, int] = {}
+        self.author_names: List[str] = []
+        self._author_idx: Dict[str, int] = {}
+
+        # AUTHORED_BY, paper -> authors (CSR)
+        self.pa_indptr = array("q", [0])
+        self.pa_indices = array("i")
+
+        # papers per author, maintained incrementally
+        self.author_degree = array("i")
+
+        # CITES, citing paper -> cited key (append-only pairs); ref_paper
+        # is the paper each key resolves to, -1 while it is not in the graph
+        self.ref_keys: List[str] = []
+        self._ref_idx: Dict[str, int] = {}
+        self.ref_paper = array("i")
+        self.cite_src = array("i")
+        self.cite_dst = array("i")
+        self._canonical_idx: Dict[str, int] = {}  # "2401.01234" -> paper "2401.01234v2"
+
+        # derived, rebuilt lazily after changes (None = stale):
+        # author -> papers CSR and per-paper centrality
+        self._ap_indptr: Optional[np.ndarray] = None
+        self._ap_indices: Optional[np.ndarray] = None
+        self._paper_score: Optional[np.ndarray] = None
+        self._pagerank: Optional[np.ndarray] = None  # last vector, for warm starts
+        # (out_indptr, out_indices, in_indptr, in_indices) over paper ids
+        self._cites: Optional[Tuple[np.ndarray, ...]] = None
+
+        # bumped on every change; caches of derived data key on it
+        self.version = 0
+        self._built_version = -1   # graph version the derived indexes were built from
+        self._stale = False        # changed since that build
+        self._rebuilder: Optional[threading.Thread] = None
+
+        # persistence: papers not yet written, pending debounced write, and
+        # the file's mtime as of our last read / write (another process wrote
+        # it when that changes)
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._synced_mtime: Optional[int] = None
+
         self._load()
+        atexit.register(self._flush_if_dirty)
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
 
     def _load(self):
-        if GRAPH_FILE.exists():
+        if not self.path.exists():
+            return
+        try:
+            self._synced_mtime = self._mtime()
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            log.error(f"Failed to load graph: {e}")
+            return
+
+        if data.get("format") == GRAPH_FORMAT:
+            self.paper_keys = data["papers"]
+            self.paper_titles = data["titles"]
+            self.author_names = data["authors"]
+            self._paper_idx = {k: i for i, k in enumerate(self.paper_keys)}
+            self._author_idx = {n: i for i, n in enumerate(self.author_names)}
+            self.pa_indptr = array("q", data["pa_indptr"])
+            self.pa_indices = array("i", data["pa_indices"])
+            degree = np.bincount(np.asarray(self.pa_indices, dtype=np.int64), minlength=len(self.author_names))
+            self.author_degree = array("i", degree.astype(np.int32).tobytes())
+            for i, k in enumerate(self.paper_keys):
+                self._index_canonical(k, i)
+            self.ref_keys = data.get("refs", [])
+            self._ref_idx = {k: i for i, k in enumerate(self.ref_keys)}
+            self.ref_paper = array("i", (self._resolve(k) for k in self.ref_keys))
+            self.cite_src = array("i", data.get("cite_src", []))
+            self.cite_dst = array("i", data.get("cite_dst", []))
+        else:
+            self._load_legacy(data)
+        log.info(f"Graph loaded: {self.stats()}")
+
+    def _load_legacy(self, data: Dict):
+        """The original {"nodes": [...], "edges": [...]} list-of-dicts file."""
+        papers = {}
+        for node in data.get("nodes", []):
+            if node.get("type") == "paper":
+                papers.setdefault(node["id"], {"title": node.get("title", ""), "authors": []})
+        for edge in data.get("edges", []):
+            if edge.get("type") == "AUTHORED_BY" and edge["source"] in papers:
+                name = edge["target"].split("author:", 1)[-1]
+                papers[edge["source"]]["authors"].append(name)
+        self.add_papers(
+            ({"paper_id": pid, **p} for pid, p in papers.items()), save=False
+        )
+
+    def flush(self):
+        """
+        Write the graph to `path` (format 2).
+
+        Writers are serialized with an exclusive lock on `path`.lock, and
+        papers another process (e.g. another gunicorn worker) wrote to the
+        file since our last read or write are merged in first, so concurrent
+        ingest in several workers doesn't lose papers.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._merge_from_disk()
+            with self._lock:
+                self._dirty = False
+                # copies, so the (slow) write runs without holding the lock
+                data = {
+                    "format": GRAPH_FORMAT,
+                    "papers": list(self.paper_keys),
+                    "titles": list(self.paper_titles),
+                    "authors": list(self.author_names),
+                    "pa_indptr": self.pa_indptr.tolist(),
+                    "pa_indices": self.pa_indices.tolist(),
+                    "refs": list(self.ref_keys),
+                    "cite_src": self.cite_src.tolist(),
+                    "cite_dst": self.cite_dst.tolist(),
+                }
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            tmp.replace(self.path)
+            self._synced_mtime = self._mtime()
+
+    def _merge_from_disk(self):
+        """Add papers that are in the file but not in memory (file lock held)."""
+        mtime = self._mtime()
+        if mtime is None or mtime == self._synced_mtime:
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            log.error(f"Failed to read graph for merging: {e}")
+            return
+        if data.get("format") != GRAPH_FORMAT:
+            return
+        keys, indptr, indices = data["papers"], data["pa_indptr"], data["pa_indices"]
+        authors, refs = data["authors"], data.get("refs", [])
+        cite_src, cite_dst = data.get("cite_src", []), data.get("cite_dst", [])
+        missing = [i for i, k in enumerate(keys) if k not in self._paper_idx]
+        added = self.add_papers(({
+            "paper_id": keys[i],
+            "title": data["titles"][i],
+            "authors": [authors[a] for a in indices[indptr[i]:indptr[i + 1]]],
+            # cite_src is sorted (papers are appended in id order)
+            "references": [refs[r] for r in cite_dst[bisect_left(cite_src, i):bisect_right(cite_src, i)]],
+        } for i in missing), save=False)
+        if added:
+            log.info(f"Merged {added} papers written by another process")
+
+    def _schedule_flush(self):
+        """Debounced flush: one write GRAPH_FLUSH_DELAY_S after the first unsaved insert."""
+        with self._lock:
+            self._dirty = True
+            if settings.GRAPH_FLUSH_DELAY_S > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(settings.GRAPH_FLUSH_DELAY_S, self._flush_if_dirty)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self.flush()
+
+    def _flush_if_dirty(self):
+        with self._lock:
+            # inserts from here on schedule the next write
+            self._flush_timer = None
+        if self._dirty:
             try:
-                with open(GRAPH_FILE, "r") as f:
-                    self.graph = json.load(f)
-                log.info("Graph loaded.")
+                self.flush()
             except Exception as e:
-                log.error(f"Failed to load graph: {e}")
-
-    def _save(self):
-        GRAPH_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(GRAPH_FILE, "w") as f:
-            json.dump(self.graph, f, indent=2)
-        log.info("Graph saved.")
+                log.exception(f"Failed to write graph: {e}")
 
     # ------------------------------------------------------------
     # BASIC OPERATIONS
     # ------------------------------------------------------------
-    def add_paper(self, paper_id: str, title: str, authors: list):
-        """Adds paper + edges to authors."""
-        # Add paper node
-        self.graph["nodes"].append({
-            "id": paper_id,
-            "type": "paper",
-            "title": title,
-            "authors": authors
-        })
-
-        # Add author nodes + edges
-        for a in authors:
-            self.graph["nodes"].append({
-                "id": f"author:{a}",
-                "type": "author",
-                "name": a
-            })
-            self.graph["edges"].append({
-                "source": paper_id,
-                "target": f"author:{a}",
-                "type": "AUTHORED_BY"
-            })
-
-        self._save()
+    def _intern_author(self, name: str) -> int:
+        idx = self._author_idx.get(name)
+        if idx is None:
+            idx = self._author_idx[name] = len(self.author_names)
+            self.author_names.append(name)
+            self.author_degree.append(0)
+        return idx
+
+    def _index_canonical(self, paper_id: str, idx: int):
+        if "v" not in paper_id and ":" not in paper_id:
+            return  # cheap pre-check: nothing to strip
+        base = canonical_id(paper_id)
+        if base != paper_id:
+            self._canonical_idx.setdefault(base, idx)
+
+    def _resolve(self, key: str) -> int:
+        idx = self._paper_idx.get(key)
+        if idx is None:
+            idx = self._canonical_idx.get(key, -1)
+        return idx
+
+    def _intern_ref(self, key: str) -> int:
+        key = canonical_id(key)
+        r = self._ref_idx.get(key)
+        if r is None:
+            r = self._ref_idx[key] = len(self.ref_keys)
+            self.ref_keys.append(key)
+            self.ref_paper.append(self._resolve(key))
+        return r
+
+    def _add(self, paper_id: str, title: str, authors: Iterable[str], references: Iterable[str] = ()) -> bool:
+        if paper_id in self._paper_idx:
+            return False  # papers are immutable once added; re-ingest is a no-op
+        idx = self._paper_idx[paper_id] = len(self.paper_keys)
+        self.paper_keys.append(paper_id)
+        self.paper_titles.append(title)
+        self._index_canonical(paper_id, idx)
+        ids = list(dict.fromkeys(self._intern_author(a) for a in authors))
+        for a in ids:
+            self.author_degree[a] += 1
+        self.pa_indices.extend(ids)
+        self.pa_indptr.append(len(self.pa_indices))
+
+        # earlier papers citing this one now resolve to it
+        for key in {paper_id, canonical_id(paper_id)}:
+            r = self._ref_idx.get(key)
+            if r is not None and self.ref_paper[r] < 0:
+                self.ref_paper[r] = idx
+        refs = list(dict.fromkeys(self._intern_ref(k) for k in references))
+        self.cite_src.extend([idx] * len(refs))
+        self.cite_dst.extend(refs)
+        return True
+
+    def add_paper(self, paper_id: str, title: str, authors: list, references: list = None):
+        """Adds paper + edges to authors (and CITES edges to the referenced ids)."""
+        self.add_papers([{"paper_id": paper_id, "title": title, "authors": authors,
+                          "references": references or []}])
+
+    def add_papers(self, papers: Iterable[Dict], save: bool = True) -> int:
+        """
+        Bulk insert of {"paper_id", "title", "authors"[, "references"]}
+        dicts; papers already in the graph are skipped. With save=True the
+        file is written GRAPH_FLUSH_DELAY_S later (one write for a burst of
+        inserts; at exit at the latest); with save=False only by flush().
+        Returns the number of new papers.
+        """
+        with self._lock:
+            added = sum(self._add(p["paper_id"], p.get("title", ""), p.get("authors") or [],
+                                  p.get("references") or ())
+                        for p in papers)
+            if added:
+                self._changed()
+        if added and save:
+            self._schedule_flush()
+        return added
+
+    @property
+    def paper_count(self) -> int:
+        return len(self.paper_keys)
+
+    def has_paper(self, paper_id: str) -> bool:
+        return paper_id in self._paper_idx
+
+    def has_author(self, name: str) -> bool:
+        return name in self._author_idx
+
+    def _edges(self):
+        """AUTHORED_BY edges as parallel (paper, author) int arrays (copies)."""
+        indices = np.array(self.pa_indices, dtype=np.int32)
+        indptr = np.array(self.pa_indptr, dtype=np.int64)
+        edge_paper = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+        return edge_paper, indices
+
+    def _author_index(self):
+        """author -> papers CSR (most central papers first), built on first use."""
+        with self._lock:
+            if self._ap_indptr is None:
+                self.refresh(authors=True)
+            return self._ap_indptr, self._ap_indices
 
     # ------------------------------------------------------------
-    # NEW — "related_by_authors" for JSON graph
+    # Derived indexes: built once, then refreshed off the request path
     # ------------------------------------------------------------
-    def related_by_authors(self, paper_ids, limit=5):
+    def _changed(self):
+        """After inserts (lock held): new version, background refresh of built indexes."""
+        self.version += 1
+        if self._paper_score is None:
+            return  # nothing built yet; built on first use
+        self._stale = True
+        if self._rebuilder is None:
+            self._rebuilder = threading.Thread(target=self._rebuild_loop, name="graph-index", daemon=True)
+            self._rebuilder.start()
+
+    def _rebuild_loop(self):
+        while True:
+            time.sleep(settings.GRAPH_INDEX_REBUILD_DELAY_S)  # let a burst of inserts finish
+            with self._lock:
+                if not self._stale:
+                    self._rebuilder = None
+                    return
+                self._stale = False
+            try:
+                self.refresh()
+            except Exception as e:
+                log.exception(f"Graph index rebuild failed: {e}")
+
+    def _snapshot(self, citations: bool) -> Dict[str, Any]:
+        """Copies of everything the derived indexes are computed from (lock held)."""
+        edge_paper, indices = self._edges()
+        snap = {
+            "version": self.version,
+            "n_papers": len(self.paper_keys),
+            "n_authors": len(self.author_names),
+            "edge_paper": edge_paper,
+            "indices": indices,
+            "degree": np.array(self.author_degree, dtype=np.int32),
+            "pagerank": self._pagerank,
+        }
+        if citations:
+            snap["cite_src"] = np.array(self.cite_src, dtype=np.int64)
+            snap["cite_dst"] = np.array(self.ref_paper, dtype=np.int64)[np.array(self.cite_dst, dtype=np.int64)] \
+                if self.cite_dst else np.zeros(0, dtype=np.int64)
+        return snap
+
+    def refresh(self, authors: bool = None, citations: bool = None):
+        """
+        Recompute centrality and the author / citation indexes from the
+        current graph and swap them in. The computation runs on a snapshot
+        without holding the lock. By default only indexes that were built
+        before are rebuilt.
+        """
+        with self._lock:
+            authors = self._ap_indptr is not None if authors is None else authors
+            citations = self._cites is not None if citations is None else citations
+            snap = self._snapshot(citations)
+        score, pagerank = self._compute_scores(snap)
+        ap = self._compute_author_index(snap, score) if authors else None
+        cites = self._compute_citation_index(snap, score) if citations else None
+        with self._lock:
+            if snap["version"] < self._built_version:
+                return  # a build from a newer snapshot got here first
+            self._built_version = snap["version"]
+            self._paper_score = score
+            if pagerank is not None:
+                self._pagerank = pagerank
+            if ap is not None:
+                self._ap_indptr, self._ap_indices = ap
+            if cites is not None:
+                self._cites = cites
+
+    def build_indexes(self):
+        """Build every derived index now, e.g. before forking workers that share them."""
+        self.refresh(authors=True, citations=bool(self.cite_src))
+
+    @staticmethod
+    def _compute_author_index(snap: Dict[str, Any], score: np.ndarray):
+        edge_paper, indices = snap["edge_paper"], snap["indices"]
+        # by author, then centrality descending, then insertion order
+        order = np.lexsort((edge_paper, -score[edge_paper], indices))
+        counts = np.bincount(indices, minlength=snap["n_authors"])
+        return np.concatenate(([0], np.cumsum(counts))).astype(np.int64), edge_paper[order]
+
+    # ------------------------------------------------------------
+    # Centrality
+    # ------------------------------------------------------------
+    def paper_scores(self) -> np.ndarray:
         """
-        Return papers that share authors with any of the given paper IDs.
-        Works with the new JSON-based graph structure.
+        Centrality per paper index (higher = more central) as of the last
+        index build; papers added since are beyond the end of the array.
         """
-        related = []
+        with self._lock:
+            if self._paper_score is None:
+                self.refresh()
+            return self._paper_score
+
+    def _compute_scores(self, snap: Dict[str, Any]) -> Tuple[np.ndarray, Optional[tuple]]:
+        """(scores, PageRank vectors for the next warm start or None)."""
+        if settings.GRAPH_CENTRALITY == "pagerank":
+            return self._pagerank_scores(snap)
+        score = np.bincount(snap["edge_paper"], weights=np.log1p(snap["degree"][snap["indices"]]),
+                            minlength=snap["n_papers"])
+        return score, None
+
+    @staticmethod
+    def _pagerank_scores(snap: Dict[str, Any]) -> Tuple[np.ndarray, Optional[tuple]]:
+        edge_paper, indices = snap["edge_paper"], snap["indices"]
+        n_p, n_a = snap["n_papers"], snap["n_authors"]
+        n = n_p + n_a
+        if n == 0:
+            return np.zeros(0), None
+        d = settings.GRAPH_PAGERANK_DAMPING
+        p_deg = np.bincount(edge_paper, minlength=n_p).astype(np.float64)
+        a_deg = np.bincount(indices, minlength=n_a).astype(np.float64)
+
+        # warm start: previous ranks for existing nodes, uniform for new ones
+        rank = np.full(n, 1.0 / n)
+        prev = snap["pagerank"]
+        if prev is not None:
+            old_p, old_a = prev
+            rank[:len(old_p)] = old_p
+            rank[n_p:n_p + len(old_a)] = old_a
+            rank /= rank.sum()
+
+        for _ in range(settings.GRAPH_PAGERANK_MAX_ITER):
+            r_p, r_a = rank[:n_p], rank[n_p:]
+            dangling = r_p[p_deg == 0].sum() + r_a[a_deg == 0].sum()
+            new = np.empty(n)
+            # paper -> its authors, author -> their papers, uniformly
+            new[n_p:] = np.bincount(indices, weights=(r_p / np.maximum(p_deg, 1))[edge_paper], minlength=n_a)
+            new[:n_p] = np.bincount(edge_paper, weights=(r_a / np.maximum(a_deg, 1))[indices], minlength=n_p)
+            new = d * new + (d * dangling + 1.0 - d) / n
+            done = np.abs(new - rank).sum() < settings.GRAPH_PAGERANK_TOL
+            rank = new
+            if done:
+                break
 
-        for edge in self.graph["edges"]:
-            if edge["type"] != "AUTHORED_BY":
-                continue
+        return rank[:n_p] * n, (rank[:n_p].copy(), rank[n_p:].copy())  # scores ~1 for an average node
 
-            # Example: source = paperID, target = author:<name>
-            if edge["source"] in paper_ids:
-                author_node = edge["target"]
 
-                # find all papers connected to same author
-                for e2 in self.graph["edges"]:
-                    if (
-                        e2["target"] == author_node
-                        and e2["source"] not in paper_ids
-                    ):
-                        related.append(e2["source"])
+    def authors_of(self, paper_id: str) -> List[str]:
+        p = self._paper_idx.get(paper_id)
+        if p is None:
+            return []
+        return [self.author_names[a] for a in self.pa_indices[self.pa_indptr[p]:self.pa_indptr[p + 1]]]
 
-        # Deduplicate and limit
-        related = list(dict.fromkeys(related))[:limit]
+    def papers_of(self, author: str) -> List[str]:
+        a = self._author_idx.get(author)
+        if a is None:
+            return []
+        indptr, indices = self._author_index()
+        if a + 1 >= len(indptr):
+            return []  # author added after the last index build
+        return [self.paper_keys[p] for p in indices[indptr[a]:indptr[a + 1]]]
 
-        return related
+    def stats(self):
+        """Unique paper / author counts and AUTHORED_BY edge count."""
+        return {
+            "papers": len(self.paper_keys),
+            "authors": len(self.author_names),
+            "edges": len(self.pa_indices),
+            "citations": len(self.cite_src),
+        }
+
+    def centrality(self, paper_id: str) -> float:
+        p = self._paper_idx.get(paper_id)
+        scores = self.paper_scores()
+        return float(scores[p]) if p is not None and p < len(scores) else 0.0
+
+    def top_authors(self, k: int = 10) -> List[Dict[str, Any]]:
+        """Most prolific authors (highest degree)."""
+        degree = np.frombuffer(self.author_degree, dtype=np.int32) if self.author_degree \
+            else np.zeros(0, dtype=np.int32)
+        top = np.argsort(-degree, kind="stable")[:k]
+        return [{"author": self.author_names[a], "papers": int(degree[a])} for a in top]
 
     # ------------------------------------------------------------
-    # For visualization
+    # "related_by_authors" over the CSR indexes
     # ------------------------------------------------------------
-    def to_pyvis(self, outfile="graph_vis.html"):
-        from pyvis.network import Network
+    def related_by_authors(self, paper_ids, limit=5, with_scores=False):
+        """
+        Return up to `limit` papers that share authors with any of the given
+        paper IDs, best first: more shared authors first, then centrality.
+        Only the GRAPH_RELATED_PER_AUTHOR most central papers of each author
+        are considered, which bounds the work for prolific authors.
+        With with_scores=True, returns (paper_id, score) pairs.
+        """
+        seeds = [self._paper_idx[p] for p in paper_ids if p in self._paper_idx]
+        if not seeds or limit <= 0:
+            return []
+        indptr, indices = self._author_index()
+        centrality = self.paper_scores()
+        exclude = set(seeds)
+        per_author = settings.GRAPH_RELATED_PER_AUTHOR
+
+        shared: Dict[int, int] = {}
+        seed_authors = dict.fromkeys(
+            a for p in seeds for a in self.pa_indices[self.pa_indptr[p]:self.pa_indptr[p + 1]]
+        )
+        for a in seed_authors:
+            if a + 1 >= len(indptr):
+                continue  # author added after the last index build
+            start = indptr[a]
+            for q in indices[start:min(indptr[a + 1], start + per_author)].tolist():
+                if q not in exclude:
+                    shared[q] = shared.get(q, 0) + 1
+        if not shared:
+            return []
+
+        # centrality normalized to [0, 1) only breaks ties between equal
+        # shared-author counts
+        top = float(centrality.max()) or 1.0
+        best = heapq.nlargest(
+            limit, shared.items(), key=lambda kv: (kv[1] + float(centrality[kv[0]]) / (top * 1.000001), -kv[0])
+        )
+        if with_scores:
+            return [(self.paper_keys[q], round(n + float(centrality[q]) / (top * 1.000001), 4)) for q, n in best]
+        return [self.paper_keys[q] for q, _ in best]
+
+    # ------------------------------------------------------------
+    # Citations
+    # ------------------------------------------------------------
+    def _citation_index(self):
+        """
+        Resolved CITES edges as (out_indptr, out_indices, in_indptr,
+        in_indices) CSR over paper ids, neighbours most central first;
+        rebuilt when stale. Unresolved keys, self-citations and duplicates
+        are dropped.
+        """
+        with self._lock:
+            if self._cites is None:
+                self.refresh(citations=True)
+            return self._cites
+
+    @staticmethod
+    def _compute_citation_index(snap: Dict[str, Any], score: np.ndarray):
+        n = snap["n_papers"]
+        src, dst = snap["cite_src"], snap["cite_dst"]
+        keep = (dst >= 0) & (dst != src)
+        src, dst = src[keep], dst[keep]
+        # position of each paper in centrality order (0 = most central)
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.argsort(-score, kind="stable")] = np.arange(n)
+        by_rank = np.argsort(rank)
+
+        def csr(rows, cols):
+            # one int64 sort key per edge: row, then the neighbour's rank
+            keys = np.sort(rows * n + rank[cols])
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+            rows = keys // n
+            counts = np.bincount(rows, minlength=n)
+            indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+            return indptr, by_rank[keys % n].astype(np.int32)
+
+        return (*csr(src, dst), *csr(dst, src))
+
+    def cited_by(self, paper_id: str) -> List[str]:
+        p = self._paper_idx.get(paper_id)
+        if p is None:
+            return []
+        _, _, indptr, indices = self._citation_index()
+        if p + 1 >= len(indptr):
+            return []
+        return [self.paper_keys[q] for q in indices[indptr[p]:indptr[p + 1]]]
+
+    def references_of(self, paper_id: str) -> List[str]:
+        """Cited keys, including works that are not in the graph."""
+        p = self._paper_idx.get(paper_id)
+        if p is None:
+            return []
+        # a paper's references are appended together, and papers in id
+        # order, so cite_src is sorted
+        lo, hi = bisect_left(self.cite_src, p), bisect_right(self.cite_src, p)
+        return [self.ref_keys[r] for r in self.cite_dst[lo:hi]]
 
-        net = Network(height="600px", width="100%", bgcolor="#111", font_color="white")
+    def expand(self, paper_ids: Sequence[str], hops: int = 2, max_fanout: int = 10, max_nodes: int = 50,
+               budget_ms: Optional[float] = None, relations: Sequence[str] = ("cites", "cited_by")) -> List[Dict]:
+        """
+        Bounded k-hop neighbourhood over CITES edges, breadth-first.
+
+        From each node at most `max_fanout` neighbours per relation are
+        followed ("cites": papers it references, "cited_by": papers
+        referencing it), most central first. Stops after `hops` levels,
+        `max_nodes` results, or once `budget_ms` has elapsed. Returns
+        {"paper_id", "hop", "relation"} dicts in discovery order.
+        """
+        seeds = [self._paper_idx[p] for p in paper_ids if p in self._paper_idx]
+        if not seeds or max_nodes <= 0 or not self.cite_src:
+            return []
+        out_ptr, out_idx, in_ptr, in_idx = self._citation_index()
+        adjacency = [(rel, ptr, idx) for rel, ptr, idx in
+                     (("cites", out_ptr, out_idx), ("cited_by", in_ptr, in_idx)) if rel in relations]
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
 
-        for node in self.graph["nodes"]:
+        seen = set(seeds)
+        found: List[Dict] = []
+        frontier = seeds
+        for hop in range(1, hops + 1):
+            nxt = []
+            for p in frontier:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return found
+                for rel, ptr, idx in adjacency:
+                    if p + 1 >= len(ptr):
+                        continue  # seed added after the last index build
+                    start = ptr[p]
+                    for q in idx[start:min(ptr[p + 1], start + max_fanout)].tolist():
+                        if q in seen:
+                            continue
+                        seen.add(q)
+                        nxt.append(q)
+                        found.append({"paper_id": self.paper_keys[q], "hop": hop, "relation": rel})
+                        if len(found) >= max_nodes:
+                            return found
+            if not nxt:
+                break
+            frontier = nxt
+        return found
+
+    # ------------------------------------------------------------
+    # Subgraphs & visualization
+    # ------------------------------------------------------------
+    def subgraph(self, paper_ids: Sequence[str] = (), authors: Sequence[str] = (), depth: int = 2,
+                 max_nodes: int = 200, max_edges: int = 400, max_fanout: int = 25) -> Dict[str, Any]:
+        """
+        Bounded AUTHORED_BY neighbourhood for display.
+
+        With seeds, a breadth-first ego network: `depth` bipartite steps
+        (paper -> authors is one step, authors -> their papers the next),
+        following at most `max_fanout` edges per node; seeds that are not in
+        the graph are skipped (none found: an empty subgraph). Without seeds,
+        the most prolific authors and their papers. Stops at `max_nodes` /
+        `max_edges` and reports truncated=True.
+        """
+        indptr, indices = self._author_index()
+        level_p = [self._paper_idx[p] for p in paper_ids if p in self._paper_idx]
+        level_a = [self._author_idx[a] for a in authors if a in self._author_idx]
+        if not paper_ids and not authors:
+            degree = np.frombuffer(self.author_degree, dtype=np.int32) if self.author_degree \
+                else np.zeros(0, dtype=np.int32)
+            k = min(len(degree), max(1, max_nodes // (max_fanout + 1)))
+            level_a = np.argsort(-degree, kind="stable")[:k].tolist()
+            depth = max(depth, 1)
+
+        papers: Dict[int, None] = dict.fromkeys(level_p[:max_nodes])
+        auths: Dict[int, None] = dict.fromkeys(level_a[:max_nodes - len(papers)])
+        edges: List[tuple] = []
+        truncated = False
+
+        def room() -> bool:
+            return len(papers) + len(auths) < max_nodes and len(edges) < max_edges
+
+        for _ in range(depth):
+            next_p, next_a = [], []
+            for p in level_p:
+                for a in self.pa_indices[self.pa_indptr[p]:self.pa_indptr[p + 1]][:max_fanout]:
+                    if a not in auths:
+                        if not room():
+                            truncated = True
+                            break
+                        auths[a] = None
+                        next_a.append(a)
+                    if len(edges) >= max_edges:
+                        truncated = True
+                        break
+                    edges.append((p, a))
+            for a in level_a:
+                if a + 1 >= len(indptr):
+                    continue  # author added after the last index build
+                for p in indices[indptr[a]:min(indptr[a + 1], indptr[a] + max_fanout)].tolist():
+                    if p not in papers:
+                        if not room():
+                            truncated = True
+                            break
+                        papers[p] = None
+                        next_p.append(p)
+                    if len(edges) >= max_edges:
+                        truncated = True
+                        break
+                    edges.append((p, a))
+            level_p, level_a = next_p, next_a
+            if truncated or not (level_p or level_a):
+                break
+
+        edges = list(dict.fromkeys(edges))
+        return {
+            "version": self.version,
+            "truncated": truncated,
+            "nodes": [
+                {"id": self.paper_keys[p], "type": "paper", "label": self.paper_titles[p],
+                 "degree": int(self.pa_indptr[p + 1] - self.pa_indptr[p])}
+                for p in papers
+            ] + [
+                {"id": f"author:{self.author_names[a]}", "type": "author", "label": self.author_names[a],
+                 "degree": int(self.author_degree[a])}
+                for a in auths
+            ],
+            "edges": [
+                {"source": self.paper_keys[p], "target": f"author:{self.author_names[a]}", "type": "AUTHORED_BY"}
+                for p, a in edges
+            ],
+        }
+
+    @staticmethod
+    def render_html(sub: Dict[str, Any]) -> str:
+        """pyvis HTML for a subgraph() result."""
+        from pyvis.network import Network
+
+        net = Network(height="650px", width="100%", bgcolor="#111a33", font_color="white")
+        for node in sub["nodes"]:
             if node["type"] == "paper":
-                net.add_node(node["id"], label=node["title"], color="#6366f1")
+                label = node["label"]
+                short = (label[:22] + "…") if len(label) > 22 else label
+                net.add_node(node["id"], label=short, title=label, color="#818cf8")
             else:
-                net.add_node(node["id"], label=node.get("name"), color="#10b981")
-
-        for e in self.graph["edges"]:
+                net.add_node(node["id"], label=node["label"], title=f"{node['degree']} papers",
+                             color="#10b981", value=node["degree"])
+        for e in sub["edges"]:
             net.add_edge(e["source"], e["target"], color="#94a3b8")
+        # bounded layout time: a few hundred stabilization iterations, then static
+        net.set_options('{"physics": {"stabilization": {"iterations": 200}, "barnesHut": {"springLength": 120}}}')
+        return net.generate_html()
 
-        net.save_graph(outfile)
+    def to_pyvis(self, outfile="graph_vis.html", **subgraph_kwargs):
+        """Write a bounded subgraph (see subgraph()) to an HTML file."""
+        with open(outfile, "w") as f:
+            f.write(self.render_html(self.subgraph(**subgraph_kwargs)))
         return outfile
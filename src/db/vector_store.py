@@ -1,13 +1,52 @@
 # src/db/vector_store.py
 
-from qdrant_client import QdrantClient
+import json
+import os
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from qdrant_client import QdrantClient, models
 from qdrant_client.models import Distance, VectorParams, PointStruct
 from src.config import settings
 from src.db.embeddings import get_encoder
+from src.db.embedding_service import BULK, INTERACTIVE, EmbeddingService
 from src.logger import get_logger
+from src.metrics import histogram
+from src.utils.mmr import mmr
 
 log = get_logger("VectorStore")
 
+ENCODE_SECONDS = histogram("encoder_encode_seconds", "Time per encoder.encode call", ["kind"])
+ENCODE_BATCH = histogram(
+    "encoder_batch_size", "Texts per encoder.encode call", ["kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+QDRANT_SECONDS = histogram("qdrant_request_seconds", "Latency of Qdrant client calls", ["op"])
+MMR_SECONDS = histogram("mmr_seconds", "Time per MMR selection over fetched candidates")
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+# Settings that can be changed at runtime via update_collection_config()
+VECTOR_CONFIG_FIELDS = (
+    "QDRANT_QUANTIZATION",
+    "QDRANT_QUANTIZATION_ALWAYS_RAM",
+    "QDRANT_QUANTIZATION_RESCORE",
+    "QDRANT_QUANTIZATION_OVERSAMPLING",
+    "QDRANT_ON_DISK_VECTORS",
+    "QDRANT_ON_DISK_PAYLOAD",
+    "HNSW_M",
+    "HNSW_EF_CONSTRUCT",
+    "HNSW_EF",
+)
+
+# Runtime changes are persisted here, so every worker process (and restarts)
+# pick them up; see VectorStore.sync_config()
+VECTOR_CONFIG_FILE = Path("data/vector_config.json")
+
 
 def _to_list(vec):
     """Normalize encoder output to a plain Python list[float]."""
@@ -24,27 +63,229 @@ def _to_list(vec):
         return [float(vec)]
 
 
+def _cfg(overrides: Optional[Dict[str, Any]], key: str):
+    if overrides and key in overrides:
+        return overrides[key]
+    return getattr(settings, key)
+
+
+def quantization_config(overrides: Optional[Dict[str, Any]] = None):
+    """Build the Qdrant quantization config for the configured mode (None = off)."""
+    mode = str(_cfg(overrides, "QDRANT_QUANTIZATION")).lower()
+    always_ram = _cfg(overrides, "QDRANT_QUANTIZATION_ALWAYS_RAM")
+
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=always_ram,
+            )
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=always_ram)
+        )
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+
+
+def collection_kwargs(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Keyword arguments for client.create_collection() from settings (+ overrides)."""
+    return {
+        "vectors_config": VectorParams(
+            size=settings.VECTOR_SIZE,
+            distance=Distance.COSINE,
+            on_disk=_cfg(overrides, "QDRANT_ON_DISK_VECTORS"),
+        ),
+        "hnsw_config": models.HnswConfigDiff(
+            m=_cfg(overrides, "HNSW_M"),
+            ef_construct=_cfg(overrides, "HNSW_EF_CONSTRUCT"),
+        ),
+        "quantization_config": quantization_config(overrides),
+        "on_disk_payload": _cfg(overrides, "QDRANT_ON_DISK_PAYLOAD"),
+    }
+
+
+def search_params(overrides: Optional[Dict[str, Any]] = None) -> models.SearchParams:
+    """Search-time HNSW beam width and quantization rescoring."""
+    quant = None
+    if str(_cfg(overrides, "QDRANT_QUANTIZATION")).lower() != "none":
+        quant = models.QuantizationSearchParams(
+            rescore=_cfg(overrides, "QDRANT_QUANTIZATION_RESCORE"),
+            oversampling=_cfg(overrides, "QDRANT_QUANTIZATION_OVERSAMPLING"),
+        )
+    return models.SearchParams(hnsw_ef=_cfg(overrides, "HNSW_EF"), quantization=quant)
+
+
+@lru_cache(maxsize=1)
+def get_client() -> QdrantClient:
+    """
+    Process-wide Qdrant client.
+
+    QDRANT_URL=":memory:" selects Qdrant's embedded local mode (no server),
+    used by the benchmarks and load tests. Sharing one client matters there,
+    since every local client is its own database.
+    """
+    if settings.QDRANT_URL == ":memory:":
+        log.info("Using in-memory local Qdrant")
+        return QdrantClient(location=":memory:")
+    return QdrantClient(
+        url=settings.QDRANT_URL,
+        api_key=settings.QDRANT_API_KEY,
+    )
+
+
 class VectorStore:
     def __init__(self):
-        self.client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY,
-        )
-        self.encoder = get_encoder()
-        self.init_collection()
+        self.available = False
+        # bumped on every write (ingest, migration, clear), so cached search results can be keyed by it
+        self.version = 0
+        self.client = get_client()
+        # mtime of VECTOR_CONFIG_FILE as last applied to settings
+        self._config_mtime = None
+        self.sync_config()
+        # in "process" mode the model lives only in the embedding worker
+        self.encoder = get_encoder() if settings.EMBEDDING_SERVICE_MODE != "process" else None
+        # late-bound so a swapped self.encoder is picked up by the service
+        self.embedder = None
+        if settings.EMBEDDING_SERVICE_MODE != "inline":
+            self.embedder = EmbeddingService(lambda texts: self.encoder.encode(texts))
+        try:
+            self.init_collection()
+            self.available = True
+        except Exception as e:
+            log.exception(f"Failed to initialize Qdrant collection: {e}")
 
     def init_collection(self):
+        if not self.client.collection_exists(settings.PAPER_COLLECTION_NAME):
+            self.client.create_collection(
+                collection_name=settings.PAPER_COLLECTION_NAME,
+                **collection_kwargs(),
+            )
         if not self.client.collection_exists(settings.COLLECTION_NAME):
-            log.info("Creating Qdrant collection...")
+            log.info(
+                "Creating Qdrant collection (quantization=%s, on_disk_vectors=%s, m=%d, ef_construct=%d)...",
+                settings.QDRANT_QUANTIZATION,
+                settings.QDRANT_ON_DISK_VECTORS,
+                settings.HNSW_M,
+                settings.HNSW_EF_CONSTRUCT,
+            )
             self.client.create_collection(
                 collection_name=settings.COLLECTION_NAME,
-                vectors_config=VectorParams(
-                    size=settings.VECTOR_SIZE,
-                    distance=Distance.COSINE,
-                ),
+                **collection_kwargs(),
             )
         else:
             log.info("✅ VectorStore initialized")
+        self.ensure_payload_indexes()
+
+    def ensure_payload_indexes(self):
+        """
+        Keyword / integer indexes for the fields chunk searches filter on
+        (two-stage retrieval, get_by_id, document counts). Idempotent.
+        """
+        for field, schema in (("paper_id", models.PayloadSchemaType.KEYWORD),
+                              ("chunk_index", models.PayloadSchemaType.INTEGER)):
+            self.client.create_payload_index(
+                collection_name=settings.COLLECTION_NAME, field_name=field, field_schema=schema,
+            )
+
+    def encode(self, texts, kind: str = "query"):
+        """
+        Embed a text or list of texts. kind="query" is served ahead of
+        kind="document" (ingestion) when the embedding service is enabled.
+        """
+        ENCODE_BATCH.labels(kind=kind).observe(1 if isinstance(texts, str) else len(texts))
+        with ENCODE_SECONDS.labels(kind=kind).time():
+            if self.embedder is not None:
+                return self.embedder.encode(texts, priority=INTERACTIVE if kind == "query" else BULK)
+            return self.encoder.encode(texts)
+
+    # -------------------------
+    # INDEX / STORAGE CONFIG
+    # -------------------------
+    def vector_config(self) -> Dict[str, Any]:
+        self.sync_config()
+        return {key: getattr(settings, key) for key in VECTOR_CONFIG_FIELDS}
+
+    def sync_config(self):
+        """
+        Apply VECTOR_CONFIG_FILE to settings when it changed since the last
+        call, i.e. when update_collection_config() ran in another worker.
+        Cheap (one stat) when it didn't; called before every search.
+        """
+        try:
+            mtime = os.stat(VECTOR_CONFIG_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._config_mtime:
+            return
+        try:
+            with open(VECTOR_CONFIG_FILE) as f:
+                config = json.load(f)
+        except Exception as e:
+            log.error(f"Failed to read {VECTOR_CONFIG_FILE}: {e}")
+            return
+        self._config_mtime = mtime
+        for key, value in config.items():
+            if key in VECTOR_CONFIG_FIELDS:
+                setattr(settings, key, value)
+
+    def _persist_config(self):
+        VECTOR_CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = VECTOR_CONFIG_FILE.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({key: getattr(settings, key) for key in VECTOR_CONFIG_FIELDS}, f, indent=2)
+        tmp.replace(VECTOR_CONFIG_FILE)
+        self._config_mtime = os.stat(VECTOR_CONFIG_FILE).st_mtime_ns
+
+    def update_collection_config(self, **changes) -> Dict[str, Any]:
+        """
+        Apply new quantization / on-disk / HNSW settings to the live chunk and
+        paper collections.
+
+        Only keys from VECTOR_CONFIG_FIELDS are accepted. HNSW_EF and the
+        rescoring options are search-time only and take effect immediately;
+        the rest trigger a Qdrant re-optimization in the background. The
+        resulting config is written to VECTOR_CONFIG_FILE, from which the
+        other workers apply it at their next search.
+        """
+        unknown = set(changes) - set(VECTOR_CONFIG_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown vector config fields: {sorted(unknown)}")
+        if "QDRANT_QUANTIZATION" in changes:
+            changes["QDRANT_QUANTIZATION"] = str(changes["QDRANT_QUANTIZATION"]).lower()
+        # validates the mode before anything is changed
+        quant = quantization_config(changes)
+
+        update: Dict[str, Any] = {}
+        if "HNSW_M" in changes or "HNSW_EF_CONSTRUCT" in changes:
+            update["hnsw_config"] = models.HnswConfigDiff(
+                m=_cfg(changes, "HNSW_M"),
+                ef_construct=_cfg(changes, "HNSW_EF_CONSTRUCT"),
+            )
+        if "QDRANT_QUANTIZATION" in changes or "QDRANT_QUANTIZATION_ALWAYS_RAM" in changes:
+            update["quantization_config"] = quant if quant is not None else models.Disabled.DISABLED
+        if "QDRANT_ON_DISK_VECTORS" in changes:
+            update["vectors_config"] = {
+                "": models.VectorParamsDiff(on_disk=changes["QDRANT_ON_DISK_VECTORS"])
+            }
+        if "QDRANT_ON_DISK_PAYLOAD" in changes:
+            update["collection_params"] = models.CollectionParamsDiff(
+                on_disk_payload=changes["QDRANT_ON_DISK_PAYLOAD"]
+            )
+
+        if update:
+            log.info(f"Updating Qdrant collection config: {sorted(update)}")
+            for name in (settings.COLLECTION_NAME, settings.PAPER_COLLECTION_NAME):
+                self.client.update_collection(collection_name=name, **update)
+
+        self.sync_config()  # don't overwrite another worker's change with stale values
+        for key, value in changes.items():
+            setattr(settings, key, value)
+        self._persist_config()
+        return self.vector_config()
 
     # -------------------------
     # CLEAR
@@ -52,14 +293,19 @@ class VectorStore:
     def clear_collection(self):
         log.warning("Clearing Qdrant collection...")
         self.client.delete_collection(settings.COLLECTION_NAME)
+        self.client.delete_collection(settings.PAPER_COLLECTION_NAME)
         self.init_collection()
+        self.bump_version()
         return True
 
+    def bump_version(self):
+        self.version += 1
+
     # -------------------------
     # UPSERT
     # -------------------------
     def upsert_chunk(self, chunk_id: str, text: str, payload: dict):
-        raw_vec = self.encoder.encode(text)
+        raw_vec = self.encode(text, "document")
         vec = _to_list(raw_vec)
 
         payload = {
@@ -68,22 +314,253 @@ class VectorStore:
             "text": text,
         }
 
-        self.client.upsert(
-            collection_name=settings.COLLECTION_NAME,
-            points=[PointStruct(id=chunk_id, vector=vec, payload=payload)],
+        with QDRANT_SECONDS.labels(op="upsert").time():
+            self.client.upsert(
+                collection_name=settings.COLLECTION_NAME,
+                points=[PointStruct(id=chunk_id, vector=vec, payload=payload)],
+            )
+        self.bump_version()
+
+    def upsert_chunks(self, chunks: List[Dict[str, Any]]):
+        """
+        Batch variant of upsert_chunk: batched encoding and one Qdrant
+        request for a list of {"chunk_id", "text", "payload"} dicts.
+        Returns the embeddings.
+        """
+        if not chunks:
+            return []
+        vecs = self.encode([c["text"] for c in chunks], "document")
+
+        points = [
+            PointStruct(
+                id=c["chunk_id"],
+                vector=_to_list(v),
+                payload={
+                    "schema_version": settings.PAYLOAD_SCHEMA_VERSION,
+                    **c["payload"],
+                    "text": c["text"],
+                },
+            )
+            for c, v in zip(chunks, vecs)
+        ]
+        with QDRANT_SECONDS.labels(op="upsert").time():
+            self.client.upsert(collection_name=settings.COLLECTION_NAME, points=points)
+        self.bump_version()
+        return [p.vector for p in points]
+
+    # -------------------------
+    # PAPER-LEVEL INDEX
+    # -------------------------
+    @staticmethod
+    def paper_point_id(paper_id: str) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"paper:{paper_id}"))
+
+    def upsert_papers(self, papers: List[Dict[str, Any]]):
+        """Summary vectors for {"paper_id", "vector", "payload"} dicts (payload: title, source, chunks)."""
+        if not papers:
+            return
+        points = [
+            PointStruct(id=self.paper_point_id(p["paper_id"]), vector=_to_list(p["vector"]),
+                        payload={**p.get("payload", {}), "paper_id": p["paper_id"]})
+            for p in papers
+        ]
+        with QDRANT_SECONDS.labels(op="upsert").time():
+            self.client.upsert(collection_name=settings.PAPER_COLLECTION_NAME, points=points)
+        self.bump_version()
+
+    def paper_vector(self, paper_id: str) -> Optional[List[float]]:
+        """Mean of the paper's chunk embeddings (read back from the chunk collection)."""
+        total, n, offset = None, 0, None
+        while True:
+            with QDRANT_SECONDS.labels(op="scroll").time():
+                points, offset = self.client.scroll(
+                    collection_name=settings.COLLECTION_NAME,
+                    scroll_filter=models.Filter(
+                        must=[models.FieldCondition(key="paper_id", match=models.MatchValue(value=paper_id))]
+                    ),
+                    limit=256,
+                    offset=offset,
+                    with_payload=False,
+                    with_vectors=True,
+                )
+            if points:
+                block = np.asarray([p.vector for p in points], dtype=np.float32)
+                total = block.sum(axis=0) if total is None else total + block.sum(axis=0)
+                n += len(points)
+            if offset is None:
+                break
+        return None if not n else (total / n).tolist()
+
+    def build_paper_index(self, missing_only: bool = True, batch: int = 64) -> int:
+        """
+        Backfill summary vectors for papers ingested before the paper-level
+        collection existed (or all papers with missing_only=False), one
+        paper at a time so memory stays flat. Returns the number written.
+        """
+        written, offset = 0, None
+        first_chunk = models.Filter(
+            must=[models.FieldCondition(key="chunk_index", match=models.MatchValue(value=0))]
         )
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=settings.COLLECTION_NAME,
+                scroll_filter=first_chunk,
+                limit=batch,
+                offset=offset,
+                with_payload=["paper_id", "title", "source"],
+                with_vectors=False,
+            )
+            papers = {p.payload["paper_id"]: p.payload for p in points if (p.payload or {}).get("paper_id")}
+            if missing_only and papers:
+                have = self.client.retrieve(
+                    collection_name=settings.PAPER_COLLECTION_NAME,
+                    ids=[self.paper_point_id(pid) for pid in papers],
+                    with_payload=["paper_id"],
+                )
+                for p in have:
+                    papers.pop(p.payload.get("paper_id"), None)
+            rows = []
+            for pid, payload in papers.items():
+                vec = self.paper_vector(pid)
+                if vec is not None:
+                    rows.append({"paper_id": pid, "vector": vec,
+                                 "payload": {"title": payload.get("title"), "source": payload.get("source")}})
+            self.upsert_papers(rows)
+            written += len(rows)
+            if offset is None:
+                break
+        if written:
+            log.info(f"Paper-level index: wrote {written} summary vectors")
+        return written
+
+    # -------------------------
+    # LOOKUP
+    # -------------------------
+    def get_by_id(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        """First chunk of a paper as {"id", "title", "abstract"}, or None."""
+        with QDRANT_SECONDS.labels(op="scroll").time():
+            points, _ = self.client.scroll(
+                collection_name=settings.COLLECTION_NAME,
+                scroll_filter=models.Filter(
+                    must=[models.FieldCondition(key="paper_id", match=models.MatchValue(value=paper_id))]
+                ),
+                limit=1,
+                with_payload=True,
+                with_vectors=False,
+            )
+        if not points:
+            return None
+
+        payload = points[0].payload or {}
+        return {
+            "id": paper_id,
+            "title": payload.get("title") or "Untitled",
+            "abstract": payload.get("abstract") or payload.get("text") or "",
+        }
 
     # -------------------------
     # SEARCH
     # -------------------------
-    def search(self, query: str, top_k: int):
-        raw_qv = self.encoder.encode(query)
-        qv = _to_list(raw_qv)
-
-        res = self.client.query_points(
-            collection_name=settings.COLLECTION_NAME,
-            query=qv,
-            limit=top_k,
-            with_payload=True,
-        ).points
+    def query_vector(self, query: str) -> List[float]:
+        return _to_list(self.encode(query, "query"))
+
+    def search(self, query: str, top_k: int, paper_ids: Optional[Sequence[str]] = None,
+               query_vector: Optional[List[float]] = None):
+        """
+        Top chunks for the query, optionally only from the given papers.
+        A query_vector computed earlier (query_vector()) saves the encoding;
+        the same goes for the other search methods.
+        """
+        qv = query_vector if query_vector is not None else self.query_vector(query)
+        return self._search_chunks(qv, top_k, paper_ids)
+
+    def _search_chunks(self, qv: List[float], top_k: int, paper_ids: Optional[Sequence[str]] = None,
+                       with_vectors: bool = False):
+        self.sync_config()
+        query_filter = None
+        if paper_ids is not None:
+            query_filter = models.Filter(
+                must=[models.FieldCondition(key="paper_id", match=models.MatchAny(any=list(paper_ids)))]
+            )
+        with QDRANT_SECONDS.labels(op="query").time():
+            res = self.client.query_points(
+                collection_name=settings.COLLECTION_NAME,
+                query=qv,
+                query_filter=query_filter,
+                limit=top_k,
+                with_payload=True,
+                with_vectors=with_vectors,
+                search_params=search_params(),
+            ).points
         return res
+
+    def search_papers(self, qv: List[float], top_k: int) -> List[str]:
+        self.sync_config()
+        with QDRANT_SECONDS.labels(op="query_papers").time():
+            res = self.client.query_points(
+                collection_name=settings.PAPER_COLLECTION_NAME,
+                query=qv,
+                limit=top_k,
+                with_payload=["paper_id"],
+                search_params=search_params(),
+            ).points
+        return [p.payload["paper_id"] for p in res]
+
+    def search_two_stage(self, query: str, top_k: int, n_papers: int, query_vector: Optional[List[float]] = None):
+        """
+        Papers first, then chunks: the n_papers best paper summary vectors,
+        then the top_k chunks among those papers' chunks only. The query is
+        embedded once. Falls back to a flat search while the paper-level
+        collection is empty.
+        """
+        qv = query_vector if query_vector is not None else self.query_vector(query)
+        paper_ids = self.search_papers(qv, n_papers)
+        if not paper_ids:
+            return self._search_chunks(qv, top_k)
+        return self._search_chunks(qv, top_k, paper_ids)
+
+    def search_mmr(self, query: str, top_k: int, fetch_k: int, lambda_mult: float = None,
+                   max_per_paper: int = None, n_papers: int = 0, query_vector: Optional[List[float]] = None):
+        """
+        Diversified search: the fetch_k nearest chunks (from the n_papers
+        best papers when n_papers > 0) are fetched with their vectors and
+        top_k of them picked by maximal marginal relevance (src/utils/mmr.py),
+        at most max_per_paper per paper (0 = no cap).
+        """
+        lambda_mult = settings.MMR_LAMBDA if lambda_mult is None else lambda_mult
+        max_per_paper = settings.MMR_MAX_PER_PAPER if max_per_paper is None else max_per_paper
+        qv = query_vector if query_vector is not None else self.query_vector(query)
+        paper_ids = self.search_papers(qv, n_papers) if n_papers > 0 else None
+        hits = self._search_chunks(qv, max(fetch_k, top_k), paper_ids or None, with_vectors=True)
+        if not hits:
+            return hits
+        with MMR_SECONDS.time():
+            order = mmr(
+                qv, [h.vector for h in hits], top_k, lambda_mult,
+                groups=[(h.payload or {}).get("paper_id") for h in hits], max_per_group=max_per_paper,
+            )
+        return [hits[i] for i in order]
+
+    # -------------------------
+    # COUNTS
+    # -------------------------
+    def count_paper_vectors(self) -> int:
+        with QDRANT_SECONDS.labels(op="count").time():
+            return self.client.count(collection_name=settings.PAPER_COLLECTION_NAME, exact=True).count
+
+    def count(self, paper_level: bool = False) -> int:
+        """
+        Exact number of points (passages). With paper_level=True only the
+        first chunk of every paper is counted, i.e. the number of documents.
+        """
+        count_filter = None
+        if paper_level:
+            count_filter = models.Filter(
+                must=[models.FieldCondition(key="chunk_index", match=models.MatchValue(value=0))]
+            )
+        with QDRANT_SECONDS.labels(op="count").time():
+            return self.client.count(
+                collection_name=settings.COLLECTION_NAME,
+                count_filter=count_filter,
+                exact=True,
+            ).count
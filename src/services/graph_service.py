@@ -1,33 +1,51 @@
-import tempfile
-from pyvis.network import Network
+from typing import Any, Dict, List, Sequence
+
+from src.config import settings
 from src.db.graph_store import GraphStore
+from src.metrics import histogram
+from src.utils.cache import TTLCache
+
+RENDER_SECONDS = histogram("graph_render_seconds", "Subgraph extraction + HTML rendering time (cache misses)")
+
 
 class GraphService:
-    def __init__(self):
-        self.gs = GraphStore()
-
-    def visualize_subgraph(self, limit=80):
-        net = Network(
-            height="650px", width="100%",
-            bgcolor="#111a33", font_color="white"
-        )
-
-        with self.gs.driver.session() as s:
-            result = s.run("""
-                MATCH (p:Paper)-[:AUTHORED_BY]->(a:Author)
-                RETURN p.title as paper, a.name as author
-                LIMIT $limit
-            """, limit=limit)
-
-            for r in result:
-                p = r["paper"]
-                a = r["author"]
-                short = (p[:22] + "…") if len(p) > 22 else p
-
-                net.add_node(p, label=short, color="#818cf8", title=p)
-                net.add_node(a, label=a, color="#10b981")
-                net.add_edge(p, a, color="#94a3b8")
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".html", mode="w+") as tmp:
-            net.save_graph(tmp.name)
-            return open(tmp.name).read()
+    """Visualization of bounded subgraphs of the JSON GraphStore."""
+
+    def __init__(self, gs: GraphStore = None):
+        self.gs = gs or GraphStore()
+        # keyed by graph version, so any change to the graph invalidates
+        self._html = TTLCache("graph_html", settings.GRAPH_HTML_CACHE_SIZE, settings.GRAPH_HTML_CACHE_TTL_S)
+
+    def _params(self, paper_ids, authors, depth, max_nodes, max_edges) -> Dict[str, Any]:
+        return {
+            "paper_ids": tuple(sorted(set(paper_ids or ()))),
+            "authors": tuple(sorted(set(authors or ()))),
+            "depth": depth,
+            "max_nodes": min(max_nodes or settings.GRAPH_VIS_MAX_NODES, settings.GRAPH_VIS_MAX_NODES),
+            "max_edges": min(max_edges or settings.GRAPH_VIS_MAX_EDGES, settings.GRAPH_VIS_MAX_EDGES),
+            "max_fanout": settings.GRAPH_VIS_MAX_FANOUT,
+        }
+
+    def unknown_seeds(self, paper_ids: Sequence[str] = (), authors: Sequence[str] = ()) -> List[str]:
+        """Seeds that are not in the graph (authors prefixed with "author:")."""
+        return [p for p in paper_ids if not self.gs.has_paper(p)] + \
+            [f"author:{a}" for a in authors if not self.gs.has_author(a)]
+
+    def subgraph(self, paper_ids: Sequence[str] = (), authors: Sequence[str] = (), depth: int = 2,
+                 max_nodes: int = None, max_edges: int = None) -> Dict[str, Any]:
+        return self.gs.subgraph(**self._params(paper_ids, authors, depth, max_nodes, max_edges))
+
+    def visualize_subgraph(self, paper_ids: Sequence[str] = (), authors: Sequence[str] = (), depth: int = 2,
+                           max_nodes: int = None, max_edges: int = None) -> str:
+        """
+        HTML for the ego network around `paper_ids` / `authors`, or the
+        most prolific authors when no seeds are given.
+        """
+        params = self._params(paper_ids, authors, depth, max_nodes, max_edges)
+        key = (self.gs.version, *params.values())
+        html = self._html.get(key)
+        if html is None:
+            with RENDER_SECONDS.time():
+                html = self.gs.render_html(self.gs.subgraph(**params))
+            self._html.put(key, html)
+        return html
@@ -1,54 +1,174 @@
 # src/services/ingest_service.py
 
+import time
 import uuid
+from typing import Any, Dict, Iterable, List
 
-from src.utils.pdf import extract_pdf_text
-from src.utils.chunking import chunk_text
+import numpy as np
+
+from src.config import settings
+from src.utils.pdf import iter_pdf_pages
+from src.utils.chunking import chunk_text, iter_document_chunks
+from src.utils.references import ReferenceTracker
 from src.db.vector_store import VectorStore
+from src.db.graph_store import GraphStore
 from src.logger import get_logger
+from src.metrics import counter, histogram
 
 log = get_logger("IngestService")
 
+INGEST_DOCUMENTS = counter("ingest_documents_total", "Documents ingested", ["source"])
+INGEST_CHUNKS = counter("ingest_chunks_total", "Chunks embedded and upserted", ["source"])
+INGEST_CITATIONS = counter("ingest_citations_total", "References parsed from ingested documents", ["source"])
+INGEST_ERRORS = counter("ingest_chunk_errors_total", "Chunks that failed to upsert", ["source"])
+INGEST_SECONDS = histogram("ingest_document_seconds", "Chunk + embed + upsert time per document", ["source"])
+
 
 class IngestService:
-    def __init__(self):
-        self.vs = VectorStore()
+    def __init__(self, vs: VectorStore = None, gs: GraphStore = None):
+        self.vs = vs or VectorStore()
+        self.gs = gs
         if not self.vs.available:
             log.warning("IngestService initialized but VectorStore is unavailable")
 
     def ingest_pdf_bytes(self, pdf_bytes: bytes, filename: str):
-        text = extract_pdf_text(pdf_bytes)
         title = filename.replace(".pdf", "")
-        abstract = (text[:1200].strip() + "...") if text else "No text extracted."
-
         paper_id = str(uuid.uuid4())[:8]
-        authors = ["Uploaded User"]  # keep placeholder for future graph
+        # pages are chunked and embedded as they are extracted
+        return self.ingest_pages(paper_id=paper_id, title=title, pages=iter_pdf_pages(pdf_bytes), source="Upload")
 
-        log.info(
-            "Ingesting PDF: title=%s, paper_id=%s, text_len=%d",
-            title,
-            paper_id,
-            len(text or ""),
-        )
+    def ingest_text(self, paper_id: str, title: str, text: str, source: str = "Upload", authors: list = None):
+        return self.ingest_pages(paper_id, title, [text or ""], source=source, authors=authors)
 
-        chunks = chunk_text(text or "")
-        if not chunks:
-            log.warning("No chunks produced for %s (paper_id=%s)", title, paper_id)
+    def ingest_pages(self, paper_id: str, title: str, pages: Iterable[str], source: str = "Upload",
+                     authors: list = None):
+        """
+        Chunk, embed and upsert a document that arrives in pieces (e.g. PDF
+        pages). Chunks are upserted in batches of INGEST_UPSERT_BATCH as
+        they are produced, so only one batch is held at a time. Payloads
+        locate each chunk (char_start / char_end in the document text, page,
+        and section in CHUNK_MODE=tokens) so passages can be cited.
+        """
+        log.info("Ingesting document: title=%s, paper_id=%s", title, paper_id)
+        t0 = time.perf_counter()
 
-        for i, ch in enumerate(chunks):
-            chunk_id = str(uuid.uuid4())
+        tracker = ReferenceTracker()
+        chars = 0
+        n_chunks = 0
+        batch = []
+        vec_sum, n_vecs = None, 0  # running mean of chunk embeddings = paper summary vector
+
+        def flush():
+            nonlocal vec_sum, n_vecs
+            # one call per batch: the embedding service encodes these as bulk
+            # work, behind any interactive query embeddings
             try:
-                self.vs.upsert_chunk(
-                    chunk_id=chunk_id,
-                    text=ch,
-                    payload={
-                        "paper_id": paper_id,
-                        "title": title,
-                        "chunk_index": i,
-                        "source": "Upload",
-                    },
-                )
+                vecs = np.asarray(self.vs.upsert_chunks(batch), dtype=np.float32)
+                vec_sum = vecs.sum(axis=0) if vec_sum is None else vec_sum + vecs.sum(axis=0)
+                n_vecs += len(vecs)
+                INGEST_CHUNKS.labels(source=source).inc(len(batch))
             except Exception as e:
-                log.exception(f"Failed to upsert chunk {chunk_id} for paper {paper_id}: {e}")
+                INGEST_ERRORS.labels(source=source).inc(len(batch))
+                log.exception(f"Failed to upsert {len(batch)} chunks for paper {paper_id}: {e}")
+            batch.clear()
+
+        def tracked(pages):
+            nonlocal chars
+            for page in pages:
+                chars += len(page)
+                yield tracker.feed(page)
+
+        for i, ch in enumerate(iter_document_chunks(tracked(pages))):
+            batch.append({
+                "chunk_id": str(uuid.uuid4()),
+                "text": ch["text"],
+                "payload": {
+                    "paper_id": paper_id,
+                    "title": title,
+                    "chunk_index": i,
+                    "source": source,
+                    "char_start": ch["char_start"],
+                    "char_end": ch["char_end"],
+                    "page": ch["page"],
+                    "section": ch["section"],
+                },
+            })
+            n_chunks += 1
+            if len(batch) >= settings.INGEST_UPSERT_BATCH:
+                flush()
+        if batch:
+            flush()
+        if not n_chunks:
+            log.warning("No chunks produced for %s (paper_id=%s)", title, paper_id)
+        if n_vecs:
+            try:
+                self.vs.upsert_papers([{"paper_id": paper_id, "vector": vec_sum / n_vecs,
+                                        "payload": {"title": title, "source": source, "chunks": n_chunks}}])
+            except Exception as e:
+                log.exception(f"Failed to upsert the summary vector of paper {paper_id}: {e}")
+
+        # CITES edges from the reference section (the paper node is created
+        # here when it has references or authors to link)
+        references = tracker.references()
+        if self.gs is not None and (references or authors):
+            self.gs.add_paper(paper_id, title, authors or [], references=references)
+            INGEST_CITATIONS.labels(source=source).inc(len(references))
+
+        INGEST_DOCUMENTS.labels(source=source).inc()
+        INGEST_SECONDS.labels(source=source).observe(time.perf_counter() - t0)
+        log.info("Ingested %s: %d chars, %d chunks", paper_id, chars, n_chunks)
+        return {"paper_id": paper_id, "title": title, "chunks": n_chunks, "references": len(references)}
+
+    def ingest_records(self, records: List[Dict[str, Any]], source: str = "arXiv") -> Dict[str, int]:
+        """
+        Bulk ingest of short documents such as abstracts:
+        {"paper_id", "title", "text", "authors"[, "payload"]} dicts, chunked
+        with chunk_text(). All chunks of the batch are embedded and upserted
+        in one call, summary vectors in another, and the papers go into the
+        graph without writing it (call gs.flush() at a checkpoint).
+
+        Point ids derive from paper ids, so importing a record again
+        overwrites it instead of duplicating it (safe to resume).
+        """
+        chunks, owners = [], []
+        for r, rec in enumerate(records):
+            text = f"{rec['title']}\n{rec['text']}"
+            for i, ch in enumerate(chunk_text(text)):
+                chunks.append({
+                    "chunk_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk:{rec['paper_id']}:{i}")),
+                    "text": ch,
+                    "payload": {**rec.get("payload", {}), "paper_id": rec["paper_id"], "title": rec["title"],
+                                "chunk_index": i, "source": source},
+                })
+                owners.append(r)
+        if not chunks:
+            return {"papers": 0, "chunks": 0, "graph_added": 0}
+
+        try:
+            vecs = np.asarray(self.vs.upsert_chunks(chunks), dtype=np.float32)
+        except Exception:
+            INGEST_ERRORS.labels(source=source).inc(len(chunks))
+            raise
+        INGEST_CHUNKS.labels(source=source).inc(len(chunks))
+
+        # chunks come grouped by record: summary vector = mean of each run
+        owners = np.asarray(owners)
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        counts = np.diff(np.r_[starts, len(owners)])
+        means = np.add.reduceat(vecs, starts, axis=0) / counts[:, None]
+        self.vs.upsert_papers([
+            {"paper_id": records[owners[s]]["paper_id"], "vector": m,
+             "payload": {"title": records[owners[s]]["title"], "source": source, "chunks": int(n)}}
+            for s, m, n in zip(starts, means, counts)
+        ])
+
+        added = 0
+        if self.gs is not None:
+            added = self.gs.add_papers(
+                ({"paper_id": rec["paper_id"], "title": rec["title"], "authors": rec.get("authors") or []}
+                 for rec in records),
+                save=False,
+            )
 
-        return {"paper_id": paper_id, "title": title, "chunks": len(chunks)}
+        INGEST_DOCUMENTS.labels(source=source).inc(len(starts))
+        return {"papers": len(starts), "chunks": len(chunks), "graph_added": added}
@@ -5,17 +5,27 @@ import uuid
 from src.config import settings
 from src.db.vector_store import VectorStore
 from src.logger import get_logger
+from src.metrics import gauge
 
 log = get_logger("MigrationService")
 
+MIGRATION_RUNNING = gauge("migration_running", "1 while the payload migration worker runs")
+MIGRATION_SCANNED = gauge("migration_points_scanned", "Points scanned by the current migration run")
+MIGRATION_TOTAL = gauge("migration_points_total", "Points in the collection when the run started")
+MIGRATION_MIGRATED = gauge("migration_points_migrated", "Points rewritten to the current schema")
+MIGRATION_ERRORS = gauge("migration_errors", "Points that failed to migrate")
+
 
 class MigrationService:
-    def __init__(self):
-        self.vs = VectorStore()
+    def __init__(self, vs: VectorStore = None):
+        self.vs = vs or VectorStore()
         self.running = False
         self.finished = False
         self.migrated = 0
         self.errors = 0
+        self.scanned = 0
+        self.total = 0
+        self.papers_indexed = 0
 
     def start_background_migration(self):
         if self.running:
@@ -26,10 +36,17 @@ class MigrationService:
 
     def _run(self):
         self.running = True
+        MIGRATION_RUNNING.set(1)
         log.info("🚀 Starting background Qdrant migration service...")
 
         offset = None
         loops = 0
+        self.scanned = 0
+        try:
+            self.total = self.vs.count()
+        except Exception as e:
+            log.warning(f"Could not count points before migration: {e}")
+        MIGRATION_TOTAL.set(self.total)
 
         try:
             while True:
@@ -51,12 +68,12 @@ class MigrationService:
                     break
 
                 # If offset does not change → bad scroll → break loop safely
-                if offset_new == offset:
+                # (None marks the last page, which is handled after processing it)
+                if offset_new is not None and offset_new == offset:
                     log.error("❌ Offset did not advance — stopping migration.")
                     break
 
-                offset = offset_new
-
+                migrated_before = self.migrated
                 for p in points:
                     try:
                         payload = p.payload or {}
@@ -93,11 +110,32 @@ class MigrationService:
                         log.error(f"Migration error on point {p.id}: {e}")
                         self.errors += 1
 
+                    self.scanned += 1
                     time.sleep(0.001)
+
+                if self.migrated > migrated_before:
+                    self.vs.bump_version()  # payloads changed under cached retrieval results
+                MIGRATION_SCANNED.set(self.scanned)
+                MIGRATION_MIGRATED.set(self.migrated)
+                MIGRATION_ERRORS.set(self.errors)
+
+                if offset_new is None:
+                    break
+                offset = offset_new
         except Exception as e:
             log.error(f"Migration fatal error: {e}")
 
+        # summary vectors for papers ingested before the paper-level collection existed
+        try:
+            if self.vs.count_paper_vectors() < self.vs.count(paper_level=True):
+                self.papers_indexed = self.vs.build_paper_index()
+        except Exception as e:
+            log.error(f"Paper-level index backfill failed: {e}")
+
         self.running = False
         self.finished = True
+        MIGRATION_RUNNING.set(0)
+        MIGRATION_MIGRATED.set(self.migrated)
+        MIGRATION_ERRORS.set(self.errors)
 
         log.info(f"✅ Migration completed: migrated={self.migrated}, errors={self.errors}")
@@ -1,14 +1,102 @@
 from src.config import settings
 from src.db.vector_store import VectorStore
 from src.db.graph_store import GraphStore
+from src.metrics import histogram, record_cache
+from src.utils.cache import NearestKeyIndex, TTLCache
+from src.utils.text import normalize_topic
+
+GRAPH_LOOKUP_SECONDS = histogram("graph_lookup_seconds", "Time per GraphStore.related_by_authors call")
+GRAPH_EXPAND_SECONDS = histogram("graph_expand_seconds", "Time per GraphStore.expand (citation hops) call")
+
+# settings read during retrieval (not passed as arguments) that change its
+# results; part of the cache key, so e.g. /admin/vector_config takes effect
+_RESULT_SETTINGS = (
+    "MMR_LAMBDA", "MMR_MAX_PER_PAPER",
+    "HNSW_EF", "QDRANT_QUANTIZATION", "QDRANT_QUANTIZATION_RESCORE", "QDRANT_QUANTIZATION_OVERSAMPLING",
+    "GRAPH_CENTRALITY", "GRAPH_RELATED_PER_AUTHOR",
+    "GRAPH_CITATION_HOPS", "GRAPH_CITATION_FANOUT", "GRAPH_EXPAND_BUDGET_MS",
+)
+
+
+def _location(doc) -> str:
+    parts = [f"p. {doc['page']}"] if doc.get("page") else []
+    if doc.get("section"):
+        parts.append(doc["section"])
+    return f" ({', '.join(parts)})" if parts else ""
+
 
 class RAGService:
-    def __init__(self):
-        self.vs = VectorStore()
-        self.gs = GraphStore()
+    def __init__(self, vs: VectorStore = None, gs: GraphStore = None):
+        self.vs = vs or VectorStore()
+        self.gs = gs or GraphStore()
+        # keyed by corpus versions, so ingest / migration / clear_collection invalidate
+        self.cache = TTLCache("retrieval", settings.RETRIEVAL_CACHE_SIZE, settings.RETRIEVAL_CACHE_TTL_S)
+        # normalized query text by query embedding, for RETRIEVAL_CACHE_SIMILARITY
+        self._similar = NearestKeyIndex(settings.RETRIEVAL_CACHE_SIZE)
+        self._similar_versions = None
+
+    def hybrid_retrieve(self, query: str, top_k_vector: int = None, top_k_graph: int = None,
+                        top_k_final: int = None, top_k_citations: int = None, top_k_papers: int = None,
+                        mmr_fetch_k: int = None):
+        """
+        (docs, context) for the query. Results are cached per normalized
+        query text, parameters and result-relevant settings until the corpus
+        changes (see RETRIEVAL_CACHE_*); cached docs are shared, so don't
+        modify them.
 
-    def hybrid_retrieve(self, query: str):
-        vec_hits = self.vs.search(query, settings.TOP_K_VECTOR)
+        The corpus versions are counters of this process: an ingest served
+        by another gunicorn worker does not invalidate this worker's cache,
+        whose entries then live at most RETRIEVAL_CACHE_TTL_S longer.
+        """
+        params = (
+            top_k_vector or settings.TOP_K_VECTOR,
+            settings.TOP_K_GRAPH if top_k_graph is None else top_k_graph,
+            top_k_final or settings.TOP_K_FINAL,
+            settings.TOP_K_CITATIONS if top_k_citations is None else top_k_citations,
+            settings.TWO_STAGE_PAPERS if top_k_papers is None else top_k_papers,
+            settings.MMR_FETCH_K if mmr_fetch_k is None else mmr_fetch_k,
+        )
+        if self.cache.maxsize <= 0:
+            return self._retrieve(query, *params)
+
+        self.vs.sync_config()  # the key includes the vector config
+        key_params = (params, tuple(getattr(settings, name) for name in _RESULT_SETTINGS))
+        versions = (self.vs.version, self.gs.version)
+        text = normalize_topic(query)
+        result = self.cache.get((text, key_params, versions))
+        if result is not None:
+            return result
+
+        qv = None
+        if settings.RETRIEVAL_CACHE_SIMILARITY > 0:
+            if self._similar_versions != versions:
+                # every key in the index was cached for an older corpus
+                self._similar.clear()
+                self._similar_versions = versions
+            qv = self.vs.query_vector(query)
+            near = self._similar.nearest(qv, settings.RETRIEVAL_CACHE_SIMILARITY)
+            if near is not None:
+                result = self.cache.get((near, key_params, versions), record=False)
+            record_cache("retrieval_similar", result is not None)
+            if result is not None:
+                return result
+
+        result = self._retrieve(query, *params, query_vector=qv)
+        self.cache.put((text, key_params, versions), result)
+        if qv is not None:
+            self._similar.add(text, qv)
+        return result
+
+    def _retrieve(self, query: str, top_k_vector: int, top_k_graph: int, top_k_final: int,
+                  top_k_citations: int, top_k_papers: int, mmr_fetch_k: int, query_vector=None):
+        if mmr_fetch_k > 0:
+            # more candidates than needed, then the most relevant yet mutually different ones
+            vec_hits = self.vs.search_mmr(query, top_k_vector, mmr_fetch_k, n_papers=top_k_papers,
+                                          query_vector=query_vector)
+        elif top_k_papers > 0:
+            vec_hits = self.vs.search_two_stage(query, top_k_vector, top_k_papers, query_vector=query_vector)
+        else:
+            vec_hits = self.vs.search(query, top_k_vector, query_vector=query_vector)
 
         # filter out broken payloads (just in case)
         vec_hits = [
@@ -20,35 +108,57 @@ class RAGService:
             return [], ""
 
         paper_ids = list({h.payload["paper_id"] for h in vec_hits})
-        graph_related_ids = self.gs.related_by_authors(paper_ids, limit=settings.TOP_K_GRAPH)
+        graph_related = []
+        if top_k_graph > 0:
+            with GRAPH_LOOKUP_SECONDS.time():
+                # best first: shared authors, then co-authorship centrality
+                graph_related = self.gs.related_by_authors(paper_ids, limit=top_k_graph, with_scores=True)
+        relations = {pid: {"graph_score": score, "relation": "coauthor"} for pid, score in graph_related}
+
+        if top_k_citations > 0:
+            with GRAPH_EXPAND_SECONDS.time():
+                cited = self.gs.expand(
+                    paper_ids, hops=settings.GRAPH_CITATION_HOPS, max_fanout=settings.GRAPH_CITATION_FANOUT,
+                    max_nodes=top_k_citations + len(relations), budget_ms=settings.GRAPH_EXPAND_BUDGET_MS,
+                )
+            seen = set(paper_ids)
+            for c in cited:
+                if len(relations) >= len(graph_related) + top_k_citations:
+                    break
+                if c["paper_id"] not in relations and c["paper_id"] not in seen:
+                    relations[c["paper_id"]] = {"graph_score": round(1.0 / c["hop"], 4), "relation": c["relation"]}
 
         graph_hits = []
-        for pid in graph_related_ids:
+        for pid, rel in relations.items():
             # get metadata from Qdrant
             result = self.vs.get_by_id(pid)
             if result:
-                graph_hits.append(result)
+                graph_hits.append((result, rel))
 
 
         vector_docs = [{
             "title": h.payload["title"],
             "text": h.payload["text"],
             "paper_id": h.payload["paper_id"],
-            "source": "Vector"
+            "source": "Vector",
+            # where the passage is in the paper (chunks ingested with offsets)
+            **{k: h.payload[k] for k in ("page", "section", "char_start", "char_end")
+               if h.payload.get(k) not in (None, "")}
         } for h in vec_hits]
 
         graph_docs = [{
             "title": g["title"],
             "text": g["abstract"],
             "paper_id": g["id"],
-            "source": "Graph"
-        } for g in graph_hits]
+            "source": "Graph",
+            **rel
+        } for g, rel in graph_hits]
 
         docs = vector_docs + graph_docs
 
         context = "\n\n".join(
-            f"[{d['source']}] {d['title']}\n{d['text']}"
+            f"[{d['source']}] {d['title']}{_location(d)}\n{d['text']}"
             for d in docs
         )
 
-        return docs[:settings.TOP_K_FINAL], context[:9000]
+        return docs[:top_k_final], context[:9000]
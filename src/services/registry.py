@@ -0,0 +1,176 @@
+# src/services/registry.py
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.config import settings
+from src.logger import get_logger
+
+log = get_logger("Registry")
+
+# Shared, lazily built service instances. Nothing heavy (Qdrant connection,
+# graph JSON parse, SentenceTransformer load, LLM clients) happens at import
+# time; each service is built on first use, or ahead of time by warm_up().
+_instances: Dict[str, Any] = {}
+_init_seconds: Dict[str, float] = {}
+_lock = threading.RLock()  # re-entrant: factories call other getters
+
+_process_started = time.time()
+_warmup: Dict[str, Any] = {"state": "pending", "error": None, "seconds": None, "ready_at": None}
+
+
+def _get(name: str, factory: Callable[[], Any]) -> Any:
+    inst = _instances.get(name)
+    if inst is not None:
+        return inst
+    with _lock:
+        inst = _instances.get(name)
+        if inst is None:
+            t0 = time.perf_counter()
+            inst = factory()
+            _init_seconds[name] = round(time.perf_counter() - t0, 3)
+            log.info(f"Initialized {name} in {_init_seconds[name]}s")
+            _instances[name] = inst
+    return inst
+
+
+def peek(name: str) -> Optional[Any]:
+    """The instance if it was already built, without triggering initialization."""
+    return _instances.get(name)
+
+
+# ------------------------------------------------------------
+# Getters
+# ------------------------------------------------------------
+def get_vector_store():
+    from src.db.vector_store import VectorStore
+    return _get("vector_store", VectorStore)
+
+
+def get_graph_store():
+    from src.db.graph_store import GraphStore
+    return _get("graph_store", GraphStore)
+
+
+def get_graph_service():
+    from src.services.graph_service import GraphService
+    return _get("graph_service", lambda: GraphService(gs=get_graph_store()))
+
+
+def get_rag_service():
+    from src.services.rag_service import RAGService
+    return _get("rag_service", lambda: RAGService(vs=get_vector_store(), gs=get_graph_store()))
+
+
+def get_agents():
+    from src.agents.research_agents import ResearchAgents
+    return _get("agents", lambda: ResearchAgents(rag=get_rag_service()))
+
+
+def get_ingest_service():
+    from src.services.ingest_service import IngestService
+    return _get("ingest_service", lambda: IngestService(vs=get_vector_store(), gs=get_graph_store()))
+
+
+def get_migration_service():
+    from src.services.migration_service import MigrationService
+    return _get("migration_service", lambda: MigrationService(vs=get_vector_store()))
+
+
+# ------------------------------------------------------------
+# Pre-fork sharing
+# ------------------------------------------------------------
+def preload_shared():
+    """
+    Load the read-mostly, fork-safe parts (encoder weights, graph indexes)
+    in the gunicorn master so forked workers share them copy-on-write.
+
+    Runs no inference: torch/OpenMP thread pools started before fork can
+    deadlock in the children, so the dummy encode stays in each worker's
+    warm_up(). Qdrant clients and LLM clients hold sockets and are built
+    per worker as usual.
+    """
+    import gc
+    from src.db.embeddings import get_encoder
+
+    if settings.EMBEDDING_SERVICE_MODE != "process":
+        t0 = time.perf_counter()
+        get_encoder()
+        _init_seconds["encoder_preload"] = round(time.perf_counter() - t0, 3)
+    # derived indexes too, or every worker would build its own copy on first use
+    t0 = time.perf_counter()
+    get_graph_store().build_indexes()
+    _init_seconds["graph_indexes"] = round(time.perf_counter() - t0, 3)
+
+    # Move everything allocated so far into the permanent generation: the
+    # cyclic GC in the workers then never writes to these objects' headers,
+    # which would otherwise un-share their pages.
+    gc.collect()
+    gc.freeze()
+    log.info(f"Preloaded shared models for workers: {startup_report()['init_seconds']}")
+
+
+def configure_worker():
+    """Per-worker setup after fork."""
+    if settings.TORCH_THREADS_PER_WORKER > 0:
+        try:
+            import torch
+            torch.set_num_threads(settings.TORCH_THREADS_PER_WORKER)
+        except ImportError:
+            pass
+
+
+# ------------------------------------------------------------
+# Warm-up & readiness
+# ------------------------------------------------------------
+def warm_up():
+    """Build every service and run one dummy encode so the first request is fast."""
+    _warmup["state"] = "running"
+    t0 = time.perf_counter()
+    try:
+        agents = get_agents()
+        get_ingest_service()
+        migration = get_migration_service()
+
+        t_enc = time.perf_counter()
+        agents.rag.vs.encode(["warm up"])
+        _init_seconds["encoder_first_encode"] = round(time.perf_counter() - t_enc, 3)
+
+        if settings.RUN_MIGRATION_ON_STARTUP:
+            migration.start_background_migration()
+
+        _warmup["state"] = "done"
+    except Exception as e:
+        log.exception(f"Warm-up failed: {e}")
+        _warmup.update(state="failed", error=str(e))
+    finally:
+        _warmup["seconds"] = round(time.perf_counter() - t0, 3)
+        _warmup["ready_at"] = time.time()
+        log.info(f"Startup report: {startup_report()}")
+
+
+def start_background_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    # Without warm-up every service initializes lazily on first use,
+    # so the instance can take traffic right away.
+    if not settings.WARMUP_ON_STARTUP:
+        return True
+    return _warmup["state"] == "done"
+
+
+def startup_report() -> Dict[str, Any]:
+    ready_at = _warmup["ready_at"]
+    return {
+        "warmup_state": _warmup["state"],
+        "warmup_error": _warmup["error"],
+        "warmup_seconds": _warmup["seconds"],
+        "seconds_to_ready": round(ready_at - _process_started, 3) if ready_at else None,
+        "init_seconds": dict(_init_seconds),
+        "initialized": sorted(_instances),
+    }
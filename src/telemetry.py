@@ -0,0 +1,128 @@
+# src/telemetry.py
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from src.metrics import COUNT_BUCKETS, TOKEN_BUCKETS, histogram
+
+NODE_SECONDS = histogram(
+    "workflow_node_seconds", "Wall time per workflow node execution", ["node"]
+)
+NODE_PROMPT_TOKENS = histogram(
+    "workflow_node_prompt_tokens", "LLM prompt tokens per node execution", ["node"], TOKEN_BUCKETS
+)
+NODE_COMPLETION_TOKENS = histogram(
+    "workflow_node_completion_tokens", "LLM completion tokens per node execution", ["node"], TOKEN_BUCKETS
+)
+RETRIEVAL_HITS = histogram(
+    "workflow_retrieval_hits", "Retrieved documents per Researcher execution", buckets=COUNT_BUCKETS
+)
+REVISIONS = histogram(
+    "workflow_revisions", "Writer revisions (runs after the first draft) per /generate run",
+    buckets=COUNT_BUCKETS,
+)
+
+# Stats of the node currently executing in this context. Agents report into
+# it without knowing which node (or request) they are running for.
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_node_stats", default=None)
+# nodes may fan LLM calls out to worker threads that share the same stats
+_stats_lock = threading.Lock()
+
+
+def token_usage(message: Any) -> Dict[str, int]:
+    """Prompt / completion tokens from a LangChain AIMessage (Groq or mock)."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        return {
+            "prompt_tokens": int(usage.get("input_tokens", 0)),
+            "completion_tokens": int(usage.get("output_tokens", 0)),
+        }
+    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens", 0)),
+        "completion_tokens": int(usage.get("completion_tokens", 0)),
+    }
+
+
+def record_llm_usage(message: Any):
+    stats = _current.get()
+    if stats is None:
+        return
+    usage = token_usage(message)
+    with _stats_lock:
+        stats["llm_calls"] += 1
+        stats["prompt_tokens"] += usage["prompt_tokens"]
+        stats["completion_tokens"] += usage["completion_tokens"]
+
+
+def record_llm_wait(seconds: float):
+    """Time an LLM call spent queued in the rate limiter or backing off."""
+    stats = _current.get()
+    if stats is not None:
+        with _stats_lock:
+            stats["llm_wait_ms"] = round(stats["llm_wait_ms"] + seconds * 1000, 2)
+
+
+def record_retrieval(hits: int):
+    stats = _current.get()
+    if stats is not None:
+        with _stats_lock:
+            stats["retrieval_hits"] += hits
+
+
+def instrument(name: str, fn: Callable[[Dict], Dict]) -> Callable[[Dict], Dict]:
+    """
+    Wrap a LangGraph node: time it, collect the LLM usage and retrieval
+    hits reported while it runs, append one entry to state["node_stats"]
+    and feed the process-wide histograms.
+    """
+    def node(state: Dict) -> Dict:
+        stats = {
+            "node": name,
+            "ms": 0.0,
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "llm_wait_ms": 0.0,
+            "retrieval_hits": 0,
+        }
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            update = fn(state)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+
+        stats["ms"] = round(elapsed * 1000, 2)
+        NODE_SECONDS.labels(node=name).observe(elapsed)
+        if stats["llm_calls"]:
+            NODE_PROMPT_TOKENS.labels(node=name).observe(stats["prompt_tokens"])
+            NODE_COMPLETION_TOKENS.labels(node=name).observe(stats["completion_tokens"])
+        if name == "Researcher":
+            RETRIEVAL_HITS.observe(stats["retrieval_hits"])
+
+        update["node_stats"] = [stats]
+        return update
+    return node
+
+
+def summarize(node_stats: list, revision_count: int, record: bool = True) -> Dict[str, Any]:
+    """
+    Per-run totals for the /generate response; also records the revision
+    histogram unless record=False (callers sharing another request's run).
+    """
+    revisions = max(revision_count - 1, 0)
+    if record:
+        REVISIONS.observe(revisions)
+    return {
+        "prompt_tokens": sum(s["prompt_tokens"] for s in node_stats),
+        "completion_tokens": sum(s["completion_tokens"] for s in node_stats),
+        "llm_calls": sum(s["llm_calls"] for s in node_stats),
+        "llm_wait_ms": round(sum(s.get("llm_wait_ms", 0.0) for s in node_stats), 2),
+        "retrieval_hits": sum(s["retrieval_hits"] for s in node_stats),
+        "revisions": revisions,
+        "nodes": node_stats,
+    }
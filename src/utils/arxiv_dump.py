@@ -0,0 +1,72 @@
+import gzip
+import json
+import re
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from src.utils.references import canonical_id
+
+_SPACE = re.compile(r"\s+")
+
+
+def _clean(text: str) -> str:
+    # titles / abstracts in the dump are hard-wrapped at ~80 columns
+    return _SPACE.sub(" ", text or "").strip()
+
+
+def _authors(record: Dict[str, Any]) -> list:
+    parsed = record.get("authors_parsed")
+    if parsed:
+        # [last, first, suffix] -> "First Last Suffix"
+        return [" ".join(p for p in (a[1:2] + a[:1] + a[2:3]) if p).strip() for a in parsed if a]
+    return [a.strip() for a in re.split(r",| and ", record.get("authors") or "") if a.strip()]
+
+
+def parse_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    One line of the arXiv metadata snapshot (Kaggle / OAI export) as
+    {"paper_id", "title", "text", "authors", "categories", "doi"}, or None
+    when it has no id or abstract. Paper ids are canonical arXiv ids, so
+    references parsed from uploaded PDFs resolve to imported papers.
+    """
+    paper_id = canonical_id(str(record.get("id") or "").strip())
+    abstract = _clean(record.get("abstract"))
+    if not paper_id or not abstract:
+        return None
+    return {
+        "paper_id": paper_id,
+        "title": _clean(record.get("title")) or "Untitled",
+        "text": abstract,
+        "authors": _authors(record),
+        "categories": (record.get("categories") or "").split(),
+        "doi": (record.get("doi") or "").lower() or None,
+    }
+
+
+def iter_metadata(path: str, offset: int = 0,
+                  categories: Sequence[str] = ()) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    (offset after the line, parsed record) for every line of a metadata
+    JSONL file (plain or .gz) from byte `offset` on, so a caller can
+    checkpoint the offset and resume there. The record is None for lines
+    that are skipped: unparsable, without abstract, or outside
+    `categories` (prefixes such as "cs." or exact ones such as "cs.IR").
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        if offset:
+            f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            record = None
+            if line.strip():
+                try:
+                    record = parse_record(json.loads(line))
+                except (ValueError, TypeError, AttributeError):
+                    record = None
+            if record is not None and categories and not any(
+                c.startswith(prefix) for c in record["categories"] for prefix in categories
+            ):
+                record = None
+            yield f.tell(), record
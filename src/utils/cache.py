@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Sequence
+
+import numpy as np
+
+from src.metrics import record_cache
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl_s` seconds after
+    they were stored. Lookups are counted in cache_requests_total{cache=name}.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl_s: float = 3600.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, record: bool = True) -> Optional[Any]:
+        """The cached value, or None on a miss or expired entry (counted unless record=False)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        if record:
+            record_cache(self.name, entry is not None)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class NearestKeyIndex:
+    """
+    The last `size` (key, vector) pairs, for near-duplicate lookups:
+    nearest() returns the key whose vector is most cosine-similar to a
+    query vector, if at least min_sim. Older pairs are overwritten.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._vecs: Optional[np.ndarray] = None  # (size, dim) unit vectors, allocated on first add
+        self._keys: list = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def add(self, key: Hashable, vector: Sequence[float]):
+        if self.size <= 0:
+            return
+        v = self._unit(vector)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != len(v):
+                self._vecs, self._keys, self._next = np.zeros((self.size, len(v)), dtype=np.float32), [], 0
+            self._vecs[self._next] = v
+            if self._next < len(self._keys):
+                self._keys[self._next] = key
+            else:
+                self._keys.append(key)
+            self._next = (self._next + 1) % self.size
+
+    def nearest(self, vector: Sequence[float], min_sim: float) -> Optional[Hashable]:
+        v = self._unit(vector)
+        with self._lock:
+            if not self._keys or self._vecs.shape[1] != len(v):
+                return None
+            sims = self._vecs[:len(self._keys)] @ v
+            i = int(np.argmax(sims))
+            return self._keys[i] if sims[i] >= min_sim else None
+
+    def clear(self):
+        with self._lock:
+            self._keys, self._next = [], 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
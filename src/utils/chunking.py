@@ -1,9 +1,242 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from src.config import settings
 
-def chunk_text(text: str):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP
+# Section headings as pypdf extracts them: a short line of its own, either
+# numbered ("3 Results", "2.1 Setup", "IV. EXPERIMENTS") or a standard name
+_SECTION = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:\d{1,2}(?:\.\d{1,2}){0,2}\.?|[IVX]{1,5}\.)[ \t]+[A-Z][^\n]{0,60}(?<![.,;:])"
+    r"|(?i:abstract|introduction|related work|background|methods?|methodology|experiments?|evaluation"
+    r"|results|discussion|conclusions?|references|bibliography|acknowledge?ments?|appendix)"
+    r")[ \t]*$",
+    re.MULTILINE,
+)
+
+
+@lru_cache(maxsize=16)
+def get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    # splitters are stateless after construction, so one per configuration is shared
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _splitter(chunk_size: int = None, chunk_overlap: int = None) -> RecursiveCharacterTextSplitter:
+    return get_splitter(
+        chunk_size or settings.CHUNK_SIZE,
+        settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
     )
-    return splitter.split_text(text)
+
+
+def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None):
+    return _splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def _spans(text: str, chunks: List[str], overlap: int) -> Iterator[Tuple[int, str]]:
+    """(start, chunk) pairs: where each split chunk sits in `text` (as in the splitter's add_start_index)."""
+    index, prev_len = 0, 0
+    for chunk in chunks:
+        # the chunk starts at most `overlap` characters before the previous one
+        # ended; find a short prefix there (cheap) and confirm the whole chunk
+        lo, head = max(0, index + prev_len - overlap), chunk[:64]
+        index = text.find(head, lo)
+        while index >= 0 and not text.startswith(chunk, index):
+            index = text.find(head, index + 1)
+        prev_len = len(chunk)
+        yield index, chunk
+
+
+def _iter_char_spans(pieces: Iterable[str], splitter: RecursiveCharacterTextSplitter,
+                     window: int, offsets: bool = True) -> Iterator[Tuple[int, str]]:
+    """
+    (start, chunk) pairs of streamed text, see iter_chunks(); start is -1
+    for every chunk with offsets=False, which skips locating the chunks.
+    """
+    base, parts, size = 0, [], 0  # parts start at document offset base
+    overlap = splitter._chunk_overlap
+    for piece in pieces:
+        parts.append(piece)
+        size += len(piece)
+        if size < window:
+            continue
+        buf = "".join(parts)
+        chunks = splitter.split_text(buf)
+        # the last chunk may grow with the next piece: split again from its start
+        cut = buf.rfind(chunks[-1]) if len(chunks) > 1 else -1
+        if cut <= 0:
+            parts = [buf]
+            continue
+        if offsets:
+            for start, chunk in _spans(buf, chunks[:-1], overlap):
+                yield base + start, chunk
+        else:
+            for chunk in chunks[:-1]:
+                yield -1, chunk
+        base, parts, size = base + cut, [buf[cut:]], len(buf) - cut
+    buf = "".join(parts)
+    if buf:
+        chunks = splitter.split_text(buf)
+        if offsets:
+            for start, chunk in _spans(buf, chunks, overlap):
+                yield base + max(start, 0), chunk
+        else:
+            for chunk in chunks:
+                yield -1, chunk
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = None, chunk_overlap: int = None,
+                window: int = None) -> Iterator[str]:
+    """
+    Chunk text that arrives in pieces (e.g. one string per PDF page),
+    yielding chunks as soon as they are final.
+
+    Pieces are collected until they reach `window` characters (default
+    CHUNK_STREAM_WINDOW_CHUNKS chunk sizes) and split; every chunk but the
+    last is yielded, and splitting restarts where the last one started,
+    since more text may extend it. Memory stays bounded by the window plus
+    one piece, whatever the document length.
+
+    Chunks match chunk_text() on the whole text except around those
+    restart points: the splitter only sees the text from the restart on,
+    so the chunks there can be cut and merged differently (a few per
+    hundred on typical documents; see benchmarks/bench_chunking).
+    """
+    splitter = _splitter(chunk_size, chunk_overlap)
+    window = window or settings.CHUNK_STREAM_WINDOW_CHUNKS * splitter._chunk_size
+    for _, chunk in _iter_char_spans(pieces, splitter, window, offsets=False):
+        yield chunk
+
+
+# ------------------------------------------------------------
+# Token-based, section-aware chunking
+# ------------------------------------------------------------
+def _token_windows(text: str, spans: List[Tuple[int, int]], max_tokens: int,
+                   overlap: int) -> List[Tuple[int, int]]:
+    """
+    (char_start, char_end) of windows of at most max_tokens tokens, each
+    starting about `overlap` tokens before the previous one ended. A window
+    that doesn't reach the end of the text is cut after the last sentence
+    end in its final quarter, if there is one, and never inside a word.
+    """
+    def mid_word(i: int) -> bool:
+        # token i continues the word of token i - 1 (a WordPiece "##" piece)
+        pos = spans[i][0]
+        return pos > 0 and spans[i - 1][1] == pos and text[pos - 1].isalnum() and text[pos].isalnum()
+
+    windows = []
+    n, start = len(spans), 0
+    while start < n:
+        end = min(start + max_tokens, n)
+        if end < n:
+            for j in range(end - 1, start + (3 * max_tokens) // 4 - 1, -1):
+                stop = spans[j][1]
+                if text[stop - 1] in ".!?" and (stop == len(text) or text[stop].isspace()):
+                    end = j + 1
+                    break
+            while end - 1 > start and mid_word(end):
+                end -= 1
+        windows.append((spans[start][0], spans[end - 1][1]))
+        if end == n:
+            break
+        nxt = max(end - overlap, start + 1)
+        while nxt > start + 1 and mid_word(nxt):
+            nxt -= 1
+        start = nxt
+    return windows
+
+
+def iter_token_chunks(pieces: Iterable[str], max_tokens: int = None, overlap: int = None,
+                      window: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Chunk a document that arrives in pieces (e.g. PDF pages) into windows
+    of at most `max_tokens` tokens of the embedding model, so nothing is
+    cut off by the encoder's sequence limit. Chunks never span a section
+    heading (see _SECTION); each chunk is a
+    {"text", "char_start", "char_end", "page", "section"} dict with
+    character offsets into the concatenated pieces.
+
+    Like iter_chunks(), text is held only until its section ends or the
+    buffer reaches `window` characters (default 32 characters per token
+    of max_tokens).
+    """
+    from src.db.embeddings import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    max_tokens = max_tokens or settings.CHUNK_TOKENS
+    overlap = min(settings.CHUNK_TOKEN_OVERLAP if overlap is None else overlap, max_tokens // 2)
+    window = window or 32 * max_tokens
+    page_starts: List[int] = []
+
+    def emit(text: str, base: int, section: str, windows: List[Tuple[int, int]]):
+        for cs, ce in windows:
+            yield {"text": text[cs:ce], "char_start": base + cs, "char_end": base + ce,
+                   "page": bisect_right(page_starts, base + cs), "section": section}
+
+    def next_heading(buf: str, pos: int):
+        # complete lines only: the rest of a line may still be on its way
+        for m in _SECTION.finditer(buf, pos):
+            if 0 < m.start() and m.end() < len(buf):
+                return m
+        return None
+
+    base, buf, section = 0, "", ""  # buf starts at document offset base
+    for piece in pieces:
+        page_starts.append(base + len(buf))
+        scan = max(len(buf) - 200, 1)  # the previous piece may have ended mid-line
+        buf += piece
+        if base == 0 and not section and scan == 1:
+            # a document that opens with a heading ("Abstract")
+            m = _SECTION.match(buf)
+            if m and m.end() < len(buf):
+                section = m.group().strip()
+
+        # every heading after the start of buf closes the section before it
+        m = next_heading(buf, scan)
+        while m is not None:
+            text = buf[:m.start()]
+            if section and text.strip() == section:
+                # a heading directly followed by a sub-heading: keep both in one section
+                section, m = m.group().strip(), next_heading(buf, m.end())
+                continue
+            yield from emit(text, base, section, _token_windows(text, tokenizer.spans(text), max_tokens, overlap))
+            base, buf, section = base + m.start(), buf[m.start():], m.group().strip()
+            m = next_heading(buf, 1)
+
+        if len(buf) >= window:
+            # long section: emit all windows but the last, which more text may extend
+            windows = _token_windows(buf, tokenizer.spans(buf), max_tokens, overlap)
+            if len(windows) > 1:
+                yield from emit(buf, base, section, windows[:-1])
+                cut = windows[-1][0]
+                base, buf = base + cut, buf[cut:]
+    if buf.strip():
+        yield from emit(buf, base, section, _token_windows(buf, tokenizer.spans(buf), max_tokens, overlap))
+
+
+def iter_document_chunks(pieces: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Chunks of a streamed document as {"text", "char_start", "char_end",
+    "page", "section"} dicts, by CHUNK_MODE: "chars" (CHUNK_SIZE
+    characters, no sections) or "tokens" (see iter_token_chunks).
+    """
+    if settings.CHUNK_MODE == "tokens":
+        yield from iter_token_chunks(pieces)
+        return
+
+    page_starts: List[int] = []
+
+    def tracked():
+        offset = 0
+        for piece in pieces:
+            page_starts.append(offset)
+            offset += len(piece)
+            yield piece
+
+    splitter = _splitter()
+    window = settings.CHUNK_STREAM_WINDOW_CHUNKS * splitter._chunk_size
+    for start, chunk in _iter_char_spans(tracked(), splitter, window):
+        yield {"text": chunk, "char_start": start, "char_end": start + len(chunk),
+               "page": bisect_right(page_starts, start), "section": ""}
@@ -0,0 +1,48 @@
+from typing import Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def mmr(query: Sequence[float], candidates: Sequence[Sequence[float]], k: int, lambda_mult: float = 0.7,
+        groups: Optional[Sequence[Hashable]] = None, max_per_group: int = 0) -> List[int]:
+    """
+    Maximal marginal relevance: indices of up to k candidates, picked one
+    at a time by lambda_mult * sim(query, c) - (1 - lambda_mult) * max
+    sim(c, already picked), cosine similarities throughout. lambda_mult=1
+    is plain relevance order; lower values favour candidates unlike the
+    ones already picked.
+
+    With groups (e.g. the paper id of every chunk) and max_per_group > 0,
+    at most max_per_group candidates of one group are picked, so fewer
+    than k may come back.
+    """
+    docs = np.asarray(candidates, dtype=np.float32)
+    if k <= 0 or docs.ndim != 2 or not len(docs):
+        return []
+    q = np.asarray(query, dtype=np.float32).ravel()
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+    relevance = docs @ q
+    pairwise = docs @ docs.T  # candidate lists are small (tens), so the full matrix is cheap
+    max_sim = np.full(len(docs), -np.inf, dtype=np.float32)  # to the picked set; none picked yet
+    available = np.ones(len(docs), dtype=bool)
+
+    codes = per_group = None
+    if groups is not None and max_per_group > 0:
+        _, codes = np.unique(np.asarray(groups, dtype=object).astype(str), return_inverse=True)
+        per_group = np.zeros(codes.max() + 1, dtype=np.int32)
+
+    picked: List[int] = []
+    while len(picked) < k and available.any():
+        redundancy = max_sim if picked else 0.0
+        score = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        i = int(np.argmax(np.where(available, score, -np.inf)))
+        picked.append(i)
+        available[i] = False
+        np.maximum(max_sim, pairwise[i], out=max_sim)
+        if codes is not None:
+            per_group[codes[i]] += 1
+            if per_group[codes[i]] >= max_per_group:
+                available &= codes != codes[i]
+    return picked
@@ -1,7 +1,15 @@
 import io
+from typing import Iterator
+
 from pypdf import PdfReader
 
-def extract_pdf_text(pdf_bytes: bytes) -> str:
+
+def iter_pdf_pages(pdf_bytes: bytes) -> Iterator[str]:
+    """Text of each page as it is extracted, newline-terminated."""
     reader = PdfReader(io.BytesIO(pdf_bytes))
-    pages = [(p.extract_text() or "") for p in reader.pages]
-    return "\n".join(pages)
+    for p in reader.pages:
+        yield (p.extract_text() or "") + "\n"
+
+
+def extract_pdf_text(pdf_bytes: bytes) -> str:
+    return "".join(iter_pdf_pages(pdf_bytes)).rstrip("\n")
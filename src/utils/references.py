@@ -0,0 +1,67 @@
+import re
+from typing import List, Tuple
+
+# "References" / "Bibliography" on a line of its own, optionally numbered ("7 References", "VII. REFERENCES")
+_HEADING = re.compile(
+    r"^[ \t]*(?:[0-9]+\.?|[IVXL]+\.)?[ \t]*(?:references|bibliography|works cited|literature cited)[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# arXiv ids only count with an arXiv marker in front, so page ranges,
+# years and volume numbers don't turn into citations
+_ARXIV = re.compile(
+    r"(?:arxiv(?:\s+preprint)?\s*:?\s*|arxiv\.org/(?:abs|pdf)/|\babs/)"
+    r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?",
+    re.IGNORECASE,
+)
+_DOI = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+_VERSIONED = re.compile(r"^(?:arxiv:)?(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?$", re.IGNORECASE)
+
+
+def canonical_id(paper_id: str) -> str:
+    """arXiv ids without "arXiv:" prefix and version ("2401.01234v2" -> "2401.01234"); others unchanged."""
+    m = _VERSIONED.match(paper_id.strip())
+    return m.group(1) if m else paper_id
+
+
+def split_references(text: str) -> Tuple[str, str]:
+    """(body, reference section): everything after the last references heading."""
+    last = None
+    for last in _HEADING.finditer(text):
+        pass
+    if last is None:
+        return text, ""
+    return text[:last.start()], text[last.end():]
+
+
+def extract_references(text: str) -> List[str]:
+    """
+    Cited works from a paper's reference section, as canonical arXiv ids
+    and lowercased DOIs, deduplicated in order of appearance.
+    """
+    _, refs = split_references(text or "")
+    if not refs:
+        return []
+    found = [canonical_id(m.group(1)) for m in _ARXIV.finditer(refs)]
+    found += [m.group(1).rstrip(".,;)").lower() for m in _DOI.finditer(refs)]
+    return list(dict.fromkeys(found))
+
+
+class ReferenceTracker:
+    """
+    Fed a document piece by piece (e.g. page by page), keeps only the text
+    from the last piece with a references heading on, so the references
+    of a streamed document can be parsed without holding all of it.
+    """
+
+    def __init__(self):
+        self._tail: List[str] = []
+
+    def feed(self, piece: str) -> str:
+        if _HEADING.search(piece):
+            self._tail = [piece]
+        elif self._tail:
+            self._tail.append(piece)
+        return piece
+
+    def references(self) -> List[str]:
+        return extract_references("".join(self._tail))
@@ -0,0 +1,75 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.metrics import counter
+
+SINGLEFLIGHT_CALLS = counter(
+    "singleflight_calls_total",
+    "Calls through a single-flight group; role=follower calls were coalesced",
+    ["group", "role"],
+)
+
+
+class FlightTimeout(TimeoutError):
+    """A follower's wait for the leader's result timed out."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls with the same key: the first caller (the
+    leader) runs `fn`, callers arriving while it is in flight wait and get
+    the same result or exception. Nothing is cached once the call returns.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared); shared is True for coalesced callers.
+        A follower waits at most `timeout` seconds for the leader, then
+        raises FlightTimeout (the leader's call keeps running).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.labels(group=self.name, role="follower").inc()
+            if not call.done.wait(timeout):
+                raise FlightTimeout(f"{self.name}: shared call still running after {timeout:.1f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        SINGLEFLIGHT_CALLS.labels(group=self.name, role="leader").inc()
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,41 @@
+import re
+from typing import Iterable, Iterator
+
+_SPACE = re.compile(r"\s+")
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text, same ballpark as Llama tokenizers
+    return max(1, len(text) // 4)
+
+
+def normalize_topic(topic: str) -> str:
+    """Case/whitespace/trailing-punctuation-insensitive key for a research topic."""
+    return _SPACE.sub(" ", (topic or "").strip().lower()).rstrip(" ?!.")
+
+
+def iter_sections(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Split streamed Markdown into "## " sections as soon as each one is
+    complete (i.e. the next heading has started). Text before the first
+    heading is yielded as its own section; "".join() of the output gives
+    back the full text.
+    """
+    buf = ""
+    for piece in pieces:
+        buf += piece
+        while True:
+            # a heading strictly after the start of the current section
+            pos = buf.find("\n## ", 1)
+            if pos < 0:
+                break
+            yield buf[:pos + 1]
+            buf = buf[pos + 1:]
+    if buf:
+        yield buf
+
+
+def section_heading(section: str) -> str:
+    """"## Methods" -> "Methods"; "" for text without a heading."""
+    first = section.lstrip().split("\n", 1)[0]
+    return first[3:].strip() if first.startswith("## ") else ""
@@ -1,45 +1,164 @@
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from src.agents.research_agents import ResearchAgents
+import operator
+import time
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+from langgraph.graph import StateGraph, START, END
+from src.agents import budget
+from src.agents.budget import DeadlineExceeded
+from src.agents.revision_policy import (
+    assign_arm, merge_verdicts, parse_verdict, render_verdict, should_revise,
+)
+from src.agents.router import WRITER_ROUTE_SECONDS
+from src.config import settings
+from src.logger import get_logger
+from src.services.registry import get_agents
+from src.telemetry import instrument
+from src.utils.text import section_heading
+
+log = get_logger("Workflow")
 
 class AgentState(TypedDict):
     task: str
+    # writer route (fast / smart model, context size), see src/agents/router.py
+    route: Dict[str, Any]
     plan: List[str]
     context: str
     draft: str
     critique: str
+    # structured critic verdict (score, issues), see src/agents/revision_policy.py
+    verdict: Optional[Dict[str, Any]]
+    # revision policy arm for this run: "legacy" or "adaptive"
+    policy_arm: str
     revision_count: int
+    # CRITIQUE_MODE=sectional: the draft split at "## " headings and the
+    # critic's verdict per section ("" = not reviewed)
+    sections: List[str]
+    section_verdicts: List[str]
+    # time.perf_counter() by which the run should be done (None = no budget)
+    deadline: float
+    # nodes that skipped or cut work short to stay within the budget
+    budget_actions: Annotated[List[str], operator.add]
+    # one entry per node execution (time, tokens, hits), see src/telemetry.py
+    node_stats: Annotated[List[Dict[str, Any]], operator.add]
+
+# Agents (LLM clients, vector store, graph, encoder) are built on first use
+# through the service registry, not at import time.
 
-agents = ResearchAgents()
+def router_node(state: AgentState):
+    # runs alongside the Planner; classifying with the 8B model only pays
+    # off if the run is not already short
+    use_llm = budget.can_afford(state.get("deadline"), "Router", "Researcher", "Writer")
+    return {"route": get_agents().route(state["task"], use_llm=use_llm)}
+
+def _fast(state: AgentState) -> bool:
+    return (state.get("route") or {}).get("route") == "fast"
 
 def planner_node(state: AgentState):
-    return {"plan": agents.plan(state["task"])}
+    deadline = state.get("deadline")
+    # without time for planning + a draft, reuse a cached plan or search
+    # for the topic itself
+    if not budget.can_afford(deadline, "Planner", "Researcher", "Writer"):
+        cached = get_agents().cached_plan(state["task"])
+        if cached is not None:
+            return {"plan": cached}
+        return {"plan": [state["task"]], "budget_actions": ["Planner:skipped"]}
+    try:
+        return {"plan": get_agents().plan(state["task"])}
+    except DeadlineExceeded:
+        return {"plan": [state["task"]], "budget_actions": ["Planner:deadline"]}
 
 def researcher_node(state: AgentState):
-    return {"context": agents.retrieve(state["plan"])}
+    reduced = not budget.can_afford(state.get("deadline"), "Researcher", "Writer", "Critic")
+    max_chars = (state.get("route") or {}).get("context_chars", 9000)
+    update = {"context": get_agents().retrieve(state["plan"], reduced=reduced, max_chars=max_chars)}
+    if reduced:
+        update["budget_actions"] = ["Researcher:reduced"]
+    return update
+
+def _arm(state: AgentState) -> str:
+    return state.get("policy_arm") or assign_arm(state["task"])
+
+def _section_verdict(raw: str) -> Optional[Dict[str, Any]]:
+    return parse_verdict(raw) if raw else None
+
+def _write_sections(state: AgentState) -> Dict[str, Any]:
+    agents = get_agents()
+    if state.get("sections"):
+        flagged = [
+            i for i, raw in enumerate(state["section_verdicts"])
+            if should_revise(_section_verdict(raw), _arm(state))
+        ]
+        sections, verdicts = agents.revise_sections(
+            state["task"], state["context"], state["sections"], state["section_verdicts"], flagged,
+            fast=_fast(state),
+        )
+    else:
+        sections, verdicts = agents.draft_sections(state["task"], state["context"], fast=_fast(state))
+    return {"draft": "".join(sections), "sections": sections, "section_verdicts": verdicts}
 
 def writer_node(state: AgentState):
-    return {
-        "draft": agents.draft(state["task"], state["context"]),
-        "revision_count": state.get("revision_count", 0) + 1
-    }
+    t0 = time.perf_counter()
+    try:
+        if settings.CRITIQUE_MODE == "sectional":
+            update = _write_sections(state)
+        else:
+            feedback = render_verdict(state.get("verdict")) if state.get("draft") else ""
+            update = {"draft": get_agents().draft(state["task"], state["context"], feedback, fast=_fast(state))}
+    except DeadlineExceeded:
+        if not state.get("draft"):
+            raise
+        # keep the best draft so far rather than failing the whole run
+        log.warning("Revision ran out of budget, returning the previous draft")
+        return {"budget_actions": ["Writer:deadline"]}
+    WRITER_ROUTE_SECONDS.labels(route=(state.get("route") or {}).get("route", "smart")).observe(
+        time.perf_counter() - t0
+    )
+    update["revision_count"] = state.get("revision_count", 0) + 1
+    return update
+
+def _reviewed(verdict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"verdict": verdict, "critique": render_verdict(verdict)}
 
 def critic_node(state: AgentState):
-    return {"critique": agents.critique(state["draft"])}
+    if settings.CRITIQUE_MODE == "sectional":
+        # sections were already reviewed while the Writer streamed them
+        return _reviewed(merge_verdicts(
+            [_section_verdict(raw) for raw in state["section_verdicts"]],
+            [section_heading(s) for s in state["sections"]],
+        ))
+    # a critique only pays off if there is time left to act on it
+    if not budget.can_afford(state.get("deadline"), "Critic", "Writer"):
+        return {**_reviewed(None), "budget_actions": ["Critic:skipped"]}
+    try:
+        return _reviewed(parse_verdict(get_agents().critique(state["draft"])))
+    except DeadlineExceeded:
+        return {**_reviewed(None), "budget_actions": ["Critic:deadline"]}
 
 def should_continue(state: AgentState):
-    if "REVISE" in state["critique"] and state["revision_count"] < 2:
-        return "Writer"
+    if should_revise(state.get("verdict"), _arm(state)) and state["revision_count"] < 2:
+        if budget.can_afford(state.get("deadline"), "Writer"):
+            return "Writer"
+        log.info("Skipping revision: not enough latency budget left for another draft")
     return END
 
+def _with_deadline(fn):
+    # expose the request deadline to code below the node (LLM rate limiter)
+    def node(state: AgentState):
+        with budget.scope(state.get("deadline")):
+            return fn(state)
+    return node
+
 graph = StateGraph(AgentState)
-graph.add_node("Planner", planner_node)
-graph.add_node("Researcher", researcher_node)
-graph.add_node("Writer", writer_node)
-graph.add_node("Critic", critic_node)
+graph.add_node("Router", instrument("Router", _with_deadline(router_node)))
+graph.add_node("Planner", instrument("Planner", _with_deadline(planner_node)))
+graph.add_node("Researcher", instrument("Researcher", _with_deadline(researcher_node)))
+graph.add_node("Writer", instrument("Writer", _with_deadline(writer_node)))
+graph.add_node("Critic", instrument("Critic", _with_deadline(critic_node)))
 
-graph.set_entry_point("Planner")
-graph.add_edge("Planner", "Researcher")
+# the route is only needed from the Researcher on, so classification
+# overlaps planning instead of delaying it
+graph.add_edge(START, "Router")
+graph.add_edge(START, "Planner")
+graph.add_edge(["Router", "Planner"], "Researcher")
 graph.add_edge("Researcher", "Writer")
 graph.add_edge("Writer", "Critic")
 graph.add_conditional_edges("Critic", should_continue, {"Writer": "Writer", END: END})